@@ -0,0 +1,84 @@
+import hashlib
+import time
+from typing import Callable
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.request import Request
+
+CATALOG_VERSION_KEY = "book:catalog:version"
+CATALOG_MODIFIED_KEY = "book:catalog:modified"
+CATALOG_PAGE_TIMEOUT = 60 * 60
+REBUILD_LOCK_TIMEOUT = 10
+REBUILD_WAIT_INTERVAL = 0.05
+REBUILD_WAIT_ATTEMPTS = 100
+
+
+def get_catalog_version() -> tuple[int, int]:
+    """Return the current catalog version and its last modification timestamp"""
+    values = cache.get_many([CATALOG_VERSION_KEY, CATALOG_MODIFIED_KEY])
+
+    if CATALOG_VERSION_KEY not in values:
+        # Seed from the clock so that versions keep growing after a cache flush
+        now = time.time()
+        cache.add(CATALOG_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        cache.add(CATALOG_MODIFIED_KEY, int(now), timeout=None)
+        values = cache.get_many([CATALOG_VERSION_KEY, CATALOG_MODIFIED_KEY])
+
+    return values[CATALOG_VERSION_KEY], values.get(CATALOG_MODIFIED_KEY, 0)
+
+
+def bump_catalog_version() -> None:
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+    cache.set(CATALOG_MODIFIED_KEY, int(time.time()), timeout=None)
+
+
+def invalidate_catalog() -> None:
+    """
+    Bump the catalog version now, so the current transaction never reads
+    its own stale pages, and once more after commit, so pages rebuilt by
+    other requests from the pre-commit snapshot are discarded.
+    """
+    bump_catalog_version()
+    transaction.on_commit(bump_catalog_version)
+
+
+def get_page_digest(request: Request) -> str:
+    query = sorted(request.query_params.lists())
+    fingerprint = f"{request.path}|{query}|{request.accepted_renderer.format}"
+    return hashlib.md5(fingerprint.encode()).hexdigest()
+
+
+def get_or_build_page(version: int, digest: str, build: Callable[[], dict]) -> dict:
+    """
+    Return a cached catalog page, building it at most once per version.
+
+    Only the request that wins the rebuild lock queries the database,
+    the rest wait for its result instead of all missing at once.
+    """
+    key = f"book:catalog:page:{version}:{digest}"
+    data = cache.get(key)
+
+    if data is not None:
+        return data
+
+    lock_key = f"{key}:lock"
+
+    if cache.add(lock_key, 1, timeout=REBUILD_LOCK_TIMEOUT):
+        try:
+            data = build()
+            cache.set(key, data, timeout=CATALOG_PAGE_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return data
+
+    for _ in range(REBUILD_WAIT_ATTEMPTS):
+        time.sleep(REBUILD_WAIT_INTERVAL)
+        data = cache.get(key)
+        if data is not None:
+            return data
+
+    return build()
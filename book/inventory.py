@@ -0,0 +1,58 @@
+from django.db import connection
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+
+from book.cache import invalidate_catalog
+from book.models import Book
+
+
+def _update_inventory(sql: str, book_id: int) -> int | None:
+    table = connection.ops.quote_name(Book._meta.db_table)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(table=table), [book_id])
+        row = cursor.fetchone()
+
+    if row is None:
+        return None
+
+    invalidate_catalog()
+    return row[0]
+
+
+def reserve_copy(book_id: int) -> int | None:
+    """
+    Take one copy of a book in a single conditional UPDATE.
+
+    Returns the inventory left after the reservation or None when the
+    book is sold out. The row lock is held until the end of the current
+    transaction, so call it as late in the transaction as possible.
+    """
+    return _update_inventory(
+        "UPDATE {table} SET inventory = inventory - 1 "
+        "WHERE id = %s AND inventory > 0 RETURNING inventory",
+        book_id,
+    )
+
+
+def release_copy(book_id: int) -> int | None:
+    """Put one copy of a book back and return the new inventory"""
+    return _update_inventory(
+        "UPDATE {table} SET inventory = inventory + 1 "
+        "WHERE id = %s RETURNING inventory",
+        book_id,
+    )
+
+
+def release_copies(copies: dict[int, int]) -> None:
+    """Put back several copies of several books in one UPDATE statement"""
+    if not copies:
+        return
+
+    Book.objects.filter(pk__in=copies).update(
+        inventory=F("inventory")
+        + Case(
+            *[When(pk=book_id, then=Value(count)) for book_id, count in copies.items()],
+            output_field=PositiveIntegerField(),
+        )
+    )
+    invalidate_catalog()
@@ -0,0 +1,55 @@
+from django.core.management import BaseCommand, CommandError
+
+from book.utils import (
+    IMPORT_BATCH_SIZE,
+    IMPORT_FORMATS,
+    get_import_format,
+    import_books,
+    read_book_rows,
+)
+
+
+class Command(BaseCommand):
+    """Django command to import books from a CSV or JSON Lines file"""
+
+    help = "Stream books from a CSV or JSON Lines file into the catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to the CSV or JSON Lines file")
+        parser.add_argument(
+            "--format",
+            dest="file_format",
+            choices=IMPORT_FORMATS,
+            help="Input format, guessed from the file extension by default",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help="Number of books inserted per statement",
+        )
+
+    def handle(self, *args, **options):
+        file_format = options["file_format"] or get_import_format(options["path"])
+
+        if file_format is None:
+            raise CommandError("Unknown file format, use --format csv|jsonl.")
+
+        with open(options["path"], newline="", encoding="utf-8") as stream:
+            report = import_books(
+                read_book_rows(stream, file_format), options["batch_size"]
+            )
+
+        for error in report["errors"]:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+
+        hidden_errors = report["rejected"] - len(report["errors"])
+        if hidden_errors:
+            self.stderr.write(f"... and {hidden_errors} more rejected rows")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report['created']} books, "
+                f"rejected {report['rejected']} rows."
+            )
+        )
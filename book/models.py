@@ -1,5 +1,9 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
+SEARCH_CONFIG = "english"
+
 
 class Book(models.Model):
     class CoverChoices(models.TextChoices):
@@ -11,6 +15,14 @@ class Book(models.Model):
     cover = models.CharField(max_length=10, choices=CoverChoices.choices)
     inventory = models.PositiveIntegerField()
     daily_fee = models.DecimalField(max_digits=5, decimal_places=2)
+    # Maintained by the database trigger from migration 0002
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="book_search_vector_idx"),
+            models.Index(fields=["title", "id"], name="book_title_id_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.title
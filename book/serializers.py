@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
 from book.models import Book
+from book.utils import IMPORT_FORMATS
 
 
 class BookSerializer(serializers.ModelSerializer):
@@ -15,3 +16,8 @@ class BookListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Book
         fields = ("id", "title", "author")
+
+
+class BookImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    file_format = serializers.ChoiceField(choices=IMPORT_FORMATS, required=False)
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from book.cache import invalidate_catalog
+from book.models import Book
+
+
+@receiver([post_save, post_delete], sender=Book)
+def book_changed(sender, **kwargs) -> None:
+    invalidate_catalog()
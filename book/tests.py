@@ -1,4 +1,11 @@
+import io
+import json
+import tempfile
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework import status
@@ -9,6 +16,8 @@ from book.serializers import BookListSerializer, BookSerializer
 
 BOOKS_URL = reverse("book:book-list")
 BOOK_URL = reverse("book:book-detail", args=[1])
+BOOKS_IMPORT_URL = reverse("book:book-import")
+BOOKS_EXPORT_URL = reverse("book:book-export")
 
 
 def books_create() -> None:
@@ -41,12 +50,132 @@ class UnauthenticatedBookTests(TestCase):
         for book in serializer.data:
             self.assertIn(book, res.data["results"])
 
+    def test_book_search(self):
+        Book.objects.create(
+            title="The Old Man and the Sea",
+            author="Ernest Hemingway",
+            cover="Soft",
+            inventory=3,
+            daily_fee=0.99,
+        )
+        Book.objects.create(
+            title="Sea of Stories",
+            author="Salman Rushdie",
+            cover="Hard",
+            inventory=3,
+            daily_fee=0.99,
+        )
+        res = self.client.get(BOOKS_URL, data={"search": "hemingway sea"})
+        titles = [book["title"] for book in res.data["results"]]
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(titles, ["The Old Man and the Sea"])
+
+    def test_book_search_ranked(self):
+        Book.objects.create(
+            title="Rivers",
+            author="Sea Writer",
+            cover="Soft",
+            inventory=3,
+            daily_fee=0.99,
+        )
+        Book.objects.create(
+            title="Sea",
+            author="Someone",
+            cover="Hard",
+            inventory=3,
+            daily_fee=0.99,
+        )
+        res = self.client.get(BOOKS_URL, data={"search": "sea"})
+        titles = [book["title"] for book in res.data["results"]]
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(titles, ["Sea", "Rivers"])
+
+    def test_book_list_cursor_pagination(self):
+        for number in range(4):
+            Book.objects.create(
+                title="Book2",
+                author=f"Duplicate title author {number}",
+                cover="Soft",
+                inventory=1,
+                daily_fee=0.99,
+            )
+        expected = list(
+            Book.objects.order_by("title", "id").values_list("id", flat=True)
+        )
+
+        ids = []
+        res = self.client.get(BOOKS_URL, data={"pagination": "cursor", "page_size": 2})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", res.data)
+            ids += [book["id"] for book in res.data["results"]]
+            if res.data["next"] is None:
+                break
+            res = self.client.get(res.data["next"])
+
+        previous = self.client.get(res.data["previous"])
+        previous_ids = [book["id"] for book in previous.data["results"]]
+
+        self.assertEqual(ids, expected)
+        self.assertEqual(previous_ids, expected[-3:-1])
+
+    def test_book_list_cursor_pagination_rejects_search(self):
+        res = self.client.get(BOOKS_URL, data={"pagination": "cursor", "search": "Sea"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("search", res.data)
+
+    def test_book_list_page_size_cap(self):
+        res = self.client.get(BOOKS_URL, data={"page_size": 1000})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 3)
+
     def test_auth_required(self):
         res = self.client.get(BOOK_URL)
 
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class BookListCacheTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        books_create()
+
+    def test_book_list_etag(self):
+        res = self.client.get(BOOKS_URL)
+        res_not_modified = self.client.get(
+            BOOKS_URL, HTTP_IF_NONE_MATCH=res.headers["ETag"]
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("Last-Modified", res.headers)
+        self.assertEqual(res_not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res_not_modified.headers["ETag"], res.headers["ETag"])
+
+    def test_book_list_invalidated_on_book_change(self):
+        res = self.client.get(BOOKS_URL)
+        book = Book.objects.get(title="Book1")
+        book.title = "Book0"
+        book.save()
+        res_changed = self.client.get(BOOKS_URL, HTTP_IF_NONE_MATCH=res.headers["ETag"])
+
+        self.assertEqual(res_changed.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res_changed.headers["ETag"], res.headers["ETag"])
+        self.assertEqual(res_changed.data["results"][0]["title"], "Book0")
+
+    def test_book_list_served_from_cache(self):
+        self.client.get(BOOKS_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(BOOKS_URL)
+
+        self.assertEqual(len(res.data["results"]), 3)
+
+
 class AuthenticatedBookTests(TestCase):
     def setUp(self) -> None:
         self.client = APIClient()
@@ -76,7 +205,8 @@ class AuthenticatedBookTests(TestCase):
         res_delete = self.client.delete(BOOK_URL)
         res_put = self.client.put(BOOK_URL, data=new_book)
         res_patch = self.client.patch(BOOK_URL, data={"title": "Patched"})
-        responses = [res_post, res_put, res_patch, res_delete]
+        res_export = self.client.get(BOOKS_EXPORT_URL)
+        responses = [res_post, res_put, res_patch, res_delete, res_export]
 
         for response in responses:
             self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -134,3 +264,83 @@ class AdminBookTests(TestCase):
 
         self.assertEqual(res_delete.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(empty_queryset.count(), 0)
+
+    def test_book_import_csv(self):
+        content = (
+            "title,author,cover,inventory,daily_fee\n"
+            "Imported1,Author,Hard,3,1.50\n"
+            "Imported2,Author,Paper,3,1.50\n"
+            "Imported3,Author,Soft,3,1.505\n"
+            "Imported4,Author,Soft,-1,1.00\n"
+            "Imported5,Author,Soft,1,0.99\n"
+        )
+        upload = SimpleUploadedFile("books.csv", content.encode())
+        res = self.client.post(BOOKS_IMPORT_URL, data={"file": upload})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["created"], 2)
+        self.assertEqual(res.data["rejected"], 3)
+        self.assertEqual([error["line"] for error in res.data["errors"]], [3, 4, 5])
+        self.assertIn("cover", res.data["errors"][0]["errors"])
+        self.assertIn("daily_fee", res.data["errors"][1]["errors"])
+        self.assertIn("inventory", res.data["errors"][2]["errors"])
+        self.assertTrue(Book.objects.filter(title="Imported5").exists())
+
+    def test_book_import_invalid_encoding(self):
+        content = "title,author,cover,inventory,daily_fee\n" + (
+            "Imported1,Author,Hard,3,1.50\n" * 10
+        )
+        upload = SimpleUploadedFile(
+            "books.csv", content.encode() + "Café,Auteur,Hard,1,1\n".encode("latin-1")
+        )
+        res = self.client.post(BOOKS_IMPORT_URL, data={"file": upload})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("file", res.data)
+        self.assertFalse(Book.objects.filter(title="Imported1").exists())
+
+    def test_book_import_jsonl_command(self):
+        rows = [
+            {
+                "title": "Json1",
+                "author": "A",
+                "cover": "Soft",
+                "inventory": 1,
+                "daily_fee": 0.5,
+            },
+            {
+                "title": "",
+                "author": "A",
+                "cover": "Soft",
+                "inventory": 1,
+                "daily_fee": 0.5,
+            },
+            {
+                "title": "Json3",
+                "author": "A",
+                "cover": "Hard",
+                "inventory": 2,
+                "daily_fee": 1,
+            },
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as file:
+            file.write("\n".join(json.dumps(row) for row in rows) + "\n{broken\n")
+            file.flush()
+            out, err = io.StringIO(), io.StringIO()
+            call_command(
+                "import_books", file.name, batch_size=1, stdout=out, stderr=err
+            )
+
+        self.assertIn("Imported 2 books, rejected 2 rows.", out.getvalue())
+        self.assertIn("Line 2", err.getvalue())
+        self.assertIn("Line 4", err.getvalue())
+        self.assertEqual(Book.objects.filter(title__startswith="Json").count(), 2)
+
+    def test_book_export_csv(self):
+        res = self.client.get(BOOKS_EXPORT_URL)
+        lines = b"".join(res.streaming_content).decode().splitlines()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "text/csv")
+        self.assertEqual(lines[0], "id,title,author,cover,inventory,daily_fee")
+        self.assertEqual(len(lines), Book.objects.count() + 1)
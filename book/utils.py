@@ -0,0 +1,85 @@
+import csv
+import json
+from typing import Iterable, Iterator, TextIO
+
+from django.core.exceptions import ValidationError
+
+from book.cache import invalidate_catalog
+from book.models import Book
+
+IMPORT_FORMATS = ("csv", "jsonl")
+IMPORT_FIELDS = ("title", "author", "cover", "inventory", "daily_fee")
+IMPORT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+
+def get_import_format(file_name: str) -> str | None:
+    extension = file_name.rsplit(".", 1)[-1].lower()
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    if extension == "csv":
+        return "csv"
+    return None
+
+
+def read_book_rows(stream: TextIO, file_format: str) -> Iterator[tuple[int, dict]]:
+    """Lazily yield (line number, row) pairs from a CSV or JSON Lines stream"""
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, None
+
+
+def build_book(row) -> Book:
+    """Validate an import row against the Book field constraints"""
+    if not isinstance(row, dict):
+        raise ValidationError("Row is not a valid JSON object.")
+
+    book = Book(**{field: row.get(field) for field in IMPORT_FIELDS})
+    book.clean_fields(exclude=["search_vector"])
+    return book
+
+
+def import_books(
+    rows: Iterable[tuple[int, dict]], batch_size: int = IMPORT_BATCH_SIZE
+) -> dict:
+    """
+    Insert valid rows with bulk_create in batches of `batch_size`.
+
+    Rejected rows are counted and reported (up to MAX_REPORTED_ERRORS)
+    instead of aborting the load, so memory use only depends on the
+    batch size and not on the size of the input.
+    """
+    report = {"created": 0, "rejected": 0, "errors": []}
+    batch = []
+
+    for line_number, row in rows:
+        try:
+            batch.append(build_book(row))
+        except ValidationError as error:
+            report["rejected"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                errors = getattr(error, "message_dict", None) or error.messages
+                report["errors"].append({"line": line_number, "errors": errors})
+            continue
+
+        if len(batch) >= batch_size:
+            report["created"] += len(Book.objects.bulk_create(batch))
+            batch = []
+
+    if batch:
+        report["created"] += len(Book.objects.bulk_create(batch))
+
+    if report["created"]:
+        invalidate_catalog()
+
+    return report
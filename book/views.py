@@ -1,27 +1,190 @@
-from rest_framework import viewsets
-from rest_framework.pagination import PageNumberPagination
+import csv
+import io
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
 
-from book.models import Book
-from book.serializers import BookSerializer, BookListSerializer
+from book.cache import get_catalog_version, get_or_build_page, get_page_digest
+from book.models import Book, SEARCH_CONFIG
+from book.serializers import (
+    BookSerializer,
+    BookListSerializer,
+    BookImportSerializer,
+)
+from book.utils import get_import_format, import_books, read_book_rows
+from library_service.export import (
+    EXPORT_CHUNK_SIZE,
+    export_response,
+    get_export_format,
+)
+from library_service.pagination import OptionalCursorPagination
+from user.authentication import StatelessReadMixin
 
 
-class BookPagination(PageNumberPagination):
+class BookPagination(OptionalCursorPagination):
     page_size = 5
+    cursor_ordering = ("title", "id")
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request: Request, view=None
+    ) -> list | None:
+        # The cursor is keyed by title, so it can't follow the rank ordering
+        if self.is_cursor_mode(request) and request.query_params.get("search"):
+            raise ValidationError(
+                {
+                    "search": [
+                        "Search results are ranked by relevance and can't be "
+                        "paginated with a cursor, use page numbers."
+                    ]
+                }
+            )
+        return super().paginate_queryset(queryset, request, view=view)
 
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(StatelessReadMixin, viewsets.ModelViewSet):
     queryset = Book.objects.order_by("title")
     pagination_class = BookPagination
 
+    def get_queryset(self) -> QuerySet:
+        queryset = super().get_queryset()
+
+        if self.action != "list":
+            return queryset
+
+        queryset = queryset.only("id", "title", "author")
+        search = self.request.query_params.get("search")
+
+        if search:
+            query = SearchQuery(search, config=SEARCH_CONFIG, search_type="websearch")
+            queryset = (
+                queryset.filter(search_vector=query)
+                .annotate(rank=SearchRank(F("search_vector"), query))
+                .order_by("-rank", "title", "id")
+            )
+
+        return queryset
+
     def get_serializer_class(self) -> BookSerializer | BookListSerializer:
         if self.action == "list":
             return BookListSerializer
+        if self.action == "import_books":
+            return BookImportSerializer
         return BookSerializer
 
     def get_permissions(self):
         if self.action == "list":
             return [AllowAny()]
-        if self.action in ("create", "update", "partial_update", "destroy"):
+        if self.action in (
+            "create",
+            "update",
+            "partial_update",
+            "destroy",
+            "import_books",
+            "export",
+        ):
             return [IsAdminUser()]
         return [IsAuthenticated()]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "search",
+                type=str,
+                description="Full-text search by title and author, results are "
+                "ranked by relevance and can't be combined with cursor pagination",
+            ),
+        ]
+    )
+    def list(self, request, *args, **kwargs):
+        """Catalog pages are cached per catalog version and revalidated by ETag"""
+        version, last_modified = get_catalog_version()
+        digest = get_page_digest(request)
+        etag = f'"{version}-{digest}"'
+        headers = {"ETag": etag, "Last-Modified": http_date(last_modified)}
+
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            for header, value in headers.items():
+                not_modified.headers[header] = value
+            return not_modified
+
+        data = get_or_build_page(
+            version,
+            digest,
+            lambda: super(BookViewSet, self).list(request, *args, **kwargs).data,
+        )
+        return Response(data, headers=headers)
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="import",
+        url_name="import",
+        parser_classes=(MultiPartParser,),
+    )
+    def import_books(self, request: Request) -> Response:
+        """Endpoint for bulk import of books from a CSV or JSON Lines file"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data["file"]
+        file_format = serializer.validated_data.get("file_format")
+
+        if file_format is None:
+            file_format = get_import_format(upload.name)
+
+        if file_format is None:
+            return Response(
+                {"file_format": ["Unknown file format, use csv or jsonl."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8", newline="")
+
+        try:
+            # The file is decoded while it is read, a broken one imports nothing
+            with transaction.atomic():
+                report = import_books(read_book_rows(stream, file_format))
+        except (UnicodeDecodeError, csv.Error) as error:
+            return Response(
+                {"file": [f"The file could not be read: {error}"]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(report, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "file_format",
+                type=str,
+                enum=["csv", "ndjson"],
+                description="Export file format, csv by default",
+            ),
+        ]
+    )
+    @action(methods=["GET"], detail=False, url_path="export", url_name="export")
+    def export(self, request: Request) -> StreamingHttpResponse:
+        """Endpoint for streaming export of the whole catalog"""
+        file_format = get_export_format(request)
+        fields = BookSerializer.Meta.fields
+        books = (
+            Book.objects.order_by("id")
+            .values(*fields)
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+
+        return export_response(books, fields, file_format, "books")
@@ -1,5 +1,8 @@
 from django.contrib import admin
 
-from borrowing.models import Borrowing
+from borrowing.models import ArchivedBorrowing, Borrowing, Hold, Notification
 
 admin.site.register(Borrowing)
+admin.site.register(ArchivedBorrowing)
+admin.site.register(Hold)
+admin.site.register(Notification)
@@ -0,0 +1,164 @@
+import heapq
+import logging
+import operator
+
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from borrowing.models import ArchivedBorrowing, Borrowing, Reminder
+from payment.models import AccruedFine, ArchivedPayment, Payment
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH_SIZE = 1000
+
+BORROWING_COLUMNS = (
+    "id",
+    "borrow_date",
+    "expected_return_date",
+    "actual_return_date",
+    "book_id",
+    "user_id",
+)
+PAYMENT_COLUMNS = (
+    "id",
+    "status",
+    "type",
+    "borrowing_id",
+    "session_url",
+    "session_id",
+    "money_to_pay",
+)
+
+
+def join_columns(columns: tuple[str, ...], table: str = None) -> str:
+    return ", ".join(f"{table}.{column}" if table else column for column in columns)
+
+
+# Payments are moved together with their borrowing in one statement,
+# foreign keys are checked at commit as Django creates them deferred.
+ARCHIVE_SQL = f"""
+    WITH batch AS (
+        SELECT borrowing.id
+        FROM {Borrowing._meta.db_table} borrowing
+        WHERE borrowing.actual_return_date < %(cutoff)s
+            AND NOT EXISTS (
+                SELECT 1 FROM {Payment._meta.db_table} payment
+                WHERE payment.borrowing_id = borrowing.id
+                    AND payment.status <> %(paid)s
+            )
+        ORDER BY borrowing.id
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    ), moved_payments AS (
+        DELETE FROM {Payment._meta.db_table} payment
+        USING batch
+        WHERE payment.borrowing_id = batch.id
+        RETURNING {join_columns(PAYMENT_COLUMNS, "payment")}
+    ), cleared_fines AS (
+        DELETE FROM {AccruedFine._meta.db_table} accrued_fine
+        USING batch
+        WHERE accrued_fine.borrowing_id = batch.id
+    ), cleared_reminders AS (
+        DELETE FROM {Reminder._meta.db_table} reminder
+        USING batch
+        WHERE reminder.borrowing_id = batch.id
+    ), moved AS (
+        DELETE FROM {Borrowing._meta.db_table} borrowing
+        USING batch
+        WHERE borrowing.id = batch.id
+        RETURNING {join_columns(BORROWING_COLUMNS, "borrowing")}
+    ), archived_payments AS (
+        INSERT INTO {ArchivedPayment._meta.db_table}
+            ({join_columns(PAYMENT_COLUMNS)}, archived_at)
+        SELECT {join_columns(PAYMENT_COLUMNS)}, now() FROM moved_payments
+    ), archived AS (
+        INSERT INTO {ArchivedBorrowing._meta.db_table}
+            ({join_columns(BORROWING_COLUMNS)}, archived_at)
+        SELECT {join_columns(BORROWING_COLUMNS)}, now() FROM moved
+        RETURNING id
+    )
+    SELECT count(*) FROM archived
+"""
+
+
+def archive_borrowings(
+    after_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE
+) -> int:
+    """
+    Move borrowings returned more than `after_days` ago, whose payments
+    are all settled, into the archive tables. Every batch is committed
+    on its own, so the hot table is never locked for long.
+    """
+    cutoff = timezone.now().date() - timezone.timedelta(days=after_days)
+    total = 0
+
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                ARCHIVE_SQL,
+                {
+                    "cutoff": cutoff,
+                    "paid": Payment.StatusChoices.PAID,
+                    "limit": batch_size,
+                },
+            )
+            archived = cursor.fetchone()[0]
+
+        total += archived
+        if archived < batch_size:
+            break
+
+    logger.info("Archived %d borrowings returned before %s", total, cutoff)
+    return total
+
+
+class MergedQuerySet:
+    """
+    Read-only merge of querysets sorted by the same fields, e.g. current
+    and archived borrowings. Supports what the paginators need: ordering,
+    filtering, counting and slicing.
+    """
+
+    ordered = True
+
+    def __init__(self, *querysets: QuerySet, ordering: tuple[str, ...]) -> None:
+        self.model = querysets[0].model
+        self.ordering = ordering
+        self.querysets = [queryset.order_by(*ordering) for queryset in querysets]
+
+    def order_by(self, *ordering: str) -> "MergedQuerySet":
+        return MergedQuerySet(*self.querysets, ordering=ordering)
+
+    def filter(self, *args, **kwargs) -> "MergedQuerySet":
+        return MergedQuerySet(
+            *(queryset.filter(*args, **kwargs) for queryset in self.querysets),
+            ordering=self.ordering,
+        )
+
+    def count(self) -> int:
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __getitem__(self, index: slice) -> list:
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError("MergedQuerySet only supports slices without a step.")
+
+        # Every part is sorted, so the first `stop` rows of the merge can
+        # only come from the first `stop` rows of each part.
+        stop = index.stop if index.stop is not None else self.count()
+        fields = [field.lstrip("-") for field in self.ordering]
+        get_key = operator.attrgetter(*fields)
+        get_item_key = operator.itemgetter(*fields)
+        merged = heapq.merge(
+            *(queryset[:stop] for queryset in self.querysets),
+            key=lambda row: get_item_key(row)
+            if isinstance(row, dict)
+            else get_key(row),
+            reverse=self.ordering[0].startswith("-"),
+        )
+        return list(merged)[index.start or 0 : stop]
@@ -0,0 +1,105 @@
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from book.inventory import release_copies
+from borrowing.models import Hold
+from borrowing.notifications import send_telegram_notification
+
+HOLD_CLAIM_PERIOD = timezone.timedelta(hours=48)
+HOLD_SWEEP_BATCH_SIZE = 500
+
+
+def promote_holds(book_id: int, copies: int) -> int:
+    """
+    Give returned copies to the oldest waiting holds of the book.
+
+    Holds locked by a concurrent promotion are skipped, so parallel
+    returns of the same book hand their copies to different patrons.
+    Returns the number of copies taken by holds.
+    """
+    hold_ids = list(
+        Hold.objects.select_for_update(skip_locked=True)
+        .filter(book_id=book_id, status=Hold.StatusChoices.WAITING)
+        .order_by("created_at", "id")
+        .values_list("id", flat=True)[:copies]
+    )
+
+    if hold_ids:
+        Hold.objects.filter(id__in=hold_ids).update(
+            status=Hold.StatusChoices.READY,
+            claim_expires_at=timezone.now() + HOLD_CLAIM_PERIOD,
+        )
+        send_telegram_notification(
+            f"Holds ready to claim for book id {book_id}: "
+            + ", ".join(str(hold_id) for hold_id in hold_ids)
+        )
+
+    return len(hold_ids)
+
+
+def return_copies(copies: dict[int, int]) -> dict[int, int]:
+    """
+    Hand returned copies, given per book id, to waiting holds first and
+    put the rest back in stock. Returns the copies put back per book.
+    """
+    released = {}
+
+    for book_id, count in sorted(copies.items()):
+        remaining = count - promote_holds(book_id, count)
+        if remaining:
+            released[book_id] = remaining
+
+    release_copies(released)
+    return released
+
+
+def claim_hold(user, book_id: int) -> bool:
+    """Fulfil the user's ready hold for the book, its copy is already set aside"""
+    return bool(
+        Hold.objects.filter(
+            user=user,
+            book_id=book_id,
+            status=Hold.StatusChoices.READY,
+            claim_expires_at__gt=timezone.now(),
+        ).update(status=Hold.StatusChoices.FULFILLED)
+    )
+
+
+def has_ready_hold(user, book_id: int) -> bool:
+    return Hold.objects.filter(
+        user=user,
+        book_id=book_id,
+        status=Hold.StatusChoices.READY,
+        claim_expires_at__gt=timezone.now(),
+    ).exists()
+
+
+def expire_holds(batch_size: int = HOLD_SWEEP_BATCH_SIZE) -> int:
+    """
+    Expire unclaimed holds in batches and pass their copies on to the
+    next holds in the queue, or back to stock.
+    """
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            expired = list(
+                Hold.objects.select_for_update(skip_locked=True)
+                .filter(
+                    status=Hold.StatusChoices.READY,
+                    claim_expires_at__lte=timezone.now(),
+                )
+                .order_by("claim_expires_at")
+                .values_list("id", "book_id")[:batch_size]
+            )
+            Hold.objects.filter(id__in=[hold_id for hold_id, _ in expired]).update(
+                status=Hold.StatusChoices.EXPIRED
+            )
+
+            return_copies(Counter(book_id for _, book_id in expired))
+
+        total += len(expired)
+        if len(expired) < batch_size:
+            return total
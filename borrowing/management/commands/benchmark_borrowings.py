@@ -0,0 +1,125 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from book.models import Book
+from borrowing.models import Borrowing
+from borrowing.projections import project_borrowings
+from borrowing.serializers import (
+    BorrowingProjectionSerializer,
+    BorrowingReadSerializer,
+)
+from payment.models import Payment
+
+PAGE_SIZES = (5, 100, 1000)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """Django command to compare the borrowing read paths on pages of rows"""
+
+    help = (
+        "Time BorrowingReadSerializer against the SQL projection for pages "
+        "of 5, 100 and 1000 borrowings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Number of runs per page size, the best one is reported",
+        )
+        parser.add_argument(
+            "--seed",
+            action="store_true",
+            help="Benchmark on 1000 generated borrowings, rolled back afterwards",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options["seed"]:
+                    self.seed(max(PAGE_SIZES))
+                self.benchmark(options["repeat"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, rows: int) -> None:
+        user = get_user_model().objects.create_user(
+            email="benchmark@example.com",
+            password=None,
+            first_name="Bench",
+            last_name="Mark",
+        )
+        book = Book.objects.create(
+            title="Benchmark",
+            author="Bench Mark",
+            cover="Soft",
+            inventory=1,
+            daily_fee=1,
+        )
+        borrowings = Borrowing.objects.bulk_create(
+            Borrowing(expected_return_date=timezone.now().date(), book=book, user=user)
+            for _ in range(rows)
+        )
+        Payment.objects.bulk_create(
+            Payment(
+                status=Payment.StatusChoices.PAID,
+                type=Payment.TypeChoices.PAYMENT,
+                borrowing=borrowing,
+                money_to_pay=1,
+            )
+            for borrowing in borrowings
+        )
+
+    def benchmark(self, repeat: int) -> None:
+        queryset = Borrowing.objects.order_by("borrow_date", "id")
+        available = queryset.count()
+
+        for page_size in PAGE_SIZES:
+            if page_size > available:
+                self.stderr.write(
+                    f"Skipping pages of {page_size}: only {available} borrowings, "
+                    "use --seed"
+                )
+                continue
+
+            serializer_time = self.best_of(
+                repeat,
+                lambda: BorrowingReadSerializer(
+                    queryset.select_related("book", "user").prefetch_related(
+                        "payments"
+                    )[:page_size],
+                    many=True,
+                ).data,
+            )
+            projection_time = self.best_of(
+                repeat,
+                lambda: BorrowingProjectionSerializer(
+                    project_borrowings(queryset)[:page_size], many=True
+                ).data,
+            )
+            self.stdout.write(
+                f"{page_size:>5} rows: serializer {serializer_time * 1000:.1f}ms, "
+                f"projection {projection_time * 1000:.1f}ms "
+                f"({serializer_time / projection_time:.1f}x)"
+            )
+
+    @staticmethod
+    def best_of(repeat: int, render) -> float:
+        timings = []
+
+        for _ in range(repeat):
+            started = time.perf_counter()
+            render()
+            timings.append(time.perf_counter() - started)
+
+        return min(timings)
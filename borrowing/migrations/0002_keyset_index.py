@@ -0,0 +1,18 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                fields=["borrow_date", "id"], name="borrowing_borrow_date_id_idx"
+            ),
+        ),
+    ]
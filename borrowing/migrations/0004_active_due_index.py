@@ -0,0 +1,20 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing", "0003_notification"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                condition=models.Q(("actual_return_date__isnull", True)),
+                fields=["expected_return_date", "id"],
+                name="borrowing_active_due_idx",
+            ),
+        ),
+    ]
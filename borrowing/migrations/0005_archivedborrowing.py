@@ -0,0 +1,51 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0003_keyset_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("borrowing", "0004_active_due_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedBorrowing",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("borrow_date", models.DateField()),
+                ("expected_return_date", models.DateField()),
+                ("actual_return_date", models.DateField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_borrowings",
+                        to="book.book",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_borrowings",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["borrow_date"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="archivedborrowing",
+            index=models.Index(
+                fields=["user", "borrow_date", "id"], name="archived_borrowing_user_idx"
+            ),
+        ),
+    ]
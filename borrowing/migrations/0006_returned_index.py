@@ -0,0 +1,20 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing", "0005_archivedborrowing"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                condition=models.Q(("actual_return_date__isnull", False)),
+                fields=["actual_return_date"],
+                name="borrowing_returned_idx",
+            ),
+        ),
+    ]
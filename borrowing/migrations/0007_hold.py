@@ -0,0 +1,89 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0003_keyset_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("borrowing", "0006_returned_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Hold",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Waiting", "Waiting"),
+                            ("Ready", "Ready"),
+                            ("Fulfilled", "Fulfilled"),
+                            ("Expired", "Expired"),
+                            ("Cancelled", "Cancelled"),
+                        ],
+                        default="Waiting",
+                        max_length=10,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("claim_expires_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="holds",
+                        to="book.book",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="holds",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["created_at", "id"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="hold",
+            index=models.Index(
+                condition=models.Q(("status", "Waiting")),
+                fields=["book", "created_at", "id"],
+                name="hold_queue_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="hold",
+            index=models.Index(
+                condition=models.Q(("status", "Ready")),
+                fields=["claim_expires_at"],
+                name="hold_claim_expiry_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="hold",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ("Waiting", "Ready"))),
+                fields=("book", "user"),
+                name="hold_one_active_per_user",
+            ),
+        ),
+    ]
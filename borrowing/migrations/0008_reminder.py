@@ -0,0 +1,88 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:02
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def schedule_active_reminders(apps, schema_editor):
+    Borrowing = apps.get_model("borrowing", "Borrowing")
+    Reminder = apps.get_model("borrowing", "Reminder")
+    today = timezone.now().date()
+    reminders = []
+
+    for borrowing in Borrowing.objects.filter(
+        actual_return_date__isnull=True, expected_return_date__gte=today
+    ).iterator():
+        for offset_days in settings.BORROWING_REMINDER_OFFSETS:
+            remind_on = borrowing.expected_return_date - datetime.timedelta(
+                days=offset_days
+            )
+            if remind_on >= today:
+                reminders.append(
+                    Reminder(
+                        borrowing_id=borrowing.id,
+                        offset_days=offset_days,
+                        remind_on=remind_on,
+                    )
+                )
+
+    Reminder.objects.bulk_create(reminders, batch_size=5000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing", "0007_hold"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Reminder",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("offset_days", models.PositiveSmallIntegerField()),
+                ("remind_on", models.DateField()),
+                ("queued_at", models.DateTimeField(blank=True, null=True)),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "borrowing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reminders",
+                        to="borrowing.borrowing",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["remind_on", "id"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="reminder",
+            index=models.Index(
+                condition=models.Q(("sent_at__isnull", True)),
+                fields=["remind_on", "id"],
+                name="reminder_bucket_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="reminder",
+            constraint=models.UniqueConstraint(
+                fields=("borrowing", "offset_days"), name="reminder_unique_offset"
+            ),
+        ),
+        migrations.RunPython(
+            schedule_active_reminders, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 from book.models import Book
 
@@ -17,8 +18,153 @@ class Borrowing(models.Model):
 
     class Meta:
         ordering = ["borrow_date"]
+        indexes = [
+            models.Index(
+                fields=["borrow_date", "id"], name="borrowing_borrow_date_id_idx"
+            ),
+            models.Index(
+                fields=["expected_return_date", "id"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_active_due_idx",
+            ),
+            models.Index(
+                fields=["actual_return_date"],
+                condition=models.Q(actual_return_date__isnull=False),
+                name="borrowing_returned_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return (
             f"Id {self.id}: {self.book.title} borrowed by {self.user.get_full_name()}"
         )
+
+
+class ArchivedBorrowing(models.Model):
+    """Borrowing returned long ago, moved out of the hot Borrowing table"""
+
+    id = models.BigIntegerField(primary_key=True)
+    borrow_date = models.DateField()
+    expected_return_date = models.DateField()
+    actual_return_date = models.DateField()
+    book = models.ForeignKey(
+        to=Book, on_delete=models.CASCADE, related_name="archived_borrowings"
+    )
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_borrowings",
+    )
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["borrow_date"]
+        indexes = [
+            models.Index(
+                fields=["user", "borrow_date", "id"],
+                name="archived_borrowing_user_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"Id {self.id}: {self.book.title} (archived)"
+
+
+class Hold(models.Model):
+    """Patron's place in the FIFO queue for a book that is out of stock"""
+
+    class StatusChoices(models.TextChoices):
+        WAITING = "Waiting"
+        READY = "Ready"
+        FULFILLED = "Fulfilled"
+        EXPIRED = "Expired"
+        CANCELLED = "Cancelled"
+
+    book = models.ForeignKey(to=Book, on_delete=models.CASCADE, related_name="holds")
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="holds"
+    )
+    status = models.CharField(
+        max_length=10, choices=StatusChoices.choices, default=StatusChoices.WAITING
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    claim_expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at", "id"]
+        indexes = [
+            models.Index(
+                fields=["book", "created_at", "id"],
+                condition=models.Q(status="Waiting"),
+                name="hold_queue_idx",
+            ),
+            models.Index(
+                fields=["claim_expires_at"],
+                condition=models.Q(status="Ready"),
+                name="hold_claim_expiry_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "user"],
+                condition=models.Q(status__in=("Waiting", "Ready")),
+                name="hold_one_active_per_user",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"Hold {self.id}: book {self.book_id} for user {self.user_id} ({self.status})"
+
+
+class Reminder(models.Model):
+    """Due date reminder bucketed by the day it has to be sent on"""
+
+    borrowing = models.ForeignKey(
+        to=Borrowing, on_delete=models.CASCADE, related_name="reminders"
+    )
+    offset_days = models.PositiveSmallIntegerField()
+    remind_on = models.DateField()
+    queued_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["remind_on", "id"]
+        indexes = [
+            models.Index(
+                fields=["remind_on", "id"],
+                condition=models.Q(sent_at__isnull=True),
+                name="reminder_bucket_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["borrowing", "offset_days"], name="reminder_unique_offset"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"Reminder for borrowing {self.borrowing_id} on {self.remind_on}"
+
+
+class Notification(models.Model):
+    """Outbox row for a Telegram message, delivered by a django_q worker"""
+
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(sent_at__isnull=True),
+                name="notification_pending_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"Notification {self.id} ({'sent' if self.sent_at else 'pending'})"
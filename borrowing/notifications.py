@@ -1,10 +1,163 @@
+import logging
+import random
+import time
+
 import requests
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from borrowing.models import Notification
+
+logger = logging.getLogger(__name__)
 
 TELEGRAM_BOT_TOKEN = settings.TELEGRAM_BOT_TOKEN
 TELEGRAM_CHAT_ID = settings.TELEGRAM_CHAT_ID
 URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
 
+MESSAGE_MAX_LENGTH = 4096
+MESSAGE_SEPARATOR = "\n\n"
+REQUEST_TIMEOUT = (3.05, 10)
+# Telegram allows about one message per second to the same chat
+SEND_INTERVAL = 1.1
+MAX_MESSAGES_PER_RUN = 30
+# No batch is claimed after this many seconds, so that a run with a last
+# slow request still ends well within the django_q timeout of 60 seconds
+DELIVERY_TIME_LIMIT = 30
+# Claimed batches are skipped by other runs meanwhile, and retried after
+# that if the run was killed before it recorded the result
+CLAIM_TIMEOUT = 5 * 60
+BATCH_SIZE = 200
+MAX_ATTEMPTS = 10
+BACKOFF_BASE = 15
+BACKOFF_MAX = 60 * 60
+
+# One keep-alive connection pool per worker process
+session = requests.Session()
+
+
+class TelegramRateLimited(Exception):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"Rate limited, retry after {retry_after}s")
+        self.retry_after = retry_after
+
 
 def send_telegram_notification(message: str) -> None:
-    requests.post(URL, json={"chat_id": TELEGRAM_CHAT_ID, "text": message})
+    """
+    Queue a Telegram message in the notification outbox.
+
+    The row is committed or rolled back together with the caller's
+    transaction and delivered later by `deliver_notifications`.
+    """
+    Notification.objects.create(message=message)
+
+
+def post_message(text: str) -> None:
+    response = session.post(
+        URL, json={"chat_id": TELEGRAM_CHAT_ID, "text": text}, timeout=REQUEST_TIMEOUT
+    )
+
+    if response.status_code == 429:
+        retry_after = response.json().get("parameters", {}).get("retry_after", 30)
+        raise TelegramRateLimited(retry_after)
+
+    response.raise_for_status()
+
+
+def merge_notifications(notifications: list) -> tuple[str, list]:
+    """Merge the oldest notifications into one message within the length limit"""
+    text = notifications[0].message[:MESSAGE_MAX_LENGTH]
+    merged = [notifications[0]]
+
+    for notification in notifications[1:]:
+        candidate = text + MESSAGE_SEPARATOR + notification.message
+        if len(candidate) > MESSAGE_MAX_LENGTH:
+            break
+        text = candidate
+        merged.append(notification)
+
+    return text, merged
+
+
+def get_retry_delay(attempts: int) -> float:
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay + random.uniform(0, delay / 2)
+
+
+def claim_notifications() -> tuple[str, list[Notification]] | None:
+    """
+    Merge the oldest due notifications into one message and claim them
+    in a short transaction, so that no row stays locked while it is sent.
+    """
+    with transaction.atomic():
+        pending = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(
+                sent_at__isnull=True,
+                next_attempt_at__lte=timezone.now(),
+                attempts__lt=MAX_ATTEMPTS,
+            )
+            .order_by("id")[:BATCH_SIZE]
+        )
+
+        if not pending:
+            return None
+
+        text, batch = merge_notifications(pending)
+        Notification.objects.filter(
+            id__in=[notification.id for notification in batch]
+        ).update(
+            next_attempt_at=timezone.now() + timezone.timedelta(seconds=CLAIM_TIMEOUT)
+        )
+
+    return text, batch
+
+
+def deliver_notifications() -> dict:
+    """
+    Send queued notifications, merging bursts into batched messages.
+
+    A run sends at most MAX_MESSAGES_PER_RUN messages and claims no batch
+    after DELIVERY_TIME_LIMIT seconds, so that it fits the django_q
+    timeout. It stops at the first failure, and the failed batch is
+    retried with exponential backoff or after Telegram's `retry_after`.
+    """
+    stats = {"messages": 0, "notifications": 0, "failed": 0}
+    started = time.monotonic()
+
+    for _ in range(MAX_MESSAGES_PER_RUN):
+        if time.monotonic() - started > DELIVERY_TIME_LIMIT:
+            break
+
+        claimed = claim_notifications()
+        if claimed is None:
+            break
+
+        text, batch = claimed
+        ids = [notification.id for notification in batch]
+
+        if stats["messages"]:
+            time.sleep(SEND_INTERVAL)
+
+        try:
+            post_message(text)
+        except (requests.RequestException, TelegramRateLimited) as error:
+            attempts = max(notification.attempts for notification in batch) + 1
+            if isinstance(error, TelegramRateLimited):
+                delay = error.retry_after
+            else:
+                delay = get_retry_delay(attempts)
+            Notification.objects.filter(id__in=ids).update(
+                attempts=attempts,
+                next_attempt_at=timezone.now() + timezone.timedelta(seconds=delay),
+                last_error=str(error)[:1000],
+            )
+            stats["failed"] += len(ids)
+            logger.warning("Telegram delivery failed: %s", error)
+            break
+
+        Notification.objects.filter(id__in=ids).update(sent_at=timezone.now())
+        stats["messages"] += 1
+        stats["notifications"] += len(ids)
+
+    return stats
@@ -0,0 +1,57 @@
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db.models import F, OuterRef, QuerySet, TextField, Value
+from django.db.models.functions import Cast, Concat, JSONObject, Trim
+
+from book.serializers import BookSerializer
+from payment.serializers import PaymentSerializer
+
+# Decimals are rendered as text in Postgres, as DRF renders them as strings
+DECIMAL_FIELDS = ("daily_fee", "money_to_pay")
+
+
+def get_json_value(field: str, prefix: str = ""):
+    if field in DECIMAL_FIELDS:
+        return Cast(f"{prefix}{field}", output_field=TextField())
+    return F(f"{prefix}{field}")
+
+
+def project_borrowings(queryset: QuerySet) -> QuerySet:
+    """
+    Build the BorrowingReadSerializer representation of every row in SQL.
+
+    Returns a values() queryset of ready-to-render dicts: the book is a
+    JSON object and payments are aggregated with a correlated array
+    subquery, so no model instances or serializer fields are involved.
+    Works for both Borrowing and ArchivedBorrowing querysets.
+    """
+    payment_model = queryset.model._meta.get_field("payments").related_model
+    payments = (
+        payment_model.objects.filter(borrowing=OuterRef("pk"))
+        .order_by("id")
+        .values(
+            json=JSONObject(
+                **{
+                    field: get_json_value(field)
+                    for field in PaymentSerializer.Meta.fields
+                    if field != "borrowing"
+                },
+                borrowing=F("borrowing_id"),
+            )
+        )
+    )
+
+    return queryset.values(
+        "id",
+        "borrow_date",
+        "expected_return_date",
+        "actual_return_date",
+        "user_id",
+        book_data=JSONObject(
+            **{
+                field: get_json_value(field, prefix="book__")
+                for field in BookSerializer.Meta.fields
+            }
+        ),
+        user_full_name=Trim(Concat("user__first_name", Value(" "), "user__last_name")),
+        payments_data=ArraySubquery(payments),
+    )
@@ -0,0 +1,104 @@
+import datetime
+from typing import Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_q.tasks import async_task
+
+from borrowing.models import Borrowing, Reminder
+from borrowing.notifications import send_telegram_notification
+
+REMINDER_BATCH_SIZE = 500
+# A queued batch that has not been sent by then is queued again,
+# e.g. after its worker was killed
+REQUEUE_AFTER = datetime.timedelta(hours=1)
+
+
+def get_reminder_message(reminder: Reminder) -> str:
+    borrowing = reminder.borrowing
+    if reminder.offset_days:
+        due = f"is due in {reminder.offset_days} day(s)"
+    else:
+        due = "is due today"
+    return (
+        f"Reminder: {borrowing.book.title} {due} "
+        f"({borrowing.expected_return_date}).\n"
+        f"Borrowing id: {borrowing.id}, user: {borrowing.user.email}"
+    )
+
+
+def schedule_reminders(borrowings: Iterable[Borrowing]) -> None:
+    """Put new borrowings into the day buckets of their reminders"""
+    today = timezone.now().date()
+    reminders = []
+
+    for borrowing in borrowings:
+        for offset_days in settings.BORROWING_REMINDER_OFFSETS:
+            remind_on = borrowing.expected_return_date - datetime.timedelta(
+                days=offset_days
+            )
+            if remind_on >= today:
+                reminders.append(
+                    Reminder(
+                        borrowing=borrowing,
+                        offset_days=offset_days,
+                        remind_on=remind_on,
+                    )
+                )
+
+    Reminder.objects.bulk_create(reminders, ignore_conflicts=True)
+
+
+def enqueue_due_reminders(batch_size: int = REMINDER_BATCH_SIZE) -> int:
+    """
+    Queue a django_q task for every batch of reminders in today's bucket.
+
+    Only the unsent rows up to today are read, through a partial index.
+    Reminders of returned borrowings are dropped instead of queued.
+    """
+    now = timezone.now()
+    due = Reminder.objects.filter(remind_on__lte=now.date(), sent_at__isnull=True)
+    due.filter(borrowing__actual_return_date__isnull=False).delete()
+    queued = 0
+
+    while True:
+        with transaction.atomic():
+            reminder_ids = list(
+                due.filter(
+                    Q(queued_at__isnull=True) | Q(queued_at__lt=now - REQUEUE_AFTER)
+                )
+                .select_for_update(skip_locked=True)
+                .order_by("remind_on", "id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            Reminder.objects.filter(id__in=reminder_ids).update(queued_at=now)
+            if reminder_ids:
+                transaction.on_commit(
+                    lambda ids=reminder_ids: async_task(
+                        "borrowing.reminders.send_reminders", ids
+                    )
+                )
+
+        queued += len(reminder_ids)
+        if len(reminder_ids) < batch_size:
+            return queued
+
+
+@transaction.atomic
+def send_reminders(reminder_ids: list[int]) -> int:
+    """Write the reminders to the notification outbox, at most once each"""
+    reminders = list(
+        Reminder.objects.select_for_update(skip_locked=True, of=("self",))
+        .select_related("borrowing__book", "borrowing__user")
+        .filter(id__in=reminder_ids, sent_at__isnull=True)
+    )
+
+    for reminder in reminders:
+        send_telegram_notification(get_reminder_message(reminder))
+
+    Reminder.objects.filter(id__in=[reminder.id for reminder in reminders]).update(
+        sent_at=timezone.now()
+    )
+    return len(reminders)
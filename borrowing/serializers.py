@@ -1,15 +1,37 @@
+from collections import Counter
+
 from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from book.models import Book
+from book.inventory import reserve_copy
 from book.serializers import BookSerializer
-from borrowing.models import Borrowing
+from borrowing.holds import claim_hold, has_ready_hold
+from borrowing.models import Borrowing, Hold
 from borrowing.notifications import send_telegram_notification
+from borrowing.reminders import schedule_reminders
 from borrowing.utils import get_borrowing_info
-from payment.models import Payment
+from payment.ledger import has_pending_payments
 from payment.serializers import PaymentSerializer
-from payment.utils import create_stripe_session
+from payment.stripe_client import expire_checkout_session
+from payment.utils import create_batch_stripe_session, create_stripe_session
+
+MAX_BATCH_BORROWINGS = 20
+MAX_BULK_RETURNS = 1000
+HOLD_EXISTS_MESSAGE = "You already have a hold for this book."
+
+
+def validate_no_pending_payments(user) -> None:
+    if has_pending_payments(user):
+        raise ValidationError(
+            detail="You have one or more pending payments. You can't make borrowings until you pay for them."
+        )
+
+
+def discard_checkout_session(session) -> None:
+    """Expire the session of a checkout that is rolled back, so it can't be paid"""
+    if session is not None:
+        expire_checkout_session(session.id)
 
 
 class BorrowingSerializer(serializers.ModelSerializer):
@@ -45,6 +67,33 @@ class BorrowingReadSerializer(serializers.ModelSerializer):
         )
 
 
+class BorrowingProjectionSerializer(serializers.BaseSerializer):
+    """
+    Renders rows of `project_borrowings` in the BorrowingReadSerializer
+    shape, without per-field serialization
+    """
+
+    date_field = serializers.DateField()
+
+    def to_representation(self, instance: dict) -> dict:
+        book = instance["book_data"]
+        to_date = self.date_field.to_representation
+
+        return {
+            "id": instance["id"],
+            "borrow_date": to_date(instance["borrow_date"]),
+            "expected_return_date": to_date(instance["expected_return_date"]),
+            "actual_return_date": to_date(instance["actual_return_date"]),
+            "book": {field: book[field] for field in BookSerializer.Meta.fields},
+            "user_id": instance["user_id"],
+            "user_full_name": instance["user_full_name"],
+            "payments": [
+                {field: payment[field] for field in PaymentSerializer.Meta.fields}
+                for payment in instance["payments_data"]
+            ],
+        }
+
+
 class BorrowingCreateSerializer(serializers.ModelSerializer):
     payments = PaymentSerializer(read_only=True, many=True)
 
@@ -55,17 +104,16 @@ class BorrowingCreateSerializer(serializers.ModelSerializer):
 
     def validate(self, attrs) -> dict:
         data = super().validate(attrs=attrs)
-        user = self.context["request"].user
-        pending_payments = Payment.objects.filter(borrowing__user=user).filter(
-            status="Pending"
-        )
 
-        if pending_payments:
+        # Batch checkouts check pending payments once for the whole basket
+        if self.parent is None:
+            validate_no_pending_payments(self.context["request"].user)
+        if attrs["book"].inventory == 0 and not has_ready_hold(
+            self.context["request"].user, attrs["book"].id
+        ):
             raise ValidationError(
-                detail="You have one or more pending payments. You can't make borrowings until you pay for them."
+                detail="Book inventory is 0. Place a hold to get the next copy."
             )
-        if attrs["book"].inventory == 0:
-            raise ValidationError(detail="Book inventory is 0.")
         return data
 
     def create(self, validated_data) -> Borrowing:
@@ -73,17 +121,90 @@ class BorrowingCreateSerializer(serializers.ModelSerializer):
             book = validated_data["book"]
             borrowing = Borrowing.objects.create(**validated_data)
 
-            create_stripe_session(
+            session = create_stripe_session(
                 borrowing, self.context["request"], payment_type="Payment"
             )
-            Book.objects.filter(pk=book.id).update(inventory=book.inventory - 1)
+
+            # Reserved last so that the book row is locked only until commit,
+            # a ready hold already has its copy set aside
+            if (
+                not claim_hold(validated_data["user"], book.id)
+                and reserve_copy(book.id) is None
+            ):
+                discard_checkout_session(session)
+                raise ValidationError(
+                    detail="Book inventory is 0. Place a hold to get the next copy."
+                )
 
             message = "New borrowing created:\n" + get_borrowing_info(borrowing)
             send_telegram_notification(message)
+            schedule_reminders([borrowing])
 
             return borrowing
 
 
+class BorrowingBatchCreateSerializer(serializers.Serializer):
+    borrowings = BorrowingCreateSerializer(many=True)
+
+    def validate_borrowings(self, value: list) -> list:
+        if not value:
+            raise ValidationError("Add at least one book to borrow.")
+        if len(value) > MAX_BATCH_BORROWINGS:
+            raise ValidationError(
+                f"You can borrow at most {MAX_BATCH_BORROWINGS} books at once."
+            )
+        return value
+
+    def validate(self, attrs) -> dict:
+        user = self.context["request"].user
+        validate_no_pending_payments(user)
+        books = Counter(item["book"] for item in attrs["borrowings"])
+
+        for book, copies in books.items():
+            # A ready hold has one more copy set aside for the user
+            if book.inventory + has_ready_hold(user, book.id) < copies:
+                raise ValidationError(
+                    detail=f"Not enough copies of {book.title} in inventory."
+                )
+        return attrs
+
+    def create(self, validated_data) -> dict:
+        with transaction.atomic():
+            borrowings = Borrowing.objects.bulk_create(
+                [
+                    Borrowing(user=validated_data["user"], **item)
+                    for item in validated_data["borrowings"]
+                ]
+            )
+
+            session = create_batch_stripe_session(
+                borrowings, self.context["request"], payment_type="Payment"
+            )
+
+            # Reserved last and in book id order to keep row locks short
+            # and to avoid deadlocks between overlapping baskets,
+            # the first copy of a book is taken from a ready hold if any
+            claimed = set()
+            for borrowing in sorted(borrowings, key=lambda item: item.book_id):
+                if borrowing.book_id not in claimed:
+                    claimed.add(borrowing.book_id)
+                    if claim_hold(validated_data["user"], borrowing.book_id):
+                        continue
+                if reserve_copy(borrowing.book_id) is None:
+                    discard_checkout_session(session)
+                    raise ValidationError(
+                        detail=f"Not enough copies of {borrowing.book.title} in inventory."
+                    )
+
+            message = "New borrowings created:\n" + "\n\n".join(
+                get_borrowing_info(borrowing) for borrowing in borrowings
+            )
+            send_telegram_notification(message)
+            schedule_reminders(borrowings)
+
+            return {"borrowings": borrowings}
+
+
 class BorrowingReturnSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -100,3 +221,34 @@ class BorrowingReturnSerializer(serializers.ModelSerializer):
         if self.instance.actual_return_date is not None:
             raise ValidationError(detail="Borrowing has been already returned.")
         return super().validate(attrs=attrs)
+
+
+class BorrowingBulkReturnSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BULK_RETURNS,
+    )
+
+
+class HoldSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Hold
+        fields = ("id", "book", "status", "created_at", "claim_expires_at")
+        read_only_fields = ("id", "status", "created_at", "claim_expires_at")
+
+    def validate(self, attrs) -> dict:
+        data = super().validate(attrs=attrs)
+        user = self.context["request"].user
+
+        if attrs["book"].inventory > 0:
+            raise ValidationError(
+                detail="Book is available, you can borrow it right away."
+            )
+        if Hold.objects.filter(
+            user=user,
+            book=attrs["book"],
+            status__in=(Hold.StatusChoices.WAITING, Hold.StatusChoices.READY),
+        ).exists():
+            raise ValidationError(detail=HOLD_EXISTS_MESSAGE)
+        return data
@@ -8,3 +8,33 @@ schedule(
     repeats=-1,
     next_run=timezone.now() + timezone.timedelta(minutes=1),
 )
+
+schedule(
+    "borrowing.archive.archive_borrowings",
+    schedule_type="D",
+    repeats=-1,
+    next_run=timezone.now() + timezone.timedelta(minutes=1),
+)
+
+schedule(
+    "borrowing.holds.expire_holds",
+    schedule_type="I",
+    minutes=5,
+    repeats=-1,
+    next_run=timezone.now() + timezone.timedelta(minutes=1),
+)
+
+schedule(
+    "borrowing.reminders.enqueue_due_reminders",
+    schedule_type="H",
+    repeats=-1,
+    next_run=timezone.now() + timezone.timedelta(minutes=1),
+)
+
+schedule(
+    "borrowing.notifications.deliver_notifications",
+    schedule_type="I",
+    minutes=1,
+    repeats=-1,
+    next_run=timezone.now() + timezone.timedelta(minutes=1),
+)
@@ -1,17 +1,53 @@
+import base64
 import datetime
+import json
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
 
+import requests
+import stripe
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.db.models import Prefetch
+from django.test import TestCase, TransactionTestCase
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from book.models import Book
-from borrowing.models import Borrowing
+from borrowing.archive import archive_borrowings
+from borrowing.holds import expire_holds
+from borrowing.models import (
+    ArchivedBorrowing,
+    Borrowing,
+    Hold,
+    Notification,
+    Reminder,
+)
+from borrowing.notifications import (
+    MESSAGE_MAX_LENGTH,
+    deliver_notifications,
+    send_telegram_notification,
+)
+from borrowing.reminders import enqueue_due_reminders, send_reminders
 from borrowing.serializers import BorrowingReadSerializer
+from borrowing.utils import (
+    build_overdue_digest,
+    daily_borrowings_overdue_notification,
+    overdue_digest_messages,
+)
+from payment.models import Payment
+from payment.stripe_client import stripe_breaker
+from payment.utils import fill_stripe_sessions, refill_stale_sessions
 
 BORROWINGS_URL = reverse("borrowing:borrowing-list")
+BORROWINGS_EXPORT_URL = reverse("borrowing:borrowing-export")
+BORROWINGS_BATCH_URL = reverse("borrowing:borrowing-batch")
+BORROWINGS_BULK_RETURN_URL = reverse("borrowing:borrowing-bulk-return")
+HOLDS_URL = reverse("borrowing:hold-list")
 
 
 def create_book() -> Book:
@@ -78,6 +114,47 @@ class AuthenticatedBorrowingTests(TestCase):
         self.assertIn(serializer_active.data, res.data["results"])
         self.assertNotIn(serializer_returned.data, res.data["results"])
 
+    def test_borrowings_list_cursor_pagination(self):
+        for days in range(6):
+            Borrowing.objects.create(
+                expected_return_date=timezone.now().date()
+                + timezone.timedelta(days=days + 1),
+                book=self.book,
+                user=self.user1,
+            )
+        expected = list(
+            Borrowing.objects.filter(user=self.user1)
+            .order_by("borrow_date", "id")
+            .values_list("id", flat=True)
+        )
+
+        ids = []
+        res = self.client.get(
+            BORROWINGS_URL, data={"pagination": "cursor", "page_size": 3}
+        )
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids += [borrowing["id"] for borrowing in res.data["results"]]
+            if res.data["next"] is None:
+                break
+            res = self.client.get(res.data["next"])
+
+        self.assertEqual(ids, expected)
+
+    def test_borrowings_list_invalid_cursor_values(self):
+        for values in (["x", "abc"], ["2024-01-01", None], [[], {}]):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps({"v": values, "r": 0}).encode()
+            ).decode()
+            res = self.client.get(BORROWINGS_URL, data={"cursor": cursor})
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_borrowings_export_admin_only(self):
+        res = self.client.get(BORROWINGS_EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
     def test_retrieve_borrowing(self):
         detail_url = reverse(
             "borrowing:borrowing-detail", args=[self.user1_borrowing.id]
@@ -137,6 +214,565 @@ class AuthenticatedBorrowingTests(TestCase):
         )
 
 
+class ConcurrentBorrowingTests(TransactionTestCase):
+    def setUp(self) -> None:
+        self.book = create_book()
+        self.book.inventory = 50
+        self.book.save()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+
+    def borrow(self, _) -> int:
+        client = APIClient()
+        client.force_authenticate(self.user)
+        data = {
+            "expected_return_date": timezone.now().date() + timezone.timedelta(days=7),
+            "book": self.book.id,
+        }
+        try:
+            return client.post(BORROWINGS_URL, data=data).status_code
+        finally:
+            connection.close()
+
+    @mock.patch("borrowing.serializers.send_telegram_notification")
+    @mock.patch("borrowing.serializers.create_stripe_session")
+    @mock.patch("borrowing.serializers.expire_checkout_session")
+    def test_parallel_borrowings_never_oversell(
+        self, expire_session, create_session, send_notification
+    ):
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            statuses = list(executor.map(self.borrow, range(300)))
+
+        self.book.refresh_from_db()
+
+        self.assertEqual(statuses.count(status.HTTP_201_CREATED), 50)
+        self.assertEqual(statuses.count(status.HTTP_400_BAD_REQUEST), 250)
+        self.assertEqual(self.book.inventory, 0)
+        self.assertEqual(Borrowing.objects.filter(book=self.book).count(), 50)
+        # Sessions of the checkouts that lost the race are not left payable
+        self.assertEqual(expire_session.call_count, create_session.call_count - 50)
+
+    @mock.patch("borrowing.views.create_stripe_session")
+    def test_parallel_returns_release_one_copy(self, create_session):
+        today = timezone.now().date()
+        borrowing = Borrowing.objects.create(
+            expected_return_date=today - timezone.timedelta(days=2),
+            book=self.book,
+            user=self.user,
+        )
+        url = reverse("borrowing:borrowing-return", args=[borrowing.id])
+
+        def return_borrowing(_) -> int:
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                return client.post(url).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            statuses = list(executor.map(return_borrowing, range(10)))
+
+        self.book.refresh_from_db()
+
+        self.assertEqual(statuses.count(status.HTTP_200_OK), 1)
+        self.assertEqual(statuses.count(status.HTTP_400_BAD_REQUEST), 9)
+        self.assertEqual(self.book.inventory, 51)
+        self.assertEqual(create_session.call_count, 1)
+
+
+class BatchBorrowingTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        self.books = [create_book() for _ in range(3)]
+        self.client.force_authenticate(self.user)
+
+    def get_data(self, books: list) -> dict:
+        expected_return_date = timezone.now().date() + timezone.timedelta(days=3)
+        return {
+            "borrowings": [
+                {"book": book.id, "expected_return_date": expected_return_date}
+                for book in books
+            ]
+        }
+
+    @mock.patch("payment.utils.stripe.checkout.Session.create")
+    def test_batch_borrowing_create(self, session_create):
+        session_create.return_value = mock.Mock(
+            id="cs_test_batch", url="https://checkout.stripe.com/c/pay/cs_test_batch"
+        )
+        books = self.books + [self.books[0]]
+        res = self.client.post(
+            BORROWINGS_BATCH_URL, data=self.get_data(books), format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data["borrowings"]), 4)
+        self.assertEqual(session_create.call_count, 1)
+        self.assertEqual(len(session_create.call_args.kwargs["line_items"]), 4)
+        self.assertEqual(Payment.objects.filter(session_id="cs_test_batch").count(), 4)
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(Book.objects.get(pk=self.books[0].id).inventory, 18)
+        self.assertEqual(Book.objects.get(pk=self.books[1].id).inventory, 19)
+
+    @mock.patch("payment.utils.stripe.checkout.Session.create")
+    def test_batch_borrowing_not_enough_copies(self, session_create):
+        Book.objects.filter(pk=self.books[1].id).update(inventory=1)
+        books = self.books + [self.books[1]]
+        res = self.client.post(
+            BORROWINGS_BATCH_URL, data=self.get_data(books), format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Borrowing.objects.exists())
+        session_create.assert_not_called()
+
+    @mock.patch("payment.utils.stripe.checkout.Session.create")
+    def test_batch_borrowing_claims_ready_hold(self, session_create):
+        session_create.return_value = mock.Mock(
+            id="cs_test_hold", url="https://checkout.stripe.com/c/pay/cs_test_hold"
+        )
+        Book.objects.filter(pk=self.books[0].id).update(inventory=0)
+        hold = Hold.objects.create(
+            book=self.books[0],
+            user=self.user,
+            status=Hold.StatusChoices.READY,
+            claim_expires_at=timezone.now() + timezone.timedelta(days=1),
+        )
+
+        res = self.client.post(
+            BORROWINGS_BATCH_URL,
+            data=self.get_data(self.books + [self.books[0]]),
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(
+            BORROWINGS_BATCH_URL, data=self.get_data(self.books), format="json"
+        )
+        hold.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(hold.status, Hold.StatusChoices.FULFILLED)
+        self.assertEqual(Book.objects.get(pk=self.books[0].id).inventory, 0)
+        self.assertEqual(Book.objects.get(pk=self.books[1].id).inventory, 19)
+
+    @mock.patch("payment.stripe_client.stripe.checkout.Session.expire")
+    @mock.patch("payment.utils.stripe.checkout.Session.create")
+    @mock.patch("borrowing.serializers.reserve_copy", return_value=None)
+    def test_batch_borrowing_sold_out_expires_session(
+        self, reserve_copy, session_create, session_expire
+    ):
+        session_create.return_value = mock.Mock(
+            id="cs_test_sold_out",
+            url="https://checkout.stripe.com/c/pay/cs_test_sold_out",
+        )
+        res = self.client.post(
+            BORROWINGS_BATCH_URL, data=self.get_data(self.books), format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Payment.objects.exists())
+        session_expire.assert_called_once_with("cs_test_sold_out")
+
+
+@mock.patch("borrowing.notifications.time.sleep")
+class NotificationOutboxTests(TestCase):
+    @mock.patch("borrowing.notifications.session.post")
+    def test_notifications_are_merged(self, post, sleep):
+        for number in range(3):
+            send_telegram_notification(f"Message {number}")
+        send_telegram_notification("x" * MESSAGE_MAX_LENGTH)
+        post.return_value.status_code = 200
+
+        stats = deliver_notifications()
+        texts = [call.kwargs["json"]["text"] for call in post.call_args_list]
+
+        self.assertEqual(stats["messages"], 2)
+        self.assertEqual(stats["notifications"], 4)
+        self.assertEqual(texts[0], "Message 0\n\nMessage 1\n\nMessage 2")
+        self.assertFalse(Notification.objects.filter(sent_at__isnull=True).exists())
+        # Only waits between messages, not after the last one
+        sleep.assert_called_once()
+
+    @mock.patch("borrowing.notifications.session.post")
+    def test_failed_delivery_is_retried_later(self, post, sleep):
+        send_telegram_notification("Message")
+        post.side_effect = requests.ConnectionError("Telegram is down")
+
+        stats = deliver_notifications()
+        notification = Notification.objects.get()
+
+        self.assertEqual(stats["failed"], 1)
+        self.assertIsNone(notification.sent_at)
+        self.assertEqual(notification.attempts, 1)
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+        self.assertEqual(deliver_notifications()["messages"], 0)
+
+    @mock.patch("borrowing.notifications.session.post")
+    def test_claimed_notifications_are_not_sent_twice(self, post, sleep):
+        send_telegram_notification("Message")
+
+        with mock.patch("borrowing.notifications.post_message") as post_message:
+            # Another run starts while the claimed batch is being sent
+            post_message.side_effect = lambda text: deliver_notifications()
+            deliver_notifications()
+
+        post_message.assert_called_once()
+        self.assertIsNotNone(Notification.objects.get().sent_at)
+
+    @mock.patch("borrowing.notifications.time.monotonic")
+    @mock.patch("borrowing.notifications.session.post")
+    def test_delivery_stops_at_time_limit(self, post, monotonic, sleep):
+        for number in range(3):
+            send_telegram_notification("x" * MESSAGE_MAX_LENGTH)
+        post.return_value.status_code = 200
+        monotonic.side_effect = [0, 0, 20, 40]
+
+        stats = deliver_notifications()
+
+        self.assertEqual(stats["messages"], 2)
+        self.assertEqual(Notification.objects.filter(sent_at__isnull=True).count(), 1)
+
+    @mock.patch("borrowing.notifications.session.post")
+    def test_rate_limit_respects_retry_after(self, post, sleep):
+        send_telegram_notification("Message")
+        post.return_value.status_code = 429
+        post.return_value.json.return_value = {"parameters": {"retry_after": 120}}
+
+        deliver_notifications()
+        notification = Notification.objects.get()
+
+        self.assertGreater(
+            notification.next_attempt_at,
+            timezone.now() + timezone.timedelta(seconds=100),
+        )
+
+
+@mock.patch("borrowing.serializers.create_stripe_session")
+class HoldTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        self.other_user = get_user_model().objects.create_user(
+            email="other@test.com", password="test12345"
+        )
+        self.book = create_book()
+        Book.objects.filter(pk=self.book.id).update(inventory=0)
+        self.borrowing = Borrowing.objects.create(
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=1),
+            book=self.book,
+            user=self.other_user,
+        )
+        self.client.force_authenticate(self.user)
+        self.data = {
+            "book": self.book.id,
+            "expected_return_date": timezone.now().date() + timezone.timedelta(days=2),
+        }
+
+    def test_concurrent_duplicate_hold(self, session):
+        Hold.objects.create(user=self.user, book=self.book)
+
+        # The other request commits between the duplicate check and the insert
+        with mock.patch(
+            "borrowing.serializers.HoldSerializer.validate", lambda _, attrs: attrs
+        ):
+            res = self.client.post(HOLDS_URL, data={"book": self.book.id})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Hold.objects.filter(user=self.user).count(), 1)
+
+    def test_returned_copy_goes_to_oldest_hold(self, session):
+        res = self.client.post(BORROWINGS_URL, data=self.data)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(HOLDS_URL, data={"book": self.book.id})
+        res_again = self.client.post(HOLDS_URL, data={"book": self.book.id})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res_again.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(self.other_user)
+        self.client.post(
+            reverse("borrowing:borrowing-return", args=[self.borrowing.id])
+        )
+        hold = Hold.objects.get(user=self.user)
+
+        self.assertEqual(hold.status, Hold.StatusChoices.READY)
+        self.assertEqual(Book.objects.get(pk=self.book.id).inventory, 0)
+
+        res = self.client.post(BORROWINGS_URL, data=self.data)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(self.user)
+        res = self.client.post(BORROWINGS_URL, data=self.data)
+        hold.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(hold.status, Hold.StatusChoices.FULFILLED)
+        self.assertEqual(Book.objects.get(pk=self.book.id).inventory, 0)
+
+    def test_expired_claim_passes_copy_on(self, session):
+        expired = Hold.objects.create(
+            book=self.book,
+            user=self.user,
+            status=Hold.StatusChoices.READY,
+            claim_expires_at=timezone.now() - timezone.timedelta(minutes=1),
+        )
+        waiting = Hold.objects.create(book=self.book, user=self.other_user)
+
+        self.assertEqual(expire_holds(), 1)
+        expired.refresh_from_db()
+        waiting.refresh_from_db()
+        self.assertEqual(expired.status, Hold.StatusChoices.EXPIRED)
+        self.assertEqual(waiting.status, Hold.StatusChoices.READY)
+
+        Hold.objects.filter(pk=waiting.pk).update(claim_expires_at=timezone.now())
+
+        self.assertEqual(expire_holds(), 1)
+        self.assertEqual(Book.objects.get(pk=self.book.id).inventory, 1)
+
+    def test_cancel_ready_hold_releases_copy(self, session):
+        hold = Hold.objects.create(
+            book=self.book,
+            user=self.user,
+            status=Hold.StatusChoices.READY,
+            claim_expires_at=timezone.now() + timezone.timedelta(days=1),
+        )
+        res = self.client.delete(reverse("borrowing:hold-detail", args=[hold.id]))
+        hold.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(hold.status, Hold.StatusChoices.CANCELLED)
+        self.assertEqual(Book.objects.get(pk=self.book.id).inventory, 1)
+
+
+class ReminderTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        self.book = create_book()
+        self.client.force_authenticate(self.user)
+
+    @mock.patch("borrowing.serializers.create_stripe_session")
+    def test_reminders_are_bucketed_on_create(self, create_stripe_session):
+        expected_return_date = timezone.now().date() + timezone.timedelta(days=2)
+        self.client.post(
+            BORROWINGS_URL,
+            data={"book": self.book.id, "expected_return_date": expected_return_date},
+        )
+
+        self.assertEqual(
+            list(Reminder.objects.values_list("offset_days", "remind_on")),
+            [
+                (1, expected_return_date - timezone.timedelta(days=1)),
+                (0, expected_return_date),
+            ],
+        )
+
+    @mock.patch("borrowing.reminders.async_task")
+    def test_due_reminders_are_sent_once(self, async_task):
+        today = timezone.now().date()
+        active = Borrowing.objects.create(
+            expected_return_date=today + timezone.timedelta(days=1),
+            book=self.book,
+            user=self.user,
+        )
+        returned = Borrowing.objects.create(
+            expected_return_date=today,
+            actual_return_date=today,
+            book=self.book,
+            user=self.user,
+        )
+        due = Reminder.objects.create(
+            borrowing=active,
+            offset_days=1,
+            remind_on=today,
+        )
+        Reminder.objects.create(
+            borrowing=active,
+            offset_days=0,
+            remind_on=active.expected_return_date,
+        )
+        Reminder.objects.create(borrowing=returned, offset_days=0, remind_on=today)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(enqueue_due_reminders(), 1)
+            self.assertEqual(enqueue_due_reminders(), 0)
+
+        async_task.assert_called_once_with(
+            "borrowing.reminders.send_reminders", [due.id]
+        )
+        self.assertEqual(Reminder.objects.count(), 2)
+
+        self.assertEqual(send_reminders([due.id]), 1)
+        self.assertEqual(send_reminders([due.id]), 0)
+        self.assertIn("is due in 1 day(s)", Notification.objects.get().message)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        self.book = create_book()
+        self.client.force_authenticate(self.user)
+        old = datetime.date(2020, 1, 1)
+
+        for number, payment_status in enumerate(("Paid", "Paid", "Pending")):
+            borrowing = Borrowing.objects.create(
+                expected_return_date=old, book=self.book, user=self.user
+            )
+            Payment.objects.create(
+                status=payment_status,
+                type="Payment",
+                borrowing=borrowing,
+                money_to_pay=1.99,
+            )
+            Borrowing.objects.filter(pk=borrowing.pk).update(
+                borrow_date=old + datetime.timedelta(days=number),
+                actual_return_date=old + datetime.timedelta(days=7),
+            )
+
+        self.active = Borrowing.objects.create(
+            expected_return_date=timezone.now().date(), book=self.book, user=self.user
+        )
+
+    def test_archive_moves_settled_borrowings(self):
+        self.assertEqual(archive_borrowings(batch_size=1), 2)
+        self.assertEqual(Borrowing.objects.count(), 2)
+        self.assertEqual(ArchivedBorrowing.objects.count(), 2)
+        self.assertFalse(Payment.objects.filter(status="Paid").exists())
+        self.assertEqual(
+            ArchivedBorrowing.objects.first().payments.get().money_to_pay,
+            Decimal("1.99"),
+        )
+        self.assertEqual(archive_borrowings(), 0)
+
+    def test_list_include_archived(self):
+        archive_borrowings()
+        res = self.client.get(BORROWINGS_URL)
+
+        self.assertEqual(res.data["count"], 2)
+
+        res = self.client.get(
+            BORROWINGS_URL, data={"include_archived": "true", "page_size": 2}
+        )
+        ids = [borrowing["id"] for borrowing in res.data["results"]]
+
+        self.assertEqual(res.data["count"], 4)
+        self.assertEqual(
+            ids, list(ArchivedBorrowing.objects.values_list("id", flat=True))
+        )
+        self.assertEqual(res.data["results"][0]["payments"][0]["status"], "Paid")
+
+        res = self.client.get(
+            BORROWINGS_URL,
+            data={"include_archived": "true", "pagination": "cursor", "page_size": 3},
+        )
+        res = self.client.get(res.data["next"])
+
+        self.assertEqual(
+            [borrowing["id"] for borrowing in res.data["results"]], [self.active.id]
+        )
+
+
+class BorrowingProjectionTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com",
+            password="test12345",
+            first_name="Test",
+            last_name="User",
+        )
+        self.borrowing = Borrowing.objects.create(
+            expected_return_date=timezone.now().date(),
+            actual_return_date=timezone.now().date(),
+            book=create_book(),
+            user=self.user,
+        )
+        for payment_type in ("Payment", "Fine"):
+            Payment.objects.create(
+                status="Paid",
+                type=payment_type,
+                borrowing=self.borrowing,
+                session_url="https://checkout.stripe.com/c/pay/cs_test",
+                session_id="cs_test",
+                money_to_pay=Decimal("3.98"),
+            )
+        self.client.force_authenticate(self.user)
+
+    def test_projection_matches_read_serializer(self):
+        expected = BorrowingReadSerializer(
+            Borrowing.objects.prefetch_related(
+                Prefetch("payments", queryset=Payment.objects.order_by("id"))
+            ).get()
+        ).data
+        res_list = self.client.get(BORROWINGS_URL)
+        res_detail = self.client.get(
+            reverse("borrowing:borrowing-detail", args=[self.borrowing.id])
+        )
+
+        self.assertEqual(res_detail.status_code, status.HTTP_200_OK)
+        self.assertEqual(res_detail.data, expected)
+        self.assertEqual(res_list.data["results"], [expected])
+        self.assertEqual(res_detail.data["user_full_name"], "Test User")
+        self.assertEqual(res_detail.data["book"]["daily_fee"], "1.99")
+
+
+class OverdueDigestTests(TestCase):
+    def test_overdue_digest_is_queued_once(self):
+        user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        book = create_book()
+        today = timezone.now().date()
+
+        for days in (-5, -1, 0, 7):
+            Borrowing.objects.create(
+                expected_return_date=today + timezone.timedelta(days=days),
+                book=book,
+                user=user,
+            )
+        Borrowing.objects.create(
+            expected_return_date=today - timezone.timedelta(days=3),
+            actual_return_date=today,
+            book=book,
+            user=user,
+        )
+
+        stats = daily_borrowings_overdue_notification()
+
+        self.assertEqual(stats["overdue"], 3)
+        self.assertEqual(stats["pages"], 1)
+        message = Notification.objects.get().message
+        self.assertTrue(message.startswith("Borrowings overdue: 3 (page 1/1)"))
+
+    def test_overdue_digest_pages(self):
+        due = datetime.date(2023, 1, 1)
+        rows = [(number, due, "Book " * 10, number) for number in range(1, 501)]
+        pages, total = build_overdue_digest(rows, max_pages=2)
+        messages = list(overdue_digest_messages(pages, total))
+
+        self.assertEqual(total, 500)
+        self.assertEqual(len(messages), 2)
+        self.assertTrue(all(len(message) <= MESSAGE_MAX_LENGTH for message in messages))
+        self.assertIn("more", messages[-1].splitlines()[-1])
+
+
 class AdminBorrowingTests(TestCase):
     def setUp(self) -> None:
         self.client = APIClient()
@@ -167,3 +803,131 @@ class AdminBorrowingTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn(serializer_user.data, res.data["results"])
         self.assertNotIn(serializer_admin.data, res.data["results"])
+
+    def test_borrowings_export_ndjson(self):
+        res = self.client.get(BORROWINGS_EXPORT_URL, data={"file_format": "ndjson"})
+        records = [
+            json.loads(line)
+            for line in b"".join(res.streaming_content).decode().splitlines()
+        ]
+        expected = [
+            json.loads(json.dumps(BorrowingReadSerializer(borrowing).data))
+            for borrowing in Borrowing.objects.order_by("id")
+        ]
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        self.assertEqual(records, expected)
+
+    def test_borrowings_export_invalid_format(self):
+        res = self.client.get(BORROWINGS_EXPORT_URL, data={"file_format": "xml"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @mock.patch("payment.utils.async_task")
+    def test_bulk_return(self, async_task):
+        today = timezone.now().date()
+        overdue = Borrowing.objects.create(
+            expected_return_date=today - timezone.timedelta(days=3),
+            book=self.book,
+            user=self.user,
+        )
+        returned = Borrowing.objects.create(
+            expected_return_date=today,
+            actual_return_date=today,
+            book=self.book,
+            user=self.user,
+        )
+        missing_id = returned.id + 1000
+        ids = [self.user_borrowing.id, overdue.id, returned.id, missing_id, overdue.id]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                BORROWINGS_BULK_RETURN_URL, data={"ids": ids}, format="json"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item["result"], item["overdue_days"]) for item in res.data["results"]],
+            [
+                ("returned", 0),
+                ("returned", 3),
+                ("already_returned", 0),
+                ("not_found", 0),
+            ],
+        )
+        self.assertEqual(Book.objects.get(pk=self.book.id).inventory, 22)
+        self.assertEqual(
+            Borrowing.objects.filter(actual_return_date__isnull=True).count(), 1
+        )
+        fine = Payment.objects.get(borrowing=overdue)
+        self.assertEqual(fine.type, Payment.TypeChoices.FINE)
+        self.assertEqual(fine.status, Payment.StatusChoices.CREATING)
+        self.assertEqual(async_task.call_count, 1)
+        self.assertEqual(async_task.call_args.args[1], [fine.id])
+
+    @mock.patch("payment.utils.stripe.checkout.Session.create")
+    @mock.patch("payment.utils.async_task")
+    def test_bulk_return_failed_fine_session_is_refilled(
+        self, async_task, session_create
+    ):
+        self.addCleanup(stripe_breaker.reset)
+        today = timezone.now().date()
+        overdue = [
+            Borrowing.objects.create(
+                expected_return_date=today - timezone.timedelta(days=days),
+                book=self.book,
+                user=self.user,
+            )
+            for days in (3, 5)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                BORROWINGS_BULK_RETURN_URL,
+                data={"ids": [borrowing.id for borrowing in overdue]},
+                format="json",
+            )
+        session_create.side_effect = [
+            stripe.error.APIError("Internal error"),
+            SimpleNamespace(id="cs_test_fine_5", url="https://stripe.test/5"),
+            SimpleNamespace(id="cs_test_fine_3", url="https://stripe.test/3"),
+        ]
+
+        fill_stripe_sessions(*async_task.call_args.args[1:])
+        fines = Payment.objects.filter(borrowing__in=overdue).order_by("borrowing")
+
+        self.assertEqual(
+            [fine.status for fine in fines],
+            [Payment.StatusChoices.CREATING, Payment.StatusChoices.PENDING],
+        )
+
+        fines.update(session_requested_at=timezone.now() - timezone.timedelta(hours=1))
+        metrics = refill_stale_sessions()
+
+        self.assertEqual(metrics["filled"], 1)
+        self.assertEqual(
+            Payment.objects.get(borrowing=overdue[0]).session_id, "cs_test_fine_3"
+        )
+        self.assertEqual(
+            session_create.call_args.kwargs["line_items"][0]["price_data"][
+                "product_data"
+            ]["name"],
+            "Fine payment for Test book: 3 days overdue",
+        )
+
+    def test_bulk_return_invalid_ids(self):
+        res = self.client.post(
+            BORROWINGS_BULK_RETURN_URL, data={"ids": [0]}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_return_admin_only(self):
+        self.client.force_authenticate(self.user)
+        res = self.client.post(
+            BORROWINGS_BULK_RETURN_URL,
+            data={"ids": [self.user_borrowing.id]},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
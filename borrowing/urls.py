@@ -1,6 +1,11 @@
 from django.urls import path
 
-from borrowing.views import BorrowingViewSet, BorrowingReturnAPIView
+from borrowing.views import (
+    BorrowingViewSet,
+    BorrowingReturnAPIView,
+    BorrowingBulkReturnAPIView,
+    HoldViewSet,
+)
 
 app_name = "borrowing"
 
@@ -8,8 +13,21 @@ borrowing_list = BorrowingViewSet.as_view(actions={"get": "list", "post": "creat
 
 borrowing_detail = BorrowingViewSet.as_view(actions={"get": "retrieve"})
 
+borrowing_batch = BorrowingViewSet.as_view(actions={"post": "batch_create"})
+
+borrowing_export = BorrowingViewSet.as_view(actions={"get": "export"})
+
+hold_list = HoldViewSet.as_view(actions={"get": "list", "post": "create"})
+
+hold_detail = HoldViewSet.as_view(actions={"delete": "destroy"})
+
 urlpatterns = [
     path("", borrowing_list, name="borrowing-list"),
+    path("batch/", borrowing_batch, name="borrowing-batch"),
+    path("export/", borrowing_export, name="borrowing-export"),
+    path("holds/", hold_list, name="hold-list"),
+    path("holds/<int:pk>/", hold_detail, name="hold-detail"),
+    path("return/", BorrowingBulkReturnAPIView.as_view(), name="borrowing-bulk-return"),
     path("<int:pk>/", borrowing_detail, name="borrowing-detail"),
     path("<int:pk>/return/", BorrowingReturnAPIView.as_view(), name="borrowing-return"),
 ]
@@ -1,8 +1,17 @@
-from django.db.models import Q, QuerySet
+import logging
+import time
+from typing import Iterable, Iterator
+
+from django.db.models import QuerySet
 from django.utils import timezone
 
 from borrowing.models import Borrowing
-from borrowing.notifications import send_telegram_notification
+from borrowing.notifications import MESSAGE_MAX_LENGTH, send_telegram_notification
+
+logger = logging.getLogger(__name__)
+
+OVERDUE_CHUNK_SIZE = 2000
+MAX_DIGEST_PAGES = 10
 
 
 def get_borrowing_info(borrowing: Borrowing) -> str:
@@ -17,25 +26,84 @@ def get_borrowing_info(borrowing: Borrowing) -> str:
 
 
 def check_overdue_borrowings() -> QuerySet:
-    queryset = Borrowing.objects.select_related("book", "user").filter(
-        Q(actual_return_date__isnull=True)
-        & Q(
-            expected_return_date__lte=timezone.now().date() + timezone.timedelta(days=1)
+    """Active borrowings due by tomorrow, served by borrowing_active_due_idx"""
+    return (
+        Borrowing.objects.filter(
+            actual_return_date__isnull=True,
+            expected_return_date__lte=timezone.now().date()
+            + timezone.timedelta(days=1),
         )
+        .order_by("expected_return_date", "id")
+        .values_list("id", "expected_return_date", "book__title", "user_id")
     )
 
-    return queryset
 
+def get_overdue_line(row: tuple) -> str:
+    borrowing_id, expected_return_date, title, user_id = row
+    title = " ".join(title.split())
+    return f"#{borrowing_id} due {expected_return_date}, user {user_id}: {title}"
 
-def borrowings_overdue_send_message(queryset) -> None:
-    if not queryset:
-        return send_telegram_notification("No borrowings overdue today!")
 
-    for borrowing in queryset:
-        send_telegram_notification(
-            "Borrowing overdue:\n" + get_borrowing_info(borrowing)
-        )
+def build_overdue_digest(
+    rows: Iterable[tuple], max_pages: int = MAX_DIGEST_PAGES
+) -> tuple[list[str], int]:
+    """
+    Pack one line per overdue borrowing into pages that fit a Telegram
+    message. Only `max_pages` pages are kept, rows beyond them are
+    just counted.
+    """
+    # Leave room for the page header added in `overdue_digest_messages`
+    page_limit = MESSAGE_MAX_LENGTH - 100
+    pages, lines, size, total = [], [], 0, 0
+
+    for row in rows:
+        total += 1
+        if len(pages) == max_pages:
+            continue
+
+        line = get_overdue_line(row)[:page_limit]
+        if size + len(line) + 1 > page_limit:
+            pages.append("\n".join(lines))
+            lines, size = [], 0
+            if len(pages) == max_pages:
+                continue
+
+        lines.append(line)
+        size += len(line) + 1
+
+    if lines:
+        pages.append("\n".join(lines))
 
+    return pages, total
 
-def daily_borrowings_overdue_notification() -> None:
-    borrowings_overdue_send_message(check_overdue_borrowings())
+
+def overdue_digest_messages(pages: list[str], total: int) -> Iterator[str]:
+    listed = sum(page.count("\n") + 1 for page in pages)
+
+    for number, page in enumerate(pages, start=1):
+        header = f"Borrowings overdue: {total} (page {number}/{len(pages)})"
+        if number == len(pages) and listed < total:
+            page += f"\n...and {total - listed} more"
+        yield header + "\n" + page
+
+
+def daily_borrowings_overdue_notification() -> dict:
+    """Queue a paginated digest of overdue borrowings and report scan metrics"""
+    started = time.monotonic()
+    rows = check_overdue_borrowings().iterator(chunk_size=OVERDUE_CHUNK_SIZE)
+    pages, total = build_overdue_digest(rows)
+    duration = time.monotonic() - started
+
+    if not total:
+        send_telegram_notification("No borrowings overdue today!")
+
+    for message in overdue_digest_messages(pages, total):
+        send_telegram_notification(message)
+
+    logger.info(
+        "Overdue scan covered %d borrowings in %.3fs, %d digest pages queued",
+        total,
+        duration,
+        len(pages),
+    )
+    return {"overdue": total, "pages": len(pages), "duration": round(duration, 3)}
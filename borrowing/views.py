@@ -1,26 +1,52 @@
-from django.db import transaction
+from collections import Counter
+
+from django.db import IntegrityError, transaction
 from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import mixins, viewsets, status
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from borrowing.models import Borrowing
+from book.inventory import release_copy
+from borrowing.archive import MergedQuerySet
+from borrowing.holds import promote_holds, return_copies
+from borrowing.models import ArchivedBorrowing, Borrowing, Hold
+from borrowing.projections import project_borrowings
 from borrowing.serializers import (
     BorrowingReadSerializer,
+    BorrowingProjectionSerializer,
     BorrowingCreateSerializer,
+    BorrowingBatchCreateSerializer,
     BorrowingReturnSerializer,
+    BorrowingBulkReturnSerializer,
+    HoldSerializer,
+    HOLD_EXISTS_MESSAGE,
+)
+from library_service.export import (
+    EXPORT_CHUNK_SIZE,
+    export_response,
+    get_export_format,
 )
-from payment.utils import create_stripe_session
+from library_service.pagination import OptionalCursorPagination
+from payment.fines import clear_accrued_fines
+from payment.utils import create_stripe_session, queue_fine_sessions
+
+
+class BorrowingPagination(OptionalCursorPagination):
+    page_size = 5
+    cursor_ordering = ("borrow_date", "id")
 
 
-class BorrowingPagination(PageNumberPagination):
+class HoldPagination(OptionalCursorPagination):
     page_size = 5
+    cursor_ordering = ("created_at", "id")
 
 
 class BorrowingViewSet(
@@ -32,31 +58,63 @@ class BorrowingViewSet(
     permission_classes = (IsAuthenticated,)
     pagination_class = BorrowingPagination
 
-    def get_queryset(self) -> QuerySet:
-        is_active = self.request.query_params.get("is_active")
-        user_id = self.request.query_params.get("user_id")
-        queryset = Borrowing.objects.select_related("book", "user").prefetch_related(
-            "payments"
+    def get_queryset(self) -> QuerySet | MergedQuerySet:
+        is_active = self.request.query_params.get("is_active", "").lower() == "true"
+        include_archived = (
+            self.request.query_params.get("include_archived", "").lower() == "true"
         )
+        queryset = self.filter_by_user(Borrowing.objects.all())
 
-        if is_active and is_active.lower() == "true":
+        if is_active:
             queryset = queryset.filter(actual_return_date__isnull=True)
 
+        if self.action not in ("list", "retrieve"):
+            return queryset.select_related("book", "user").prefetch_related("payments")
+
+        queryset = project_borrowings(queryset)
+
+        if self.action == "list" and include_archived and not is_active:
+            archived = project_borrowings(
+                self.filter_by_user(ArchivedBorrowing.objects.all())
+            )
+            return MergedQuerySet(
+                archived, queryset, ordering=BorrowingPagination.cursor_ordering
+            )
+
+        return queryset
+
+    def filter_by_user(self, queryset: QuerySet) -> QuerySet:
+        user_id = self.request.query_params.get("user_id")
+
         if not self.request.user.is_staff:
-            queryset = queryset.filter(user=self.request.user)
+            return queryset.filter(user=self.request.user)
 
-        if self.request.user.is_staff and user_id:
-            queryset = queryset.filter(user_id=int(user_id))
+        if user_id:
+            return queryset.filter(user_id=int(user_id))
 
         return queryset
 
     def get_serializer_class(
         self,
-    ) -> BorrowingReadSerializer | BorrowingCreateSerializer:
+    ) -> (
+        BorrowingReadSerializer
+        | BorrowingProjectionSerializer
+        | BorrowingCreateSerializer
+        | BorrowingBatchCreateSerializer
+    ):
         if self.action in ("list", "retrieve"):
+            return BorrowingProjectionSerializer
+        if self.action == "export":
             return BorrowingReadSerializer
         if self.action == "create":
             return BorrowingCreateSerializer
+        if self.action == "batch_create":
+            return BorrowingBatchCreateSerializer
+
+    def get_permissions(self):
+        if self.action == "export":
+            return [IsAdminUser()]
+        return super().get_permissions()
 
     def perform_create(self, serializer) -> None:
         serializer.save(user=self.request.user)
@@ -64,7 +122,7 @@ class BorrowingViewSet(
     def get_serializer_context(self) -> dict:
         context = super().get_serializer_context()
 
-        if self.action == "create":
+        if self.action in ("create", "batch_create"):
             context["request"] = self.request
 
         return context
@@ -81,11 +139,61 @@ class BorrowingViewSet(
                 type=int,
                 description="Filter borrowings by user id: available only for admin users",
             ),
-        ]
+            OpenApiParameter(
+                "include_archived",
+                type=bool,
+                description="Include borrowings returned long ago and moved to the archive",
+            ),
+        ],
+        responses=BorrowingReadSerializer(many=True),
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @extend_schema(responses=BorrowingReadSerializer)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def batch_create(self, request: Request) -> Response:
+        """Endpoint for borrowing several books with one payment session"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user)
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "file_format",
+                type=str,
+                enum=["csv", "ndjson"],
+                description="Export file format, csv by default",
+            ),
+            OpenApiParameter(
+                "is_active",
+                type=bool,
+                description="Filter by borrowing status: whether borrowing was returned or not",
+            ),
+            OpenApiParameter(
+                "user_id",
+                type=int,
+                description="Filter borrowings by user id",
+            ),
+        ]
+    )
+    def export(self, request: Request) -> StreamingHttpResponse:
+        """Endpoint for streaming export of borrowing history"""
+        file_format = get_export_format(request)
+        borrowings = (
+            self.get_queryset().order_by("id").iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        records = (BorrowingReadSerializer(borrowing).data for borrowing in borrowings)
+
+        return export_response(
+            records, BorrowingReadSerializer.Meta.fields, file_format, "borrowings"
+        )
+
 
 class BorrowingReturnAPIView(APIView):
     """Endpoint for borrowing return"""
@@ -99,7 +207,12 @@ class BorrowingReturnAPIView(APIView):
     )
     def post(self, request: Request, pk: int) -> Response:
         with transaction.atomic():
-            borrowing = get_object_or_404(Borrowing, pk=pk)
+            borrowing = get_object_or_404(
+                Borrowing.objects.select_for_update(of=("self",)).select_related(
+                    "book", "accrued_fine"
+                ),
+                pk=pk,
+            )
             book = borrowing.book
             actual_return_date = timezone.now().date()
             expected_return_date = borrowing.expected_return_date
@@ -110,8 +223,9 @@ class BorrowingReturnAPIView(APIView):
 
             if serializer_update.is_valid():
                 serializer_update.save()
-                book.inventory += 1
-                book.save()
+                # A waiting hold takes the copy before it goes back to stock
+                if not promote_holds(book.id, 1):
+                    book.inventory = release_copy(book.id)
 
                 if actual_return_date > expected_return_date:
                     overdue = (actual_return_date - expected_return_date).days
@@ -121,6 +235,7 @@ class BorrowingReturnAPIView(APIView):
                         payment_type="Fine",
                         overdue_days=overdue,
                     )
+                    clear_accrued_fines([borrowing.id])
 
                     message = "Your return is overdue. Please provide fine payment."
 
@@ -135,3 +250,116 @@ class BorrowingReturnAPIView(APIView):
             return Response(
                 serializer_update.errors, status=status.HTTP_400_BAD_REQUEST
             )
+
+
+class BorrowingBulkReturnAPIView(APIView):
+    """Endpoint for returning many borrowings at once at the circulation desk"""
+
+    permission_classes = (IsAdminUser,)
+
+    @extend_schema(
+        methods=["POST"],
+        request=BorrowingBulkReturnSerializer,
+        responses={200: OpenApiTypes.OBJECT},
+        operation_id="borrowings_bulk_return",
+    )
+    def post(self, request: Request) -> Response:
+        serializer = BorrowingBulkReturnSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data["ids"]))
+        actual_return_date = timezone.now().date()
+
+        with transaction.atomic():
+            borrowings = {
+                borrowing.id: borrowing
+                for borrowing in Borrowing.objects.select_for_update(of=("self",))
+                .select_related("book", "user", "accrued_fine")
+                .filter(id__in=ids)
+            }
+            returned = [
+                borrowing
+                for borrowing in borrowings.values()
+                if borrowing.actual_return_date is None
+            ]
+
+            Borrowing.objects.filter(
+                id__in=[borrowing.id for borrowing in returned]
+            ).update(actual_return_date=actual_return_date)
+            return_copies(Counter(borrowing.book_id for borrowing in returned))
+
+            fines = [
+                (borrowing, (actual_return_date - borrowing.expected_return_date).days)
+                for borrowing in returned
+                if actual_return_date > borrowing.expected_return_date
+            ]
+            if fines:
+                queue_fine_sessions(fines, request)
+                clear_accrued_fines(borrowing.id for borrowing, _ in fines)
+
+        overdue = {borrowing.id: days for borrowing, days in fines}
+        results = []
+
+        for borrowing_id in ids:
+            borrowing = borrowings.get(borrowing_id)
+            if borrowing is None:
+                result = "not_found"
+            elif borrowing.actual_return_date is not None:
+                result = "already_returned"
+            else:
+                result = "returned"
+            results.append(
+                {
+                    "id": borrowing_id,
+                    "result": result,
+                    "overdue_days": overdue.get(borrowing_id, 0),
+                }
+            )
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+class HoldViewSet(
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Endpoint for holds on books that are out of stock"""
+
+    serializer_class = HoldSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = HoldPagination
+
+    def get_queryset(self) -> QuerySet:
+        queryset = Hold.objects.all()
+
+        if not self.request.user.is_staff:
+            return queryset.filter(user=self.request.user)
+
+        return queryset
+
+    def perform_create(self, serializer) -> None:
+        try:
+            # A concurrent request for the same book can pass validation too
+            with transaction.atomic():
+                serializer.save(user=self.request.user)
+        except IntegrityError:
+            raise ValidationError(detail=HOLD_EXISTS_MESSAGE)
+
+    def perform_destroy(self, instance: Hold) -> None:
+        """Cancel the hold, a copy set aside for it goes to the next hold"""
+        with transaction.atomic():
+            hold = Hold.objects.select_for_update().get(pk=instance.pk)
+
+            if hold.status not in (
+                Hold.StatusChoices.WAITING,
+                Hold.StatusChoices.READY,
+            ):
+                raise ValidationError(detail="The hold is no longer active.")
+
+            was_ready = hold.status == Hold.StatusChoices.READY
+            hold.status = Hold.StatusChoices.CANCELLED
+            hold.save(update_fields=["status"])
+
+            if was_ready:
+                return_copies({hold.book_id: 1})
@@ -0,0 +1,183 @@
+import base64
+import datetime
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Model, Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """
+    Page number pagination with an opt-in keyset (cursor) mode.
+
+    Cursor mode is enabled with `?pagination=cursor` and then follows the
+    `next`/`previous` links. Rows are located by comparing the values of
+    `cursor_ordering` with the last row seen, so neither `COUNT(*)` nor
+    `OFFSET` is executed and every page costs the same.
+    """
+
+    page_size = 5
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    mode_query_param = "pagination"
+    cursor_query_param = "cursor"
+    cursor_ordering = ("id",)
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request: Request, view=None
+    ) -> list | None:
+        self.cursor_mode = self.is_cursor_mode(request)
+
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view=view)
+
+        self.request = request
+        self.display_page_controls = False
+        page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request, queryset.model)
+
+        ordering = self.cursor_ordering
+        if reverse:
+            ordering = tuple(f"-{field}" for field in ordering)
+        queryset = queryset.order_by(*ordering)
+
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(values, reverse))
+
+        results = list(queryset[: page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = values is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = values is not None
+
+        self.cursor_page = results
+        return results
+
+    def is_cursor_mode(self, request: Request) -> bool:
+        return (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or self.cursor_query_param in request.query_params
+        )
+
+    def get_keyset_filter(self, values: list, reverse: bool) -> Q:
+        lookup = "lt" if reverse else "gt"
+        first_field = self.cursor_ordering[0]
+        keyset_filter = Q()
+
+        for position, field in enumerate(self.cursor_ordering):
+            equal_prefix = dict(zip(self.cursor_ordering[:position], values))
+            keyset_filter |= Q(
+                **equal_prefix, **{f"{field}__{lookup}": values[position]}
+            )
+
+        # The redundant bound on the first column lets Postgres start
+        # an index range scan instead of evaluating the OR for every row.
+        return Q(**{f"{first_field}__{lookup}e": values[0]}) & keyset_filter
+
+    def decode_cursor(
+        self, request: Request, model: type[Model]
+    ) -> tuple[list | None, bool]:
+        """Decode the cursor values and convert them to the field types"""
+        encoded = request.query_params.get(self.cursor_query_param)
+
+        if encoded is None:
+            return None, False
+
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            values, reverse = cursor["v"], bool(cursor["r"])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(values, list) or len(values) != len(self.cursor_ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        try:
+            values = [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.cursor_ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if None in values:
+            raise NotFound(self.invalid_cursor_message)
+
+        return values, reverse
+
+    def encode_cursor(self, item, reverse: bool) -> str:
+        values = []
+
+        for field in self.cursor_ordering:
+            value = item[field] if isinstance(item, dict) else getattr(item, field)
+            if isinstance(value, (datetime.date, datetime.datetime)):
+                value = value.isoformat()
+            values.append(value)
+
+        cursor = json.dumps({"v": values, "r": int(reverse)}, separators=(",", ":"))
+        encoded = base64.urlsafe_b64encode(cursor.encode()).decode("ascii")
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self) -> str | None:
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.cursor_page:
+            return None
+        return self.encode_cursor(self.cursor_page[-1], reverse=False)
+
+    def get_previous_link(self) -> str | None:
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous or not self.cursor_page:
+            return None
+        return self.encode_cursor(self.cursor_page[0], reverse=True)
+
+    def get_paginated_response(self, data) -> Response:
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_schema_operation_parameters(self, view) -> list:
+        parameters = super().get_schema_operation_parameters(view)
+        parameters += [
+            {
+                "name": self.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Set to `cursor` to use keyset pagination "
+                "ordered by " + ", ".join(self.cursor_ordering),
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+        ]
+        return parameters
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework_simplejwt",
     "drf_spectacular",
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
     "book",
     "borrowing",
     "payment",
+    "report",
 ]
 
 MIDDLEWARE = [
@@ -92,6 +94,34 @@ DATABASES = {
     }
 }
 
+if "POSTGRES_REPLICA_HOST" in os.environ:
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": os.environ["POSTGRES_REPLICA_HOST"],
+        "TEST": {"MIRROR": "default"},
+    }
+
+# Finance reports are read from the replica when there is one
+REPORT_DATABASE = "replica" if "replica" in DATABASES else "default"
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+if "REDIS_CACHE_URL" in os.environ:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_CACHE_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -136,13 +166,16 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    ),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("user.authentication.CachedJWTAuthentication",),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
-SIMPLE_JWT = {"AUTH_HEADER_NAME": "HTTP_AUTHORIZE"}
+SIMPLE_JWT = {
+    "AUTH_HEADER_NAME": "HTTP_AUTHORIZE",
+    "TOKEN_OBTAIN_SERIALIZER": "user.serializers.TokenObtainPairWithClaimsSerializer",
+}
+# Authenticate read-only catalog and report requests from token claims alone
+JWT_STATELESS_READS = os.environ.get("JWT_STATELESS_READS", "").lower() == "true"
 
 Q_CLUSTER = {
     "name": "library_service",
@@ -173,5 +206,20 @@ SPECTACULAR_SETTINGS = {
 
 TELEGRAM_BOT_TOKEN = os.environ["TELEGRAM_BOT_TOKEN"]
 TELEGRAM_CHAT_ID = os.environ["TELEGRAM_CHAT_ID"]
+# Days before the expected return date to remind about it, 0 is the due date
+BORROWING_REMINDER_OFFSETS = tuple(
+    int(days)
+    for days in os.environ.get("BORROWING_REMINDER_OFFSETS", "3,1,0").split(",")
+)
 
 STRIPE_API_KEY = os.environ["STRIPE_API_KEY"]
+STRIPE_API_BASE = os.environ.get("STRIPE_API_BASE", "https://api.stripe.com")
+STRIPE_WEBHOOK_SECRET = os.environ["STRIPE_WEBHOOK_SECRET"]
+# Seconds to connect to and to wait for a response from Stripe
+STRIPE_CONNECT_TIMEOUT = float(os.environ.get("STRIPE_CONNECT_TIMEOUT", 3))
+STRIPE_READ_TIMEOUT = float(os.environ.get("STRIPE_READ_TIMEOUT", 10))
+STRIPE_MAX_NETWORK_RETRIES = int(os.environ.get("STRIPE_MAX_NETWORK_RETRIES", 2))
+# Base URL of the API, used for Stripe redirects built outside of a request
+SITE_URL = os.environ.get("SITE_URL", "http://127.0.0.1:8000").rstrip("/")
+# Create Stripe checkout sessions in a django_q task after the borrowing commits
+STRIPE_ASYNC_CHECKOUT = os.environ.get("STRIPE_ASYNC_CHECKOUT", "").lower() == "true"
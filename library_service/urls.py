@@ -23,6 +23,7 @@ urlpatterns = [
     path("api/books/", include("book.urls", namespace="book")),
     path("api/borrowings/", include("borrowing.urls", namespace="borrowing")),
     path("api/payments/", include("payment.urls", namespace="payment")),
+    path("api/reports/", include("report.urls", namespace="report")),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "api/doc/swagger/",
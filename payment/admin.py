@@ -1,5 +1,15 @@
 from django.contrib import admin
 
-from payment.models import Payment
+from payment.models import (
+    AccruedFine,
+    ArchivedPayment,
+    Ledger,
+    Payment,
+    ReconciliationRun,
+)
 
 admin.site.register(Payment)
+admin.site.register(ArchivedPayment)
+admin.site.register(Ledger)
+admin.site.register(AccruedFine)
+admin.site.register(ReconciliationRun)
@@ -0,0 +1,262 @@
+import hashlib
+import hmac
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from urllib.request import Request, urlopen
+
+SESSION_PATH = re.compile(r"^/v1/checkout/sessions/(?P<id>[\w-]+)(?P<expire>/expire)?$")
+PAY_PATH = re.compile(r"^/pay/(?P<id>[\w-]+)$")
+LINE_ITEM_AMOUNT = re.compile(r"^line_items\[(\d+)\]\[price_data\]\[unit_amount\]$")
+MAX_LIST_LIMIT = 100
+
+
+class FakeStripeServer(ThreadingHTTPServer):
+    """
+    In-memory stand-in for the Stripe checkout API, for offline runs.
+
+    Sessions are paid by opening their `url`, which redirects to the
+    success URL and, with `webhook_url` set, delivers a signed
+    `checkout.session.completed` event like Stripe does. `latency` and
+    `error_rate` slow down or fail API calls for load and failure tests.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        webhook_url: str = "",
+        webhook_secret: str = "",
+        latency: float = 0,
+        error_rate: float = 0,
+    ):
+        super().__init__(address, FakeStripeHandler)
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.latency = latency
+        self.error_rate = error_rate
+        self.sessions = {}
+        self.idempotent_responses = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def send_event(self, event_type: str, session: dict) -> None:
+        if not self.webhook_url:
+            return
+
+        payload = json.dumps(
+            {
+                "id": f"evt_{uuid.uuid4().hex}",
+                "object": "event",
+                "type": event_type,
+                "created": int(time.time()),
+                "data": {"object": session},
+            }
+        )
+        timestamp = int(time.time())
+        signature = hmac.new(
+            self.webhook_secret.encode(),
+            f"{timestamp}.{payload}".encode(),
+            hashlib.sha256,
+        ).hexdigest()
+        request = Request(
+            self.webhook_url,
+            data=payload.encode(),
+            headers={
+                "Content-Type": "application/json",
+                "Stripe-Signature": f"t={timestamp},v1={signature}",
+            },
+        )
+        with urlopen(request, timeout=10):
+            pass
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    server: FakeStripeServer
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+
+        if match := PAY_PATH.match(url.path):
+            return self.pay_session(match["id"])
+
+        if not self.start_api_call():
+            return
+
+        if url.path == "/v1/checkout/sessions":
+            return self.list_sessions(dict(parse_qsl(url.query)))
+
+        match = SESSION_PATH.match(url.path)
+        if match and not match["expire"]:
+            return self.send_session(match["id"])
+
+        self.send_error_json(404, "invalid_request_error", "Unrecognized request URL")
+
+    def do_POST(self) -> None:
+        if not self.start_api_call():
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        params = dict(parse_qsl(self.rfile.read(length).decode()))
+        idempotency_key = self.headers.get("Idempotency-Key")
+
+        with self.server.lock:
+            replay = self.server.idempotent_responses.get(idempotency_key)
+        if replay is not None:
+            return self.send_json(*replay)
+
+        url = urlsplit(self.path)
+        if url.path == "/v1/checkout/sessions":
+            response = (200, self.create_session(params))
+        elif (match := SESSION_PATH.match(url.path)) and match["expire"]:
+            response = self.expire_session(match["id"])
+        else:
+            response = (404, error_body("invalid_request_error", "Unrecognized URL"))
+
+        if idempotency_key and response[0] == 200:
+            with self.server.lock:
+                self.server.idempotent_responses[idempotency_key] = response
+        self.send_json(*response)
+
+    def start_api_call(self) -> bool:
+        """Apply the configured latency and fail a share of the calls"""
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if random.random() < self.server.error_rate:
+            self.send_error_json(500, "api_error", "Injected failure")
+            return False
+        return True
+
+    def create_session(self, params: dict) -> dict:
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        amount_total = sum(
+            int(value) * int(params.get(f"line_items[{match[1]}][quantity]", 1))
+            for key, value in params.items()
+            if (match := LINE_ITEM_AMOUNT.match(key))
+        )
+        session = {
+            "id": session_id,
+            "object": "checkout.session",
+            "url": f"{self.server.url}/pay/{session_id}",
+            "status": "open",
+            "payment_status": "unpaid",
+            "mode": params.get("mode", "payment"),
+            "currency": "usd",
+            "amount_total": amount_total,
+            "success_url": params.get("success_url", ""),
+            "cancel_url": params.get("cancel_url", ""),
+            "created": int(time.time()),
+            "expires_at": int(params.get("expires_at", time.time() + 24 * 60 * 60)),
+            "livemode": False,
+        }
+
+        with self.server.lock:
+            self.server.sessions[session_id] = session
+        return session
+
+    def expire_session(self, session_id: str) -> tuple[int, dict]:
+        with self.server.lock:
+            session = self.server.sessions.get(session_id)
+            if session is None:
+                return 404, error_body("invalid_request_error", "No such session")
+            if session["status"] != "open":
+                return 400, error_body("invalid_request_error", "Session is not open")
+            session["status"] = "expired"
+
+        self.server.send_event("checkout.session.expired", session)
+        return 200, session
+
+    def pay_session(self, session_id: str) -> None:
+        with self.server.lock:
+            session = self.server.sessions.get(session_id)
+            if session is None or session["status"] != "open":
+                return self.send_error_json(404, "invalid_request_error", "No session")
+            session["status"] = "complete"
+            session["payment_status"] = "paid"
+
+        self.server.send_event("checkout.session.completed", session)
+        self.send_response(303)
+        self.send_header(
+            "Location",
+            session["success_url"].replace("{CHECKOUT_SESSION_ID}", session_id),
+        )
+        self.end_headers()
+
+    def send_session(self, session_id: str) -> None:
+        session = self.server.sessions.get(session_id)
+
+        if session is None:
+            return self.send_error_json(404, "invalid_request_error", "No session")
+        self.send_json(200, session)
+
+    def list_sessions(self, params: dict) -> None:
+        """Newest first, paged with `limit` and `starting_after` like Stripe"""
+        limit = min(int(params.get("limit", 10)), MAX_LIST_LIMIT)
+        created_gte = int(params.get("created[gte]", 0))
+        created_lte = int(params.get("created[lte]", 2**63))
+
+        with self.server.lock:
+            sessions = sorted(
+                self.server.sessions.values(),
+                key=lambda session: (session["created"], session["id"]),
+                reverse=True,
+            )
+        sessions = [
+            session
+            for session in sessions
+            if created_gte <= session["created"] <= created_lte
+        ]
+
+        if "starting_after" in params:
+            ids = [session["id"] for session in sessions]
+            if params["starting_after"] in ids:
+                sessions = sessions[ids.index(params["starting_after"]) + 1 :]
+
+        self.send_json(
+            200,
+            {
+                "object": "list",
+                "url": "/v1/checkout/sessions",
+                "data": sessions[:limit],
+                "has_more": len(sessions) > limit,
+            },
+        )
+
+    def send_error_json(self, status_code: int, error_type: str, message: str) -> None:
+        self.send_json(status_code, error_body(error_type, message))
+
+    def send_json(self, status_code: int, body: dict) -> None:
+        content = json.dumps(body).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Request-Id", f"req_{uuid.uuid4().hex[:14]}")
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def error_body(error_type: str, message: str) -> dict:
+    return {"error": {"type": error_type, "message": message}}
+
+
+def start_fake_stripe(
+    host: str = "127.0.0.1", port: int = 0, **options
+) -> FakeStripeServer:
+    """Serve the fake Stripe API from a daemon thread, e.g. in tests"""
+    server = FakeStripeServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
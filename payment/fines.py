@@ -0,0 +1,51 @@
+import datetime
+from typing import Iterable
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from book.models import Book
+from borrowing.models import Borrowing
+from payment.models import AccruedFine
+from payment.utils import FINE_MULTIPLIER
+
+# Same formula as `get_payment_details`: whole cents of the daily fee
+# times the overdue days, then multiplied by FINE_MULTIPLIER.
+ACCRUE_SQL = f"""
+    INSERT INTO {AccruedFine._meta.db_table}
+        (borrowing_id, overdue_days, amount, accrued_on)
+    SELECT borrowing.id,
+        %(today)s - borrowing.expected_return_date,
+        FLOOR(book.daily_fee * (%(today)s - borrowing.expected_return_date) * 100)
+            * %(multiplier)s / 100,
+        %(today)s
+    FROM {Borrowing._meta.db_table} borrowing
+    JOIN {Book._meta.db_table} book ON book.id = borrowing.book_id
+    WHERE borrowing.actual_return_date IS NULL
+        AND borrowing.expected_return_date < %(today)s
+    ON CONFLICT (borrowing_id) DO UPDATE SET
+        overdue_days = EXCLUDED.overdue_days,
+        amount = EXCLUDED.amount,
+        accrued_on = EXCLUDED.accrued_on
+"""
+
+
+@transaction.atomic
+def accrue_fines(today: datetime.date = None) -> dict:
+    """
+    Recompute the fines of all active overdue borrowings in one statement
+    and drop the rows of borrowings that are no longer overdue.
+    """
+    today = today or timezone.now().date()
+
+    with connection.cursor() as cursor:
+        cursor.execute(ACCRUE_SQL, {"today": today, "multiplier": FINE_MULTIPLIER})
+        accrued = cursor.rowcount
+
+    removed, _ = AccruedFine.objects.filter(accrued_on__lt=today).delete()
+    return {"accrued": accrued, "removed": removed}
+
+
+def clear_accrued_fines(borrowing_ids: Iterable[int]) -> None:
+    """Returned borrowings are charged with a Fine payment instead"""
+    AccruedFine.objects.filter(borrowing_id__in=list(borrowing_ids)).delete()
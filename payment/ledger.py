@@ -0,0 +1,131 @@
+from collections import defaultdict
+from decimal import Decimal
+from typing import Iterable
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from payment.models import Ledger, Payment
+
+# Expired sessions are renewed, the payment is still owed
+UNPAID_STATUSES = (
+    Payment.StatusChoices.CREATING,
+    Payment.StatusChoices.PENDING,
+    Payment.StatusChoices.EXPIRED,
+)
+
+UPSERT_SQL = f"""
+    INSERT INTO {Ledger._meta.db_table}
+        (user_id, outstanding_balance, pending_payments, updated_at)
+    SELECT user_id, balance, payments, now()
+    FROM unnest(%s::bigint[], %s::numeric[], %s::integer[])
+        AS changes (user_id, balance, payments)
+    ORDER BY user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        outstanding_balance =
+            {Ledger._meta.db_table}.outstanding_balance + EXCLUDED.outstanding_balance,
+        pending_payments =
+            {Ledger._meta.db_table}.pending_payments + EXCLUDED.pending_payments,
+        updated_at = EXCLUDED.updated_at
+"""
+
+
+def apply_ledger_changes(changes: Iterable[tuple[int, Decimal]], sign: int) -> None:
+    """
+    Add (sign = 1) or subtract (sign = -1) unpaid payments, given as
+    (user id, amount) pairs, with a single upsert statement.
+    Users are updated in id order so that concurrent calls never deadlock.
+    """
+    totals = defaultdict(lambda: [Decimal(0), 0])
+
+    for user_id, amount in changes:
+        totals[user_id][0] += sign * Decimal(amount)
+        totals[user_id][1] += sign
+
+    if not totals:
+        return
+
+    user_ids = sorted(totals)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT_SQL,
+            [
+                user_ids,
+                [totals[user_id][0] for user_id in user_ids],
+                [totals[user_id][1] for user_id in user_ids],
+            ],
+        )
+
+
+def has_pending_payments(user) -> bool:
+    return Ledger.objects.filter(pk=user.pk, pending_payments__gt=0).exists()
+
+
+def get_expected_ledger() -> dict[int, tuple[Decimal, int]]:
+    """Outstanding balance and pending payment count per user from Payment rows"""
+    rows = (
+        Payment.objects.filter(status__in=UNPAID_STATUSES)
+        .values("borrowing__user_id")
+        .annotate(balance=Sum("money_to_pay"), payments=Count("id"))
+        .order_by()
+    )
+    return {
+        row["borrowing__user_id"]: (row["balance"], row["payments"]) for row in rows
+    }
+
+
+def reconcile_ledger(fix: bool = True) -> list[dict]:
+    """
+    Compare the ledger with Payment rows and return the drifted users.
+
+    With `fix`, drifted rows are overwritten with the expected values.
+    The ledger table is locked for writes meanwhile, so that no payment
+    transition is lost between reading and fixing it.
+    """
+    with transaction.atomic():
+        if fix:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"LOCK TABLE {Ledger._meta.db_table} IN SHARE ROW EXCLUSIVE MODE"
+                )
+
+        expected = get_expected_ledger()
+        actual = {
+            ledger.user_id: (ledger.outstanding_balance, ledger.pending_payments)
+            for ledger in Ledger.objects.all()
+        }
+        drift = []
+
+        for user_id in sorted(expected.keys() | actual.keys()):
+            expected_balance, expected_payments = expected.get(user_id, (0, 0))
+            actual_balance, actual_payments = actual.get(user_id, (0, 0))
+            if (expected_balance, expected_payments) != (
+                actual_balance,
+                actual_payments,
+            ):
+                drift.append(
+                    {
+                        "user_id": user_id,
+                        "expected_balance": Decimal(expected_balance),
+                        "actual_balance": Decimal(actual_balance),
+                        "expected_payments": expected_payments,
+                        "actual_payments": actual_payments,
+                    }
+                )
+
+        if fix and drift:
+            Ledger.objects.bulk_create(
+                [
+                    Ledger(
+                        user_id=row["user_id"],
+                        outstanding_balance=row["expected_balance"],
+                        pending_payments=row["expected_payments"],
+                    )
+                    for row in drift
+                ],
+                update_conflicts=True,
+                unique_fields=["user"],
+                update_fields=["outstanding_balance", "pending_payments", "updated_at"],
+            )
+
+    return drift
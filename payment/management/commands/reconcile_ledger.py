@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+
+from payment.ledger import reconcile_ledger
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the payment ledger from Payment rows"""
+
+    help = "Compare user ledgers with unpaid payments and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the drift without fixing it",
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile_ledger(fix=not options["dry_run"])
+
+        for row in drift:
+            self.stdout.write(
+                f"User {row['user_id']}: "
+                f"balance {row['actual_balance']} -> {row['expected_balance']}, "
+                f"pending payments {row['actual_payments']} -> "
+                f"{row['expected_payments']}"
+            )
+
+        action = "Found" if options["dry_run"] else "Fixed"
+        self.stdout.write(self.style.SUCCESS(f"{action} {len(drift)} drifted ledgers."))
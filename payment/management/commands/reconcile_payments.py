@@ -0,0 +1,55 @@
+import datetime
+
+from django.core.management import BaseCommand, CommandError
+from django.utils import timezone
+
+from payment.reconciliation import reconcile_payments
+
+
+def parse_date(value: str) -> datetime.datetime:
+    try:
+        date = datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date: {value}, use YYYY-MM-DD.")
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time()))
+
+
+class Command(BaseCommand):
+    """Django command to reconcile payments with Stripe checkout sessions"""
+
+    help = (
+        "Page through Stripe checkout sessions since the last run, "
+        "fix payment statuses and report discrepancies."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=parse_date,
+            help="First day of sessions to check, the last run's watermark by default",
+        )
+        parser.add_argument(
+            "--until",
+            type=parse_date,
+            help="Day to stop before, now by default",
+        )
+
+    def handle(self, *args, **options):
+        run = reconcile_payments(since=options["since"], until=options["until"])
+
+        for discrepancy in run.discrepancies:
+            self.stdout.write(
+                f"{discrepancy['kind']}: session {discrepancy['session_id']}, "
+                f"payment {discrepancy['payment_id']}, "
+                f"local {discrepancy['local_status']}, "
+                f"Stripe {discrepancy['stripe_status']}/"
+                f"{discrepancy['stripe_payment_status']}"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {run.sessions} sessions from {run.since:%Y-%m-%d %H:%M}: "
+                f"{run.updated_payments} payments updated, "
+                f"{run.discrepancy_count} discrepancies."
+            )
+        )
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from payment.fake_stripe import FakeStripeServer
+
+
+class Command(BaseCommand):
+    """Django command to serve a local fake Stripe API"""
+
+    help = (
+        "Serve an in-memory Stripe checkout API, "
+        "point STRIPE_API_BASE at it to run checkout flows offline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=12111)
+        parser.add_argument(
+            "--webhook-url",
+            default="",
+            help="Deliver signed checkout events to this URL, "
+            "e.g. http://127.0.0.1:8000/api/payments/webhook/",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0,
+            help="Seconds to wait before answering every API call",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0,
+            help="Share of API calls answered with a 500 error",
+        )
+
+    def handle(self, *args, **options):
+        server = FakeStripeServer(
+            (options["host"], options["port"]),
+            webhook_url=options["webhook_url"],
+            webhook_secret=settings.STRIPE_WEBHOOK_SECRET,
+            latency=options["latency"],
+            error_rate=options["error_rate"],
+        )
+        self.stdout.write(f"Fake Stripe API is served at {server.url}")
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
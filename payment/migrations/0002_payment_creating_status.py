@@ -0,0 +1,34 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payment", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="payment",
+            name="session_id",
+            field=models.CharField(blank=True, max_length=150),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="session_url",
+            field=models.URLField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("Creating", "Creating"),
+                    ("Pending", "Pending"),
+                    ("Paid", "Paid"),
+                ],
+                max_length=10,
+            ),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_SQL = """
+    INSERT INTO payment_ledger
+        (user_id, outstanding_balance, pending_payments, updated_at)
+    SELECT borrowing.user_id, SUM(payment.money_to_pay), COUNT(*), now()
+    FROM payment_payment payment
+    JOIN borrowing_borrowing borrowing ON borrowing.id = payment.borrowing_id
+    WHERE payment.status IN ('Creating', 'Pending')
+    GROUP BY borrowing.user_id
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user", "0001_initial"),
+        ("payment", "0002_payment_creating_status"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Ledger",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="ledger",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "outstanding_balance",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=10),
+                ),
+                ("pending_payments", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing", "0005_archivedborrowing"),
+        ("payment", "0003_ledger"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedPayment",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Creating", "Creating"),
+                            ("Pending", "Pending"),
+                            ("Paid", "Paid"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[("Payment", "Payment"), ("Fine", "Fine")],
+                        max_length=10,
+                    ),
+                ),
+                ("session_url", models.URLField(blank=True)),
+                ("session_id", models.CharField(blank=True, max_length=150)),
+                ("money_to_pay", models.DecimalField(decimal_places=2, max_digits=8)),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "borrowing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="payments",
+                        to="borrowing.archivedborrowing",
+                    ),
+                ),
+            ],
+        ),
+    ]
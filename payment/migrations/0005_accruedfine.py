@@ -0,0 +1,35 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing", "0007_hold"),
+        ("payment", "0004_archivedpayment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccruedFine",
+            fields=[
+                (
+                    "borrowing",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="accrued_fine",
+                        serialize=False,
+                        to="borrowing.borrowing",
+                    ),
+                ),
+                ("overdue_days", models.PositiveIntegerField()),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=8)),
+                ("accrued_on", models.DateField()),
+            ],
+            options={
+                "ordering": ["borrowing"],
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payment", "0005_accruedfine"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StripeEvent",
+            fields=[
+                (
+                    "id",
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+                ("type", models.CharField(max_length=100)),
+                ("payload", models.JSONField()),
+                ("received_at", models.DateTimeField(auto_now_add=True)),
+                ("processed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "ordering": ["received_at"],
+            },
+        ),
+        migrations.AlterField(
+            model_name="archivedpayment",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("Creating", "Creating"),
+                    ("Pending", "Pending"),
+                    ("Paid", "Paid"),
+                    ("Expired", "Expired"),
+                ],
+                max_length=10,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("Creating", "Creating"),
+                    ("Pending", "Pending"),
+                    ("Paid", "Paid"),
+                    ("Expired", "Expired"),
+                ],
+                max_length=10,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="payment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("session_id", ""), _negated=True),
+                fields=("session_id", "borrowing", "type"),
+                name="payment_session_borrowing_type_unique",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stripeevent",
+            index=models.Index(
+                condition=models.Q(("processed_at__isnull", True)),
+                fields=["received_at"],
+                name="stripe_event_pending_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+# Stripe expires sessions 24 hours after creation by default, existing
+# pending sessions are swept once that much time has surely passed
+BACKFILL_SQL = """
+    UPDATE payment_payment
+    SET session_expires_at = now() + interval '24 hours'
+    WHERE status = 'Pending'
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payment", "0006_stripe_webhook"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="session_expires_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="session_renewals",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                condition=models.Q(("status", "Pending")),
+                fields=["session_expires_at"],
+                name="payment_pending_expiry_idx",
+            ),
+        ),
+    ]
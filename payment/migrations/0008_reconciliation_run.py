@@ -0,0 +1,37 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payment", "0007_session_expiry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReconciliationRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("since", models.DateTimeField()),
+                ("until", models.DateTimeField()),
+                ("started_at", models.DateTimeField(auto_now_add=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("sessions", models.PositiveIntegerField(default=0)),
+                ("updated_payments", models.PositiveIntegerField(default=0)),
+                ("discrepancy_count", models.PositiveIntegerField(default=0)),
+                ("discrepancies", models.JSONField(blank=True, default=list)),
+            ],
+            options={
+                "ordering": ["-started_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payment", "0008_reconciliation_run"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="session_requested_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                condition=models.Q(("status", "Creating")),
+                fields=["session_requested_at"],
+                name="payment_creating_idx",
+            ),
+        ),
+    ]
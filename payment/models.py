@@ -1,12 +1,15 @@
+from django.conf import settings
 from django.db import models
 
-from borrowing.models import Borrowing
+from borrowing.models import ArchivedBorrowing, Borrowing
 
 
 class Payment(models.Model):
     class StatusChoices(models.TextChoices):
+        CREATING = "Creating"
         PENDING = "Pending"
         PAID = "Paid"
+        EXPIRED = "Expired"
 
     class TypeChoices(models.TextChoices):
         PAYMENT = "Payment"
@@ -17,9 +20,136 @@ class Payment(models.Model):
     borrowing = models.ForeignKey(
         to=Borrowing, on_delete=models.CASCADE, related_name="payments"
     )
-    session_url = models.URLField()
-    session_id = models.CharField(max_length=150)
+    session_url = models.URLField(blank=True)
+    session_id = models.CharField(max_length=150, blank=True)
+    session_expires_at = models.DateTimeField(null=True, blank=True)
+    session_renewals = models.PositiveSmallIntegerField(default=0)
+    session_requested_at = models.DateTimeField(null=True, blank=True)
     money_to_pay = models.DecimalField(max_digits=8, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["session_expires_at"],
+                condition=models.Q(status="Pending"),
+                name="payment_pending_expiry_idx",
+            ),
+            models.Index(
+                fields=["session_requested_at"],
+                condition=models.Q(status="Creating"),
+                name="payment_creating_idx",
+            ),
+        ]
+        constraints = [
+            # Sessions of multi-book checkouts are shared by their payments
+            models.UniqueConstraint(
+                fields=["session_id", "borrowing", "type"],
+                condition=~models.Q(session_id=""),
+                name="payment_session_borrowing_type_unique",
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"{self.type}: {self.status} ({self.money_to_pay}USD)"
+
+
+class StripeEvent(models.Model):
+    """Stripe webhook event, stored once per event id before it is applied"""
+
+    id = models.CharField(max_length=255, primary_key=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["received_at"]
+        indexes = [
+            models.Index(
+                fields=["received_at"],
+                condition=models.Q(processed_at__isnull=True),
+                name="stripe_event_pending_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.type} {self.id}"
+
+
+class ReconciliationRun(models.Model):
+    """A pass of `reconcile_payments` over Stripe sessions created in [since, until]"""
+
+    since = models.DateTimeField()
+    until = models.DateTimeField()
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    sessions = models.PositiveIntegerField(default=0)
+    updated_payments = models.PositiveIntegerField(default=0)
+    discrepancy_count = models.PositiveIntegerField(default=0)
+    discrepancies = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        ordering = ["-started_at"]
+
+    def __str__(self) -> str:
+        return f"Reconciliation {self.since} - {self.until}"
+
+
+class ArchivedPayment(models.Model):
+    """Settled payment of an archived borrowing"""
+
+    id = models.BigIntegerField(primary_key=True)
+    status = models.CharField(max_length=10, choices=Payment.StatusChoices.choices)
+    type = models.CharField(max_length=10, choices=Payment.TypeChoices.choices)
+    borrowing = models.ForeignKey(
+        to=ArchivedBorrowing, on_delete=models.CASCADE, related_name="payments"
+    )
+    session_url = models.URLField(blank=True)
+    session_id = models.CharField(max_length=150, blank=True)
+    money_to_pay = models.DecimalField(max_digits=8, decimal_places=2)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.type}: {self.status} ({self.money_to_pay}USD, archived)"
+
+
+class AccruedFine(models.Model):
+    """Fine an active overdue borrowing has accrued, refreshed nightly"""
+
+    borrowing = models.OneToOneField(
+        to=Borrowing,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="accrued_fine",
+    )
+    overdue_days = models.PositiveIntegerField()
+    amount = models.DecimalField(max_digits=8, decimal_places=2)
+    accrued_on = models.DateField()
+
+    class Meta:
+        ordering = ["borrowing"]
+
+    def __str__(self) -> str:
+        return f"Borrowing {self.borrowing_id}: {self.amount}USD accrued"
+
+
+class Ledger(models.Model):
+    """Unpaid payments of a user, kept up to date by payment transitions"""
+
+    user = models.OneToOneField(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="ledger",
+    )
+    outstanding_balance = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0
+    )
+    pending_payments = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return (
+            f"User {self.user_id}: {self.pending_payments} pending "
+            f"({self.outstanding_balance}USD)"
+        )
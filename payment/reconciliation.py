@@ -0,0 +1,202 @@
+import datetime
+import logging
+from collections import defaultdict
+from typing import Iterator
+
+import stripe
+from django.db import transaction
+from django.utils import timezone
+
+from payment.ledger import apply_ledger_changes
+from payment.models import Payment, ReconciliationRun
+from payment.stripe_client import stripe_breaker
+from payment.utils import CHECKOUT_SESSION_LIFETIME
+
+RECONCILE_BATCH_SIZE = 2000
+STRIPE_PAGE_SIZE = 100
+MAX_REPORTED_DISCREPANCIES = 1000
+DEFAULT_LOOKBACK = datetime.timedelta(days=365)
+# Scheduled runs must fit the django_q timeout, longer backfills are run
+# with `reconcile_payments --since`
+SCHEDULED_WINDOW = datetime.timedelta(days=2)
+
+logger = logging.getLogger(__name__)
+
+
+def get_reconciliation_start(until: datetime.datetime) -> datetime.datetime:
+    """
+    Continue from the last finished run. Sessions can still be paid
+    until they expire, so their lifetime before the watermark is
+    checked again.
+    """
+    last_run = (
+        ReconciliationRun.objects.filter(finished_at__isnull=False)
+        .order_by("-until")
+        .first()
+    )
+
+    if last_run is None:
+        return until - DEFAULT_LOOKBACK
+    return last_run.until - CHECKOUT_SESSION_LIFETIME
+
+
+def list_checkout_sessions(
+    since: datetime.datetime, until: datetime.datetime
+) -> Iterator[stripe.checkout.Session]:
+    """Page through sessions created in [since, until], newest first"""
+    params = {
+        "limit": STRIPE_PAGE_SIZE,
+        "created": {"gte": int(since.timestamp()), "lte": int(until.timestamp())},
+    }
+
+    while True:
+        page = stripe_breaker.call(stripe.checkout.Session.list, **params)
+        yield from page.data
+
+        if not page.has_more or not page.data:
+            return
+        params["starting_after"] = page.data[-1].id
+
+
+def get_discrepancy(
+    session: stripe.checkout.Session, kind: str, payment: Payment = None, **extra
+) -> dict:
+    return {
+        "kind": kind,
+        "session_id": session.id,
+        "payment_id": payment.id if payment else None,
+        "local_status": payment.status if payment else None,
+        "stripe_status": session.status,
+        "stripe_payment_status": session.payment_status,
+        **extra,
+    }
+
+
+def reconcile_sessions(sessions: list[stripe.checkout.Session]) -> tuple[int, list]:
+    """
+    Match a batch of Stripe sessions to their payments by session id.
+
+    Payments of paid sessions are marked paid with one bulk_update and
+    taken off the ledger. Pending payments of sessions that expired at
+    Stripe are handed to the session sweeper. Everything else that does
+    not match is only reported.
+    """
+    sessions = {session.id: session for session in sessions}
+    now = timezone.now()
+    discrepancies, paid, expired = [], [], []
+
+    with transaction.atomic():
+        payments = defaultdict(list)
+        for payment in (
+            Payment.objects.select_for_update(of=("self",))
+            .filter(session_id__in=sessions)
+            .select_related("borrowing")
+            .order_by("id")
+        ):
+            payments[payment.session_id].append(payment)
+
+        for session_id, session in sessions.items():
+            session_paid = session.payment_status == "paid"
+            session_payments = payments.get(session_id)
+
+            if not session_payments:
+                # Unpaid sessions without payments were renewed or abandoned
+                if session_paid:
+                    discrepancies.append(get_discrepancy(session, "missing_payment"))
+                continue
+
+            amount = sum(
+                int(payment.money_to_pay * 100) for payment in session_payments
+            )
+            if session.amount_total is not None and amount != session.amount_total:
+                discrepancies.append(
+                    get_discrepancy(
+                        session,
+                        "amount_mismatch",
+                        local_amount=amount,
+                        stripe_amount=session.amount_total,
+                    )
+                )
+
+            for payment in session_payments:
+                if session_paid and payment.status != Payment.StatusChoices.PAID:
+                    discrepancies.append(
+                        get_discrepancy(session, "marked_paid", payment)
+                    )
+                    payment.status = Payment.StatusChoices.PAID
+                    paid.append(payment)
+                elif not session_paid and payment.status == Payment.StatusChoices.PAID:
+                    discrepancies.append(get_discrepancy(session, "unpaid", payment))
+                elif (
+                    session.status == "expired"
+                    and payment.status == Payment.StatusChoices.PENDING
+                    and (
+                        payment.session_expires_at is None
+                        or payment.session_expires_at > now
+                    )
+                ):
+                    discrepancies.append(get_discrepancy(session, "expired", payment))
+                    payment.session_expires_at = now
+                    expired.append(payment)
+
+        Payment.objects.bulk_update(paid, ["status"])
+        Payment.objects.bulk_update(expired, ["session_expires_at"])
+        apply_ledger_changes(
+            [(payment.borrowing.user_id, payment.money_to_pay) for payment in paid],
+            sign=-1,
+        )
+
+    return len(paid) + len(expired), discrepancies
+
+
+def reconcile_payments(
+    since: datetime.datetime = None,
+    until: datetime.datetime = None,
+    batch_size: int = RECONCILE_BATCH_SIZE,
+) -> ReconciliationRun:
+    """
+    Compare payments with Stripe sessions created in [since, until].
+
+    Every batch of `batch_size` sessions is applied in its own
+    transaction. The run is only marked finished, and so becomes the
+    watermark of the next one, once the whole window has been read.
+    """
+    until = until or timezone.now()
+    since = since or get_reconciliation_start(until)
+    run = ReconciliationRun.objects.create(since=since, until=until)
+    batch = []
+
+    def apply_batch() -> None:
+        updated, discrepancies = reconcile_sessions(batch)
+        run.sessions += len(batch)
+        run.updated_payments += updated
+        run.discrepancy_count += len(discrepancies)
+        room = MAX_REPORTED_DISCREPANCIES - len(run.discrepancies)
+        run.discrepancies += discrepancies[:room]
+        batch.clear()
+
+    for session in list_checkout_sessions(since, until):
+        batch.append(session)
+        if len(batch) >= batch_size:
+            apply_batch()
+    if batch:
+        apply_batch()
+
+    run.finished_at = timezone.now()
+    run.save()
+    logger.info(
+        "Reconciled %d Stripe sessions in %.3fs: %d payments updated, "
+        "%d discrepancies",
+        run.sessions,
+        (run.finished_at - run.started_at).total_seconds(),
+        run.updated_payments,
+        run.discrepancy_count,
+    )
+    return run
+
+
+def reconcile_recent_payments() -> ReconciliationRun:
+    """Scheduled reconciliation, never further back than SCHEDULED_WINDOW"""
+    until = timezone.now()
+    since = max(get_reconciliation_start(until), until - SCHEDULED_WINDOW)
+    return reconcile_payments(since=since, until=until)
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from payment.models import Payment
+from payment.models import AccruedFine, Payment
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -15,3 +15,9 @@ class PaymentSerializer(serializers.ModelSerializer):
             "session_id",
             "money_to_pay",
         )
+
+
+class AccruedFineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AccruedFine
+        fields = ("borrowing", "overdue_days", "amount", "accrued_on")
@@ -0,0 +1,201 @@
+import logging
+import time
+from collections import defaultdict
+
+import stripe
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from payment.models import Payment
+from payment.stripe_client import expire_checkout_sessions
+from payment.utils import (
+    fill_stripe_session,
+    get_payment_product_name,
+    get_redirect_urls,
+    refill_stale_sessions,
+)
+
+SWEEP_BATCH_SIZE = 100
+SWEEP_MAX_BATCHES = 10
+# No Stripe call is started after this many seconds, so that a run with
+# a last slow call and its retries still ends within the django_q timeout
+SWEEP_TIME_LIMIT = 15
+MAX_SESSION_RENEWALS = 2
+
+logger = logging.getLogger(__name__)
+
+
+def get_stale_sessions(now, batch_size: int, exclude: list[str]) -> list[str]:
+    """Oldest pending sessions past their expiry, read from the partial index"""
+    session_ids = (
+        Payment.objects.filter(
+            status=Payment.StatusChoices.PENDING, session_expires_at__lte=now
+        )
+        .exclude(session_id__in=exclude)
+        .order_by("session_expires_at")
+        .values_list("session_id", flat=True)[:batch_size]
+    )
+    return list(dict.fromkeys(session_ids))
+
+
+def expire_payments(session_ids: list[str]) -> tuple[dict, int]:
+    """
+    Move payments of expired sessions out of the "Pending" state.
+
+    Sessions renewed fewer than MAX_SESSION_RENEWALS times go back to
+    "Creating" to get a fresh session, the rest are marked "Expired".
+    Returns the payments to renew by their old (session id, url) and
+    the number of expired payments.
+    """
+    with transaction.atomic():
+        payments = (
+            Payment.objects.select_for_update(of=("self",))
+            .filter(session_id__in=session_ids, status=Payment.StatusChoices.PENDING)
+            .select_related("borrowing__book")
+            .order_by("id")
+        )
+        sessions = defaultdict(list)
+        for payment in payments:
+            sessions[(payment.session_id, payment.session_url)].append(payment)
+
+        renewals, expired = {}, []
+        for session, session_payments in sessions.items():
+            if session_payments[0].session_renewals >= MAX_SESSION_RENEWALS:
+                for payment in session_payments:
+                    payment.status = Payment.StatusChoices.EXPIRED
+                expired += session_payments
+                continue
+
+            for payment in session_payments:
+                payment.status = Payment.StatusChoices.CREATING
+                payment.session_renewals += 1
+                payment.session_id = payment.session_url = ""
+                payment.session_expires_at = None
+                payment.session_requested_at = timezone.now()
+            renewals[session] = session_payments
+
+        Payment.objects.bulk_update(
+            expired + [payment for group in renewals.values() for payment in group],
+            [
+                "status",
+                "session_renewals",
+                "session_id",
+                "session_url",
+                "session_expires_at",
+                "session_requested_at",
+            ],
+        )
+
+    return renewals, len(expired)
+
+
+def renew_sessions(renewals: dict, deadline: float = None) -> int:
+    """
+    Create a fresh session for every group of payments.
+
+    If Stripe fails, the payments get their old session back and are
+    swept again by the next run. Groups not started before the
+    `deadline` stay in the "Creating" state for `refill_stale_sessions`.
+    """
+    success_url, cancel_url = get_redirect_urls(None)
+    renewed = 0
+
+    for (session_id, session_url), payments in renewals.items():
+        if deadline is not None and time.monotonic() > deadline:
+            break
+
+        payment_ids = [payment.id for payment in payments]
+        try:
+            fill_stripe_session(
+                payment_ids,
+                [get_payment_product_name(payment) for payment in payments],
+                success_url,
+                cancel_url,
+            )
+        except stripe.error.StripeError:
+            logger.warning("Renewing Stripe session %s failed", session_id)
+            Payment.objects.filter(
+                pk__in=payment_ids, status=Payment.StatusChoices.CREATING
+            ).update(
+                status=Payment.StatusChoices.PENDING,
+                session_id=session_id,
+                session_url=session_url,
+                session_expires_at=timezone.now(),
+                session_renewals=F("session_renewals") - 1,
+            )
+            continue
+
+        renewed += len(payments)
+
+    return renewed
+
+
+def sweep_expired_sessions(
+    batch_size: int = SWEEP_BATCH_SIZE,
+    max_batches: int = SWEEP_MAX_BATCHES,
+    time_limit: float = SWEEP_TIME_LIMIT,
+) -> dict:
+    """
+    Expire stale pending checkout sessions at Stripe, then renew them or
+    mark their payments expired.
+
+    At most `max_batches` batches of `batch_size` sessions are handled
+    per run and no Stripe call is started after `time_limit` seconds,
+    the rest is left for the next run. Sessions Stripe reports as paid
+    are left for the webhook, and unreachable ones for the next run.
+    Payments left in the "Creating" state, e.g. by a run that was killed
+    before it renewed them, are refilled in the remaining time.
+    """
+    started = time.monotonic()
+    deadline = started + time_limit
+    now = timezone.now()
+    metrics = {"sessions": 0, "renewed": 0, "expired": 0}
+    skipped = []
+
+    for _ in range(max_batches):
+        if time.monotonic() > deadline:
+            break
+
+        session_ids = get_stale_sessions(now, batch_size, skipped)
+        if not session_ids:
+            break
+
+        statuses = expire_checkout_sessions(session_ids, deadline)
+        skipped += [
+            session_id
+            for session_id in session_ids
+            if statuses[session_id] != "expired"
+        ]
+        renewals, expired = expire_payments(
+            [
+                session_id
+                for session_id in session_ids
+                if statuses[session_id] == "expired"
+            ]
+        )
+
+        metrics["sessions"] += len(session_ids)
+        metrics["expired"] += expired
+        metrics["renewed"] += renew_sessions(renewals, deadline)
+
+        if all(status is None for status in statuses.values()):
+            # Stripe is unreachable, the breaker fails the remaining calls
+            break
+
+    metrics["refilled"] = refill_stale_sessions(
+        time_limit=max(deadline - time.monotonic(), 0)
+    )["filled"]
+    metrics["skipped"] = len(skipped)
+    metrics["duration"] = round(time.monotonic() - started, 3)
+    logger.info(
+        "Session sweep checked %d sessions in %.3fs: %d payments renewed, "
+        "%d expired, %d refilled, %d sessions skipped",
+        metrics["sessions"],
+        metrics["duration"],
+        metrics["renewed"],
+        metrics["expired"],
+        metrics["refilled"],
+        metrics["skipped"],
+    )
+    return metrics
@@ -0,0 +1,157 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+import requests
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+POOL_MAXSIZE = 20
+EXPIRE_WORKERS = 8
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30
+
+# Errors that mean Stripe is unreachable or overloaded, card and request
+# errors are the caller's fault and never trip the breaker
+TRIP_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.APIError,
+    stripe.error.RateLimitError,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class StripeUnavailable(stripe.error.APIConnectionError):
+    """Raised without calling Stripe while the circuit breaker is open"""
+
+
+class PaymentServiceUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Payment service is temporarily unavailable, try again later."
+    default_code = "payment_service_unavailable"
+
+
+class CircuitBreaker:
+    """
+    Fail fast after `failure_threshold` consecutive Stripe outages.
+
+    State lives in the cache so that all workers share it. The breaker
+    stays open for `reset_timeout` seconds, then lets calls through
+    again, but the first failure after that reopens it right away.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: int):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.open_key = f"circuit:{name}:open"
+        self.failures_key = f"circuit:{name}:failures"
+
+    def call(self, func: Callable, *args, **kwargs):
+        state = cache.get_many([self.open_key, self.failures_key])
+
+        if state.get(self.open_key):
+            raise StripeUnavailable("Stripe circuit breaker is open")
+
+        try:
+            result = func(*args, **kwargs)
+        except TRIP_ERRORS:
+            self.record_failure()
+            raise
+
+        if state.get(self.failures_key):
+            cache.delete(self.failures_key)
+        return result
+
+    def record_failure(self) -> None:
+        cache.add(self.failures_key, 0, timeout=self.reset_timeout * 2)
+        failures = cache.incr(self.failures_key)
+
+        if failures >= self.failure_threshold:
+            logger.warning("Stripe circuit breaker opened after %s failures", failures)
+            cache.set(self.open_key, 1, timeout=self.reset_timeout)
+            cache.set(
+                self.failures_key,
+                self.failure_threshold - 1,
+                timeout=self.reset_timeout * 2,
+            )
+
+    def reset(self) -> None:
+        cache.delete_many([self.open_key, self.failures_key])
+
+
+def get_pooled_session() -> requests.Session:
+    """Keep-alive connections to Stripe shared by all threads of the worker"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+stripe.api_key = settings.STRIPE_API_KEY
+stripe.api_base = settings.STRIPE_API_BASE
+# Retries back off with jitter and reuse an automatic idempotency key
+stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+stripe.default_http_client = stripe.http_client.RequestsClient(
+    timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+    session=get_pooled_session(),
+)
+
+stripe_breaker = CircuitBreaker(
+    "stripe", BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT
+)
+
+
+def expire_checkout_session(session_id: str) -> str | None:
+    """
+    Expire an open session and return its final Stripe status.
+
+    Sessions that are no longer open keep their status, e.g. "complete"
+    when the customer paid just before. Returns None if Stripe could
+    not be reached, so that the session is retried later.
+    """
+    try:
+        return stripe_breaker.call(stripe.checkout.Session.expire, session_id).status
+    except stripe.error.InvalidRequestError:
+        pass
+    except stripe.error.StripeError:
+        logger.warning("Expiring Stripe session %s failed", session_id, exc_info=True)
+        return None
+
+    try:
+        return stripe_breaker.call(stripe.checkout.Session.retrieve, session_id).status
+    except stripe.error.InvalidRequestError as error:
+        # A session Stripe does not know can never be paid
+        return "expired" if error.http_status == 404 else None
+    except stripe.error.StripeError:
+        logger.warning("Fetching Stripe session %s failed", session_id, exc_info=True)
+        return None
+
+
+def expire_checkout_sessions(
+    session_ids: Iterable[str], deadline: float = None
+) -> dict[str, str | None]:
+    """
+    Expire sessions in parallel over the pooled connections.
+
+    Sessions not started before the `deadline`, a time.monotonic() value,
+    are not sent to Stripe and get None like unreachable ones.
+    """
+    session_ids = list(session_ids)
+
+    if not session_ids:
+        return {}
+
+    def expire(session_id: str) -> str | None:
+        if deadline is not None and time.monotonic() > deadline:
+            return None
+        return expire_checkout_session(session_id)
+
+    with ThreadPoolExecutor(max_workers=min(EXPIRE_WORKERS, len(session_ids))) as pool:
+        return dict(zip(session_ids, pool.map(expire, session_ids)))
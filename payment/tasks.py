@@ -0,0 +1,41 @@
+from django.utils import timezone
+from django_q.tasks import schedule
+
+
+schedule(
+    "payment.fines.accrue_fines",
+    schedule_type="D",
+    repeats=-1,
+    next_run=timezone.now() + timezone.timedelta(minutes=1),
+)
+
+schedule(
+    "payment.webhooks.process_stripe_events",
+    schedule_type="I",
+    minutes=1,
+    repeats=-1,
+    next_run=timezone.now() + timezone.timedelta(minutes=1),
+)
+
+schedule(
+    "payment.utils.refill_stale_sessions",
+    schedule_type="I",
+    minutes=5,
+    repeats=-1,
+    next_run=timezone.now() + timezone.timedelta(minutes=1),
+)
+
+schedule(
+    "payment.sessions.sweep_expired_sessions",
+    schedule_type="I",
+    minutes=15,
+    repeats=-1,
+    next_run=timezone.now() + timezone.timedelta(minutes=1),
+)
+
+schedule(
+    "payment.reconciliation.reconcile_recent_payments",
+    schedule_type="D",
+    repeats=-1,
+    next_run=timezone.now() + timezone.timedelta(minutes=1),
+)
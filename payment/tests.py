@@ -1,3 +1,660 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import time
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import requests
+import stripe
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from book.models import Book
+from borrowing.models import Borrowing
+from payment.fake_stripe import start_fake_stripe
+from payment.fines import accrue_fines
+from payment.ledger import reconcile_ledger
+from payment.models import (
+    AccruedFine,
+    Ledger,
+    Payment,
+    ReconciliationRun,
+    StripeEvent,
+)
+from payment.reconciliation import (
+    SCHEDULED_WINDOW,
+    reconcile_payments,
+    reconcile_recent_payments,
+)
+from payment.sessions import MAX_SESSION_RENEWALS, sweep_expired_sessions
+from payment.stripe_client import StripeUnavailable, stripe_breaker
+from payment.utils import (
+    REFILL_AFTER,
+    create_checkout_session,
+    fill_stripe_session,
+    refill_stale_sessions,
+)
+from payment.webhooks import process_stripe_events
+
+BORROWINGS_URL = reverse("borrowing:borrowing-list")
+PAYMENT_SUCCESS_URL = reverse("payment:payment-success")
+ACCRUED_FINES_URL = reverse("payment:accrued-fine-list")
+STRIPE_WEBHOOK_URL = reverse("payment:stripe-webhook")
+WEBHOOK_SECRET = "whsec_test"
+
+
+def get_stripe_event(event_id: str, event_type: str, session_id: str) -> str:
+    return json.dumps(
+        {
+            "id": event_id,
+            "object": "event",
+            "type": event_type,
+            "data": {
+                "object": {
+                    "id": session_id,
+                    "object": "checkout.session",
+                    "payment_status": "paid"
+                    if event_type == "checkout.session.completed"
+                    else "unpaid",
+                }
+            },
+        }
+    )
+
+
+def sign_payload(payload: str, secret: str = WEBHOOK_SECRET) -> str:
+    timestamp = int(time.time())
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def create_book() -> Book:
+    return Book.objects.create(
+        title="Test book",
+        author="Test Author",
+        cover="Soft",
+        inventory=20,
+        daily_fee=1.99,
+    )
+
+
+@override_settings(STRIPE_ASYNC_CHECKOUT=True)
+class AsyncCheckoutTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        self.book = create_book()
+        self.client.force_authenticate(self.user)
+
+    @mock.patch("payment.utils.stripe.checkout.Session.create")
+    @mock.patch("payment.utils.async_task")
+    def test_session_created_after_commit(self, async_task, session_create):
+        data = {
+            "expected_return_date": timezone.now().date() + timezone.timedelta(days=2),
+            "book": self.book.id,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(BORROWINGS_URL, data=data)
+
+        payment = Payment.objects.get()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["payments"][0]["status"], "Creating")
+        self.assertEqual(payment.money_to_pay, Decimal("3.98"))
+        self.assertEqual(self.user.ledger.outstanding_balance, Decimal("3.98"))
+        self.assertEqual(self.user.ledger.pending_payments, 1)
+        session_create.assert_not_called()
+        self.assertEqual(async_task.call_args.args[1], [payment.id])
+
+        session_create.return_value = SimpleNamespace(
+            id="cs_test_1", url="https://checkout.stripe.com/c/pay/cs_test_1"
+        )
+        fill_stripe_session(*async_task.call_args.args[1:])
+        payment.refresh_from_db()
+
+        self.assertEqual(payment.status, "Pending")
+        self.assertEqual(payment.session_id, "cs_test_1")
+        self.assertEqual(
+            session_create.call_args.kwargs["idempotency_key"], f"payment-{payment.id}"
+        )
+        self.assertEqual(
+            session_create.call_args.kwargs["line_items"][0]["price_data"][
+                "unit_amount"
+            ],
+            398,
+        )
+
+    @mock.patch("payment.utils.stripe.checkout.Session.create")
+    @mock.patch("payment.utils.async_task")
+    def test_failed_session_is_refilled(self, async_task, session_create):
+        self.addCleanup(stripe_breaker.reset)
+        data = {
+            "expected_return_date": timezone.now().date() + timezone.timedelta(days=2),
+            "book": self.book.id,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(BORROWINGS_URL, data=data)
+        session_create.side_effect = stripe.error.APIConnectionError("Timeout")
+
+        with self.assertRaises(stripe.error.APIConnectionError):
+            fill_stripe_session(*async_task.call_args.args[1:])
+
+        payment = Payment.objects.get()
+        session_create.side_effect = None
+        session_create.return_value = SimpleNamespace(
+            id="cs_test_refill", url="https://checkout.stripe.com/c/pay/cs_test_refill"
+        )
+
+        self.assertEqual(refill_stale_sessions()["payments"], 0)
+
+        Payment.objects.update(
+            session_requested_at=timezone.now()
+            - REFILL_AFTER
+            - timezone.timedelta(minutes=1)
+        )
+        metrics = refill_stale_sessions()
+        payment.refresh_from_db()
+
+        self.assertEqual(metrics["filled"], 1)
+        self.assertEqual(payment.status, "Pending")
+        self.assertEqual(payment.session_id, "cs_test_refill")
+        self.assertEqual(
+            session_create.call_args.kwargs["line_items"][0]["price_data"][
+                "product_data"
+            ]["name"],
+            f"Payment for borrowing of {self.book.title}",
+        )
+        self.assertNotEqual(
+            session_create.call_args.kwargs["idempotency_key"], f"payment-{payment.id}"
+        )
+
+    @mock.patch("payment.utils.async_task")
+    def test_creating_payment_blocks_checkout(self, async_task):
+        data = {
+            "expected_return_date": timezone.now().date() + timezone.timedelta(days=2),
+            "book": self.book.id,
+        }
+        self.client.post(BORROWINGS_URL, data=data)
+        res = self.client.post(BORROWINGS_URL, data=data)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PaymentSessionTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        book = create_book()
+        for _ in range(2):
+            borrowing = Borrowing.objects.create(
+                expected_return_date=timezone.now().date() + timezone.timedelta(days=1),
+                book=book,
+                user=self.user,
+            )
+            Payment.objects.create(
+                status="Pending",
+                type="Payment",
+                borrowing=borrowing,
+                session_url="https://checkout.stripe.com/c/pay/cs_test_shared",
+                session_id="cs_test_shared",
+                money_to_pay=1.99,
+            )
+        reconcile_ledger()
+        self.client.force_authenticate(self.user)
+
+    def post_event(self, payload: str, signature: str = None):
+        return self.client.post(
+            STRIPE_WEBHOOK_URL,
+            data=payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=signature or sign_payload(payload),
+        )
+
+    @override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+    @mock.patch("payment.webhooks.async_task")
+    def test_webhook_marks_every_session_payment_paid(self, async_task):
+        res = self.client.get(
+            PAYMENT_SUCCESS_URL, data={"session_id": "cs_test_shared"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+
+        payload = get_stripe_event(
+            "evt_1", "checkout.session.completed", "cs_test_shared"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            res_event = self.post_event(payload)
+            res_repeated = self.post_event(payload)
+
+        self.assertEqual(res_event.status_code, status.HTTP_200_OK)
+        self.assertEqual(res_repeated.status_code, status.HTTP_200_OK)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+        async_task.assert_called_once_with("payment.webhooks.process_stripe_events")
+
+        self.assertEqual(process_stripe_events(), 1)
+        res = self.client.get(
+            PAYMENT_SUCCESS_URL, data={"session_id": "cs_test_shared"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["payments"]), 2)
+        self.assertFalse(Payment.objects.filter(status="Pending").exists())
+
+        ledger = Ledger.objects.get(user=self.user)
+        self.assertEqual(ledger.outstanding_balance, 0)
+        self.assertEqual(ledger.pending_payments, 0)
+
+    @override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+    @mock.patch("payment.webhooks.async_task")
+    def test_webhook_expired_session(self, async_task):
+        self.post_event(
+            get_stripe_event("evt_2", "checkout.session.expired", "cs_test_shared")
+        )
+        process_stripe_events()
+
+        # The session sweeper renews them on its next run
+        self.assertEqual(Payment.objects.filter(status="Pending").count(), 2)
+        self.assertFalse(
+            Payment.objects.filter(session_expires_at__gt=timezone.now()).exists()
+        )
+        self.assertEqual(Ledger.objects.get(user=self.user).pending_payments, 2)
+
+    @override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+    @mock.patch("payment.utils.stripe.checkout.Session.create")
+    @mock.patch("payment.webhooks.async_task")
+    def test_renew_expired_payment(self, async_task, session_create):
+        Payment.objects.update(session_renewals=MAX_SESSION_RENEWALS)
+        self.post_event(
+            get_stripe_event("evt_4", "checkout.session.expired", "cs_test_shared")
+        )
+        process_stripe_events()
+        payment = Payment.objects.order_by("id").first()
+        session_create.return_value = SimpleNamespace(
+            id="cs_test_renewed", url="https://checkout.stripe.com/c/pay/renewed"
+        )
+
+        res = self.client.post(reverse("payment:payment-renew", args=[payment.id]))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["session_id"] for item in res.data["payments"]],
+            ["cs_test_renewed", "cs_test_renewed"],
+        )
+        self.assertEqual(
+            session_create.call_args.kwargs["idempotency_key"],
+            f"payment-{payment.id}-renewal-{MAX_SESSION_RENEWALS + 1}",
+        )
+        self.assertFalse(Payment.objects.exclude(status="Pending").exists())
+        self.assertEqual(Ledger.objects.get(user=self.user).pending_payments, 2)
+
+        res = self.client.post(reverse("payment:payment-renew", args=[payment.id]))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+    def test_webhook_invalid_signature(self):
+        payload = get_stripe_event(
+            "evt_3", "checkout.session.completed", "cs_test_shared"
+        )
+        res = self.post_event(payload, signature=sign_payload(payload, "whsec_x"))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    @override_settings(STRIPE_WEBHOOK_SECRET="")
+    def test_webhook_rejected_without_secret(self):
+        payload = get_stripe_event(
+            "evt_4", "checkout.session.completed", "cs_test_shared"
+        )
+        res = self.post_event(payload, signature=sign_payload(payload, ""))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_reconcile_ledger_fixes_drift(self):
+        Ledger.objects.filter(user=self.user).update(
+            outstanding_balance=10, pending_payments=5
+        )
+        out = StringIO()
+        call_command("reconcile_ledger", "--dry-run", stdout=out)
+
+        self.assertIn("Found 1 drifted ledgers.", out.getvalue())
+        self.assertEqual(Ledger.objects.get(user=self.user).pending_payments, 5)
+
+        call_command("reconcile_ledger", stdout=StringIO())
+        ledger = Ledger.objects.get(user=self.user)
+
+        self.assertEqual(ledger.outstanding_balance, Decimal("3.98"))
+        self.assertEqual(ledger.pending_payments, 2)
+        self.assertEqual(reconcile_ledger(), [])
+
+    def test_unknown_session(self):
+        res = self.client.get(PAYMENT_SUCCESS_URL, data={"session_id": "cs_unknown"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AccruedFineTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        self.other_user = get_user_model().objects.create_user(
+            email="other@test.com", password="test12345"
+        )
+        book = create_book()
+        today = timezone.now().date()
+        self.overdue = Borrowing.objects.create(
+            expected_return_date=today - timezone.timedelta(days=3),
+            book=book,
+            user=self.user,
+        )
+        Borrowing.objects.create(
+            expected_return_date=today + timezone.timedelta(days=3),
+            book=book,
+            user=self.user,
+        )
+        Borrowing.objects.create(
+            expected_return_date=today - timezone.timedelta(days=1),
+            book=book,
+            user=self.other_user,
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_accrue_fines(self):
+        self.assertEqual(accrue_fines(), {"accrued": 2, "removed": 0})
+
+        accrued_fine = AccruedFine.objects.get(borrowing=self.overdue)
+        self.assertEqual(accrued_fine.overdue_days, 3)
+        self.assertEqual(accrued_fine.amount, Decimal("11.94"))
+
+        Borrowing.objects.filter(user=self.other_user).update(
+            actual_return_date=timezone.now().date()
+        )
+        tomorrow = timezone.now().date() + timezone.timedelta(days=1)
+
+        self.assertEqual(accrue_fines(today=tomorrow), {"accrued": 1, "removed": 1})
+        self.assertEqual(
+            AccruedFine.objects.get(borrowing=self.overdue).amount, Decimal("15.92")
+        )
+
+    def test_accrued_fines_list(self):
+        accrue_fines()
+        res = self.client.get(ACCRUED_FINES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [fine["borrowing"] for fine in res.data["results"]], [self.overdue.id]
+        )
+
+    @override_settings(STRIPE_ASYNC_CHECKOUT=True)
+    @mock.patch("payment.utils.async_task")
+    def test_return_uses_accrued_fine(self, async_task):
+        accrue_fines()
+        AccruedFine.objects.filter(borrowing=self.overdue).update(amount=5)
+        res = self.client.post(
+            reverse("borrowing:borrowing-return", args=[self.overdue.id])
+        )
+        fine = Payment.objects.get(borrowing=self.overdue)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(fine.type, "Fine")
+        self.assertEqual(fine.money_to_pay, Decimal("5.00"))
+        self.assertFalse(AccruedFine.objects.filter(borrowing=self.overdue).exists())
+
+
+class StripeClientTests(TestCase):
+    def setUp(self) -> None:
+        self.server = start_fake_stripe()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        patcher = mock.patch.multiple(
+            stripe, api_base=self.server.url, max_network_retries=0
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        stripe_breaker.reset()
+        self.addCleanup(stripe_breaker.reset)
+
+    def test_checkout_against_fake_stripe(self):
+        session = create_checkout_session(
+            [(398, "Test book"), (200, "Other book")],
+            "http://testserver/success/?session_id={CHECKOUT_SESSION_ID}",
+            "http://testserver/cancel/",
+            idempotency_key="payment-1",
+        )
+        replayed = create_checkout_session(
+            [(398, "Test book")], "", "", idempotency_key="payment-1"
+        )
+
+        self.assertEqual(session.amount_total, 598)
+        self.assertEqual(replayed.id, session.id)
+
+        res = requests.get(session.url, allow_redirects=False)
+
+        self.assertEqual(res.status_code, 303)
+        self.assertTrue(res.headers["Location"].endswith(session.id))
+        self.assertEqual(
+            stripe.checkout.Session.retrieve(session.id).payment_status, "paid"
+        )
+
+    def test_breaker_fails_fast(self):
+        self.server.error_rate = 1
+
+        for _ in range(stripe_breaker.failure_threshold):
+            with self.assertRaises(stripe.error.APIError):
+                create_checkout_session([(398, "Test book")], "", "")
+
+        self.server.error_rate = 0
+
+        with self.assertRaises(StripeUnavailable):
+            create_checkout_session([(398, "Test book")], "", "")
+
+        stripe_breaker.reset()
+        self.assertTrue(create_checkout_session([(398, "Test book")], "", "").id)
+
+    def test_checkout_during_stripe_errors(self):
+        self.server.error_rate = 1
+        user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        res = client.post(
+            BORROWINGS_URL,
+            data={
+                "expected_return_date": timezone.now().date()
+                + timezone.timedelta(days=2),
+                "book": create_book().id,
+            },
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(Borrowing.objects.exists())
+
+    def create_stale_payments(self, count: int, renewals: int = 0) -> list[Payment]:
+        session = create_checkout_session([(199, "Test book")] * count, "", "")
+        borrowing = Borrowing.objects.create(
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=1),
+            book=create_book(),
+            user=self.user,
+        )
+        return [
+            Payment.objects.create(
+                status="Pending",
+                type=payment_type,
+                borrowing=borrowing,
+                session_url=session.url,
+                session_id=session.id,
+                session_expires_at=timezone.now() - timezone.timedelta(minutes=1),
+                session_renewals=renewals,
+                money_to_pay=1.99,
+            )
+            for payment_type in ("Payment", "Fine")[:count]
+        ]
+
+    def test_sweep_expired_sessions(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        renewed = self.create_stale_payments(2)
+        expired = self.create_stale_payments(1, renewals=2)
+        paid = self.create_stale_payments(1)
+        requests.get(paid[0].session_url, allow_redirects=False)
+
+        metrics = sweep_expired_sessions(batch_size=2)
+
+        self.assertEqual(
+            {
+                key: metrics[key]
+                for key in ("sessions", "renewed", "expired", "skipped")
+            },
+            {"sessions": 3, "renewed": 2, "expired": 1, "skipped": 1},
+        )
+        old_session_id = renewed[0].session_id
+        for payment in renewed:
+            payment.refresh_from_db()
+            self.assertEqual(payment.status, "Pending")
+            self.assertEqual(payment.session_renewals, 1)
+            self.assertGreater(payment.session_expires_at, timezone.now())
+        self.assertNotEqual(renewed[0].session_id, old_session_id)
+        self.assertEqual(renewed[0].session_id, renewed[1].session_id)
+        self.assertEqual(
+            stripe.checkout.Session.retrieve(old_session_id).status, "expired"
+        )
+        self.assertEqual(Payment.objects.get(pk=expired[0].pk).status, "Expired")
+        self.assertEqual(Payment.objects.get(pk=paid[0].pk).status, "Pending")
+
+    def test_sweep_after_expired_webhook(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        payments = self.create_stale_payments(2)
+        old_session_id = payments[0].session_id
+        Payment.objects.update(
+            session_expires_at=timezone.now() + timezone.timedelta(hours=1)
+        )
+        # Stripe expires the session itself and sends the event
+        stripe.checkout.Session.expire(old_session_id)
+        StripeEvent.objects.create(
+            id="evt_expired",
+            type="checkout.session.expired",
+            payload=json.loads(
+                get_stripe_event(
+                    "evt_expired", "checkout.session.expired", old_session_id
+                )
+            ),
+        )
+        process_stripe_events()
+
+        self.assertFalse(Payment.objects.exclude(status="Pending").exists())
+
+        metrics = sweep_expired_sessions()
+
+        self.assertEqual(metrics["renewed"], 2)
+        for payment in payments:
+            payment.refresh_from_db()
+            self.assertEqual(payment.status, "Pending")
+            self.assertEqual(payment.session_renewals, 1)
+            self.assertNotEqual(payment.session_id, old_session_id)
+
+    def test_sweep_time_limit(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        self.create_stale_payments(2)
+
+        self.assertEqual(sweep_expired_sessions(time_limit=0)["sessions"], 0)
+
+        # The run is killed after the payments were moved to "Creating"
+        with mock.patch("payment.sessions.renew_sessions", return_value=0):
+            sweep_expired_sessions()
+
+        self.assertFalse(Payment.objects.exclude(status="Creating").exists())
+
+        Payment.objects.update(
+            session_requested_at=timezone.now()
+            - REFILL_AFTER
+            - timezone.timedelta(minutes=1)
+        )
+        metrics = sweep_expired_sessions()
+
+        self.assertEqual(metrics["refilled"], 2)
+        self.assertFalse(Payment.objects.exclude(status="Pending").exists())
+        self.assertFalse(Payment.objects.filter(session_url="").exists())
+
+    def test_reconcile_payments(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        unpaid = self.create_stale_payments(2)
+        paid_locally = self.create_stale_payments(1)
+        Payment.objects.filter(pk=paid_locally[0].pk).update(status="Paid")
+        for payment in unpaid:
+            requests.get(payment.session_url, allow_redirects=False)
+        unknown = create_checkout_session([(100, "Unknown")], "", "")
+        requests.get(unknown.url, allow_redirects=False)
+        reconcile_ledger()
+        out = StringIO()
+
+        call_command("reconcile_payments", stdout=out)
+        run = ReconciliationRun.objects.get()
+
+        self.assertEqual(run.sessions, 3)
+        self.assertEqual(run.updated_payments, 2)
+        self.assertEqual(
+            sorted(discrepancy["kind"] for discrepancy in run.discrepancies),
+            ["marked_paid", "marked_paid", "missing_payment", "unpaid"],
+        )
+        self.assertIn("4 discrepancies", out.getvalue())
+        self.assertFalse(Payment.objects.exclude(status="Paid").exists())
+        self.assertEqual(Ledger.objects.get(user=self.user).pending_payments, 0)
+
+        next_run = reconcile_payments(batch_size=1)
+
+        self.assertEqual(next_run.since, run.until - timezone.timedelta(hours=24))
+        self.assertEqual(next_run.sessions, 3)
+        self.assertEqual(next_run.updated_payments, 0)
+
+    def test_scheduled_reconciliation_window(self):
+        run = reconcile_recent_payments()
+
+        self.assertEqual(run.until - run.since, SCHEDULED_WINDOW)
+        self.assertIsNotNone(run.finished_at)
+
+    @mock.patch(
+        "payment.utils.stripe.checkout.Session.create",
+        side_effect=stripe.error.APIConnectionError("Connection refused"),
+    )
+    def test_checkout_during_stripe_outage(self, session_create):
+        user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        res = client.post(
+            BORROWINGS_URL,
+            data={
+                "expected_return_date": timezone.now().date()
+                + timezone.timedelta(days=2),
+                "book": create_book().id,
+            },
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(Borrowing.objects.exists())
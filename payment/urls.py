@@ -1,6 +1,6 @@
 from django.urls import path
 
-from payment.views import PaymentViewSet
+from payment.views import AccruedFineViewSet, PaymentViewSet, StripeWebhookAPIView
 
 app_name = "payment"
 
@@ -11,11 +11,22 @@ urlpatterns = [
         PaymentViewSet.as_view(actions={"get": "retrieve"}),
         name="payment-detail",
     ),
+    path(
+        "<int:pk>/renew/",
+        PaymentViewSet.as_view(actions={"post": "renew"}),
+        name="payment-renew",
+    ),
     path(
         "success/",
         PaymentViewSet.as_view(actions={"get": "success"}),
         name="payment-success",
     ),
+    path(
+        "accrued-fines/",
+        AccruedFineViewSet.as_view(actions={"get": "list"}),
+        name="accrued-fine-list",
+    ),
+    path("webhook/", StripeWebhookAPIView.as_view(), name="stripe-webhook"),
     path(
         "cancel/",
         PaymentViewSet.as_view(actions={"get": "cancel"}),
@@ -1,43 +1,147 @@
+import datetime
+import logging
+import time
+from collections import defaultdict
+from decimal import Decimal
+
 import stripe
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_q.tasks import async_task
 from rest_framework.request import Request
 from rest_framework.reverse import reverse
 
 from borrowing.models import Borrowing
-from payment.models import Payment
+from payment.ledger import apply_ledger_changes
+from payment.models import AccruedFine, Payment
+from payment.stripe_client import (
+    TRIP_ERRORS,
+    PaymentServiceUnavailable,
+    StripeUnavailable,
+    stripe_breaker,
+)
 
-stripe.api_key = settings.STRIPE_API_KEY
 FINE_MULTIPLIER = 2
+# The longest lifetime Stripe allows, the cancel page promises it to users
+CHECKOUT_SESSION_LIFETIME = datetime.timedelta(hours=24)
+# Sessions are created within seconds after commit, payments still in the
+# "Creating" state after that long were dropped by a failed or killed task
+REFILL_AFTER = datetime.timedelta(minutes=10)
+REFILL_BATCH_SIZE = 200
+REFILL_TIME_LIMIT = 30
 
+logger = logging.getLogger(__name__)
 
-def create_payment(
-    borrowing: Borrowing, session: stripe.checkout.Session, payment_type: str
-) -> None:
-    Payment.objects.create(
-        status="Pending",
-        type=payment_type,
-        borrowing=borrowing,
-        session_url=session.url,
-        session_id=session.id,
-        money_to_pay=session.amount_total / 100,
+
+def create_payments(
+    borrowings: list[Borrowing],
+    details: list[tuple[int, str]],
+    payment_type: str,
+    session: stripe.checkout.Session = None,
+    session_expires_at: datetime.datetime = None,
+) -> list[Payment]:
+    """Create one payment per borrowing, all sharing the same checkout session"""
+    payments = Payment.objects.bulk_create(
+        [
+            Payment(
+                status=Payment.StatusChoices.PENDING
+                if session
+                else Payment.StatusChoices.CREATING,
+                type=payment_type,
+                borrowing=borrowing,
+                session_url=session.url if session else "",
+                session_id=session.id if session else "",
+                session_expires_at=session_expires_at,
+                session_requested_at=timezone.now(),
+                money_to_pay=Decimal(amount) / 100,
+            )
+            for borrowing, (amount, _) in zip(borrowings, details)
+        ]
+    )
+    apply_ledger_changes(
+        [(payment.borrowing.user_id, payment.money_to_pay) for payment in payments],
+        sign=1,
     )
+    return payments
 
 
-def create_stripe_session(
-    borrowing: Borrowing, request: Request, payment_type: str, overdue_days: int = None
-) -> stripe.checkout.Session:
+def get_payment_details(
+    borrowing: Borrowing, overdue_days: int = None
+) -> tuple[int, str]:
+    """Return the amount to pay in cents and the Stripe product name"""
     book = borrowing.book
     if overdue_days is None:
         borrowing_period = (borrowing.expected_return_date - borrowing.borrow_date).days
         amount = int(book.daily_fee * borrowing_period * 100)
-        product_name = f"Payment for borrowing of {book.title}"
     else:
-        amount = int(book.daily_fee * overdue_days * 100) * FINE_MULTIPLIER
-        product_name = f"Fine payment for {book.title}: {overdue_days} days overdue"
+        amount = get_accrued_fine(borrowing, overdue_days)
+        if amount is None:
+            amount = int(book.daily_fee * overdue_days * 100) * FINE_MULTIPLIER
+    return amount, get_product_name(borrowing, overdue_days)
+
+
+def get_product_name(borrowing: Borrowing, overdue_days: int = None) -> str:
+    if overdue_days is None:
+        return f"Payment for borrowing of {borrowing.book.title}"
+    return f"Fine payment for {borrowing.book.title}: {overdue_days} days overdue"
+
+
+def get_payment_product_name(payment: Payment) -> str:
+    """Product name of an existing payment, fines are created on return"""
+    borrowing = payment.borrowing
+
+    if payment.type == Payment.TypeChoices.FINE and borrowing.actual_return_date:
+        overdue_days = (
+            borrowing.actual_return_date - borrowing.expected_return_date
+        ).days
+        return get_product_name(borrowing, overdue_days)
+    return get_product_name(borrowing)
+
+
+def get_accrued_fine(borrowing: Borrowing, overdue_days: int) -> int | None:
+    """Fine in cents precomputed by `accrue_fines`, if it is up to date"""
+    try:
+        accrued_fine = borrowing.accrued_fine
+    except AccruedFine.DoesNotExist:
+        return None
+
+    if accrued_fine.overdue_days != overdue_days:
+        return None
+    return int(accrued_fine.amount * 100)
+
+
+def get_redirect_urls(request: Request | None) -> tuple[str, str]:
+    """Absolute redirect URLs, taken from SITE_URL outside of a request"""
     success_url = reverse("payment:payment-success", request=request)
     cancel_url = reverse("payment:payment-cancel", request=request)
 
-    session = stripe.checkout.Session.create(
+    if request is None:
+        success_url = settings.SITE_URL + success_url
+        cancel_url = settings.SITE_URL + cancel_url
+
+    return (
+        success_url + "?session_id={CHECKOUT_SESSION_ID}",
+        cancel_url + "?session_id={CHECKOUT_SESSION_ID}",
+    )
+
+
+def create_checkout_session(
+    details: list[tuple[int, str]],
+    success_url: str,
+    cancel_url: str,
+    idempotency_key: str = None,
+    expires_at: datetime.datetime = None,
+) -> stripe.checkout.Session:
+    """Create a Stripe checkout session with one line item per (amount, name)"""
+    if expires_at is not None:
+        params = {"expires_at": int(expires_at.timestamp())}
+    else:
+        params = {}
+
+    return stripe_breaker.call(
+        stripe.checkout.Session.create,
         line_items=[
             {
                 "price_data": {
@@ -49,10 +153,291 @@ def create_stripe_session(
                 },
                 "quantity": 1,
             }
+            for amount, product_name in details
         ],
         mode="payment",
-        success_url=success_url + "?session_id={CHECKOUT_SESSION_ID}",
-        cancel_url=cancel_url + "?session_id={CHECKOUT_SESSION_ID}",
+        success_url=success_url,
+        cancel_url=cancel_url,
+        idempotency_key=idempotency_key,
+        **params,
+    )
+
+
+def create_stripe_session(
+    borrowing: Borrowing, request: Request, payment_type: str, overdue_days: int = None
+) -> stripe.checkout.Session | None:
+    return create_batch_stripe_session(
+        [borrowing], request, payment_type, overdue_days=overdue_days
+    )
+
+
+def create_batch_stripe_session(
+    borrowings: list[Borrowing],
+    request: Request,
+    payment_type: str,
+    overdue_days: int = None,
+) -> stripe.checkout.Session | None:
+    """
+    Create one Stripe checkout session and a pending payment per borrowing.
+
+    With STRIPE_ASYNC_CHECKOUT enabled, only payments in the "Creating"
+    state are written and the session is created by a django_q task after
+    the transaction commits, so no DB lock is held during the Stripe call.
+    Clients poll the payment until `session_url` is filled in.
+    """
+    details = [get_payment_details(borrowing, overdue_days) for borrowing in borrowings]
+    success_url, cancel_url = get_redirect_urls(request)
+
+    if settings.STRIPE_ASYNC_CHECKOUT:
+        payments = create_payments(borrowings, details, payment_type)
+        transaction.on_commit(
+            lambda: async_task(
+                "payment.utils.fill_stripe_session",
+                [payment.id for payment in payments],
+                [product_name for _, product_name in details],
+                success_url,
+                cancel_url,
+            )
+        )
+        return None
+
+    expires_at = timezone.now() + CHECKOUT_SESSION_LIFETIME
+
+    try:
+        session = create_checkout_session(
+            details, success_url, cancel_url, expires_at=expires_at
+        )
+    except TRIP_ERRORS:
+        raise PaymentServiceUnavailable()
+
+    create_payments(
+        borrowings,
+        details,
+        payment_type,
+        session=session,
+        session_expires_at=expires_at,
     )
-    create_payment(borrowing, session, payment_type)
     return session
+
+
+def fill_stripe_session(
+    payment_ids: list[int],
+    product_names: list[str],
+    success_url: str,
+    cancel_url: str,
+    idempotency_key: str = None,
+) -> None:
+    """Create the Stripe session for payments in the "Creating" state"""
+    names = dict(zip(payment_ids, product_names))
+    payments = list(
+        Payment.objects.filter(
+            pk__in=payment_ids, status=Payment.StatusChoices.CREATING
+        ).order_by("id")
+    )
+    details = [
+        (int(payment.money_to_pay * 100), names[payment.id]) for payment in payments
+    ]
+
+    if not details:
+        return
+
+    if idempotency_key is None:
+        # Renewed sessions must not replay the response of the first one
+        idempotency_key = f"payment-{min(payment_ids)}"
+        if payments[0].session_renewals:
+            idempotency_key += f"-renewal-{payments[0].session_renewals}"
+
+    expires_at = timezone.now() + CHECKOUT_SESSION_LIFETIME
+    session = create_checkout_session(
+        details,
+        success_url,
+        cancel_url,
+        idempotency_key=idempotency_key,
+        expires_at=expires_at,
+    )
+    Payment.objects.filter(
+        pk__in=payment_ids, status=Payment.StatusChoices.CREATING
+    ).update(
+        status=Payment.StatusChoices.PENDING,
+        session_url=session.url,
+        session_id=session.id,
+        session_expires_at=expires_at,
+    )
+
+
+def reopen_expired_payments(payment: Payment) -> list[Payment]:
+    """
+    Move an expired payment, and the payments of its user that shared
+    its session, back to the "Creating" state to get a fresh session.
+    Returns an empty list if the payment is not expired.
+    """
+    payments = Payment.objects.select_for_update(of=("self",)).filter(
+        status=Payment.StatusChoices.EXPIRED
+    )
+    if payment.session_id:
+        payments = payments.filter(
+            session_id=payment.session_id,
+            borrowing__user_id=payment.borrowing.user_id,
+        )
+    else:
+        payments = payments.filter(pk=payment.pk)
+
+    with transaction.atomic():
+        payments = list(payments.select_related("borrowing__book").order_by("id"))
+
+        for payment in payments:
+            payment.status = Payment.StatusChoices.CREATING
+            # A new idempotency key, the last one replays the expired session
+            payment.session_renewals += 1
+            payment.session_id = payment.session_url = ""
+            payment.session_expires_at = None
+            payment.session_requested_at = timezone.now()
+
+        Payment.objects.bulk_update(
+            payments,
+            [
+                "status",
+                "session_renewals",
+                "session_id",
+                "session_url",
+                "session_expires_at",
+                "session_requested_at",
+            ],
+        )
+
+    return payments
+
+
+def queue_fine_sessions(
+    fines: list[tuple[Borrowing, int]], request: Request
+) -> list[Payment]:
+    """
+    Create fine payments for (borrowing, overdue days) pairs right away
+    and their Stripe sessions, one per borrowing, after commit
+    """
+    borrowings = [borrowing for borrowing, _ in fines]
+    details = [get_payment_details(borrowing, days) for borrowing, days in fines]
+    payments = create_payments(borrowings, details, Payment.TypeChoices.FINE)
+    success_url, cancel_url = get_redirect_urls(request)
+
+    transaction.on_commit(
+        lambda: async_task(
+            "payment.utils.fill_stripe_sessions",
+            [payment.id for payment in payments],
+            [product_name for _, product_name in details],
+            success_url,
+            cancel_url,
+        )
+    )
+    return payments
+
+
+def fill_stripe_sessions(
+    payment_ids: list[int],
+    product_names: list[str],
+    success_url: str,
+    cancel_url: str,
+) -> None:
+    """
+    Create a separate Stripe session for every payment.
+
+    Payments whose session fails stay in the "Creating" state and are
+    picked up by `refill_stale_sessions`, all of them once the breaker
+    is open.
+    """
+    for payment_id, product_name in zip(payment_ids, product_names):
+        try:
+            fill_stripe_session([payment_id], [product_name], success_url, cancel_url)
+        except StripeUnavailable:
+            logger.warning("Stripe is unavailable, fine sessions are left for refill")
+            return
+        except stripe.error.StripeError:
+            logger.warning(
+                "Stripe session for payment %s failed, it is left for refill",
+                payment_id,
+                exc_info=True,
+            )
+
+
+def get_stale_creating_payments(cutoff: datetime.datetime):
+    return Payment.objects.filter(
+        Q(session_requested_at__lte=cutoff) | Q(session_requested_at__isnull=True),
+        status=Payment.StatusChoices.CREATING,
+    )
+
+
+def refill_stale_sessions(time_limit: float = REFILL_TIME_LIMIT) -> dict:
+    """
+    Create the Stripe sessions of payments left in the "Creating" state.
+
+    Without a session such payments can't be paid, yet they block every
+    checkout of their user. Payments of a checkout are grouped by user,
+    as no user can start another checkout meanwhile, and fines get a
+    session each, as when they were created. A group is claimed before
+    the Stripe call by moving its `session_requested_at`, so that
+    overlapping runs never fill it twice, and a failed group is retried
+    once it is stale again. No group is started after `time_limit`
+    seconds.
+    """
+    started = time.monotonic()
+    now = timezone.now()
+    cutoff = now - REFILL_AFTER
+    metrics = {"payments": 0, "filled": 0, "failed": 0}
+    groups = defaultdict(list)
+
+    for payment in (
+        get_stale_creating_payments(cutoff)
+        .select_related("borrowing__book")
+        .order_by("id")[:REFILL_BATCH_SIZE]
+    ):
+        if payment.type == Payment.TypeChoices.FINE:
+            groups[(payment.type, payment.id)].append(payment)
+        else:
+            groups[(payment.type, payment.borrowing.user_id)].append(payment)
+
+    success_url, cancel_url = get_redirect_urls(None)
+
+    for payments in groups.values():
+        if time.monotonic() - started > time_limit:
+            break
+
+        payment_ids = [payment.id for payment in payments]
+        claimed = (
+            get_stale_creating_payments(cutoff)
+            .filter(pk__in=payment_ids)
+            .update(session_requested_at=now)
+        )
+        if claimed != len(payment_ids):
+            continue
+
+        metrics["payments"] += len(payment_ids)
+        try:
+            # The dropped task may have reached Stripe with other parameters,
+            # its idempotency key can't be replayed
+            fill_stripe_session(
+                payment_ids,
+                [get_payment_product_name(payment) for payment in payments],
+                success_url,
+                cancel_url,
+                idempotency_key=f"payment-{min(payment_ids)}-refill-"
+                f"{int(now.timestamp())}",
+            )
+        except stripe.error.StripeError:
+            logger.warning(
+                "Refilling Stripe session for payments %s failed",
+                payment_ids,
+                exc_info=True,
+            )
+            metrics["failed"] += len(payment_ids)
+            continue
+
+        metrics["filled"] += len(payment_ids)
+
+    metrics["duration"] = round(time.monotonic() - started, 3)
+    logger.info(
+        "Refilled sessions of %d stale payments in %.3fs, %d failed",
+        metrics["filled"],
+        metrics["duration"],
+        metrics["failed"],
+    )
+    return metrics
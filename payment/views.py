@@ -1,18 +1,53 @@
+import logging
+
 import stripe
 from django.db.models import QuerySet
+from drf_spectacular.utils import extend_schema
 from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from library_service.pagination import OptionalCursorPagination
+from payment.models import AccruedFine, Payment
+from payment.serializers import AccruedFineSerializer, PaymentSerializer
+from payment.utils import (
+    fill_stripe_session,
+    get_payment_product_name,
+    get_redirect_urls,
+    reopen_expired_payments,
+)
+from payment.webhooks import receive_stripe_event
+
+logger = logging.getLogger(__name__)
+
+
+def get_session_payments(session_id: str) -> list[Payment]:
+    payments = list(Payment.objects.filter(session_id=session_id).order_by("id"))
+
+    if not session_id or not payments:
+        raise NotFound("Payment session not found.")
+
+    return payments
+
+
+def get_session_data(data: list) -> dict:
+    if len(data) == 1:
+        return data[0]
+    return {"payments": data}
+
 
-from payment.models import Payment
-from payment.serializers import PaymentSerializer
+class PaymentPagination(OptionalCursorPagination):
+    page_size = 5
+    cursor_ordering = ("id",)
 
 
-class PaymentPagination(PageNumberPagination):
+class AccruedFinePagination(OptionalCursorPagination):
     page_size = 5
+    cursor_ordering = ("borrowing_id",)
 
 
 class PaymentViewSet(
@@ -34,30 +69,113 @@ class PaymentViewSet(
         methods=["GET"], detail=False, url_path="success", url_name="payment-success"
     )
     def success(self, request: Request) -> Response:
-        """Endpoint for successful stripe payment session"""
+        """
+        Endpoint for successful stripe payment session.
+
+        A multi-book checkout session covers several payments, they are
+        returned under "payments" instead of as a single object.
+        Payments are marked paid by the Stripe webhook, until it arrives
+        the response is 202 Accepted.
+        """
         session_id = request.query_params.get("session_id")
-        payment = Payment.objects.get(session_id=session_id)
-        session = stripe.checkout.Session.retrieve(session_id)
+        payments = get_session_payments(session_id)
+        serializer = PaymentSerializer(payments, many=True)
 
-        if session.payment_status == "paid":
-            serializer = PaymentSerializer(
-                payment, data={"status": "Paid"}, partial=True
+        if all(payment.status == Payment.StatusChoices.PAID for payment in payments):
+            return Response(
+                get_session_data(serializer.data), status=status.HTTP_200_OK
             )
 
-            if serializer.is_valid():
-                serializer.save()
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = {
+            "message": "Your payment is being confirmed.",
+            **get_session_data(serializer.data),
+        }
+        return Response(data=data, status=status.HTTP_202_ACCEPTED)
 
     @action(methods=["GET"], detail=False, url_path="cancel", url_name="payment-cancel")
     def cancel(self, request: Request) -> Response:
         """Endpoint for canceled stripe payment session"""
         session_id = request.query_params.get("session_id")
-        payment = Payment.objects.get(session_id=session_id)
+        payments = get_session_payments(session_id)
 
-        serializer = PaymentSerializer(payment)
+        serializer = PaymentSerializer(payments, many=True)
         data = {
             "message": "You can make a payment during the next 24 hours.",
-            **serializer.data,
+            **get_session_data(serializer.data),
         }
         return Response(data=data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        request=None, responses={200: PaymentSerializer, 202: PaymentSerializer}
+    )
+    @action(methods=["POST"], detail=True, url_path="renew", url_name="payment-renew")
+    def renew(self, request: Request, pk: int = None) -> Response:
+        """
+        Endpoint for a new checkout session of an expired payment.
+
+        Payments that shared the expired session are renewed with it and
+        returned under "payments". If Stripe is unavailable, the session
+        is created later and the response is 202 Accepted.
+        """
+        payments = reopen_expired_payments(self.get_object())
+
+        if not payments:
+            raise ValidationError(detail="Only expired payments can be renewed.")
+
+        payment_ids = [payment.id for payment in payments]
+        success_url, cancel_url = get_redirect_urls(request)
+
+        try:
+            fill_stripe_session(
+                payment_ids,
+                [get_payment_product_name(payment) for payment in payments],
+                success_url,
+                cancel_url,
+            )
+        except stripe.error.StripeError:
+            logger.warning("Renewing payments %s failed", payment_ids, exc_info=True)
+            response_status = status.HTTP_202_ACCEPTED
+        else:
+            response_status = status.HTTP_200_OK
+
+        serializer = PaymentSerializer(
+            Payment.objects.filter(pk__in=payment_ids).order_by("id"), many=True
+        )
+        return Response(get_session_data(serializer.data), status=response_status)
+
+
+class AccruedFineViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """Endpoint for fines accrued by borrowings that are still overdue"""
+
+    serializer_class = AccruedFineSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = AccruedFinePagination
+
+    def get_queryset(self) -> QuerySet:
+        queryset = AccruedFine.objects.all()
+
+        if not self.request.user.is_staff:
+            return queryset.filter(borrowing__user=self.request.user)
+
+        return queryset
+
+
+class StripeWebhookAPIView(APIView):
+    """Endpoint for signed Stripe webhook events"""
+
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    @extend_schema(request=None, responses={200: None})
+    def post(self, request: Request) -> Response:
+        try:
+            receive_stripe_event(
+                request.body, request.headers.get("Stripe-Signature", "")
+            )
+        except (ValueError, stripe.error.SignatureVerificationError):
+            return Response(
+                {"detail": "Invalid webhook payload or signature."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(status=status.HTTP_200_OK)
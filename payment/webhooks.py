@@ -0,0 +1,120 @@
+import json
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_q.tasks import async_task
+
+from payment.ledger import UNPAID_STATUSES, apply_ledger_changes
+from payment.models import Payment, StripeEvent
+from payment.sessions import MAX_SESSION_RENEWALS
+
+HANDLED_EVENTS = ("checkout.session.completed", "checkout.session.expired")
+EVENT_BATCH_SIZE = 100
+
+
+def receive_stripe_event(payload: bytes, signature: str) -> bool:
+    """
+    Verify the webhook signature and store the event once.
+
+    Returns False for events that were already received or are not
+    handled. Raises ValueError or stripe.error.SignatureVerificationError
+    for invalid requests.
+    """
+    # Anyone can sign with an empty key, so nothing is trusted without one
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        raise stripe.error.SignatureVerificationError(
+            "The webhook signing secret is not configured", signature
+        )
+
+    event = stripe.Webhook.construct_event(
+        payload, signature, settings.STRIPE_WEBHOOK_SECRET
+    )
+
+    if event["type"] not in HANDLED_EVENTS:
+        return False
+
+    _, created = StripeEvent.objects.get_or_create(
+        id=event["id"],
+        defaults={"type": event["type"], "payload": json.loads(payload)},
+    )
+    if created:
+        transaction.on_commit(
+            lambda: async_task("payment.webhooks.process_stripe_events")
+        )
+    return created
+
+
+def get_new_status(event: StripeEvent, payment: Payment) -> str | None:
+    session = event.payload["data"]["object"]
+
+    if event.type == "checkout.session.completed":
+        if session.get("payment_status") == "paid":
+            return Payment.StatusChoices.PAID
+    elif (
+        payment.status == Payment.StatusChoices.PENDING
+        and payment.session_renewals >= MAX_SESSION_RENEWALS
+    ):
+        return Payment.StatusChoices.EXPIRED
+    return None
+
+
+def process_stripe_events(batch_size: int = EVENT_BATCH_SIZE) -> int:
+    """
+    Apply stored events to their payments in batches of `batch_size`.
+
+    Every batch locks its events with SKIP LOCKED, so concurrent workers
+    never apply the same event, and updates payments with one
+    bulk_update. Paid payments are taken off the ledger. Expired sessions
+    with renewals left are only marked stale, the session sweeper renews
+    them.
+    """
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            events = list(
+                StripeEvent.objects.select_for_update(skip_locked=True)
+                .filter(processed_at__isnull=True)
+                .order_by("received_at")[:batch_size]
+            )
+            # A later event of the same session wins
+            sessions = {
+                event.payload["data"]["object"]["id"]: event for event in events
+            }
+            payments = Payment.objects.select_for_update(of=("self",)).filter(
+                session_id__in=sessions, status__in=UNPAID_STATUSES
+            )
+            updated, stale = [], []
+
+            for payment in payments.select_related("borrowing"):
+                event = sessions[payment.session_id]
+                status = get_new_status(event, payment)
+                if status is not None:
+                    payment.status = status
+                    updated.append(payment)
+                elif (
+                    event.type == "checkout.session.expired"
+                    and payment.status == Payment.StatusChoices.PENDING
+                ):
+                    payment.session_expires_at = timezone.now()
+                    stale.append(payment)
+
+            Payment.objects.bulk_update(updated, ["status"])
+            Payment.objects.bulk_update(stale, ["session_expires_at"])
+            apply_ledger_changes(
+                [
+                    (payment.borrowing.user_id, payment.money_to_pay)
+                    for payment in updated
+                    if payment.status == Payment.StatusChoices.PAID
+                ],
+                sign=-1,
+            )
+            StripeEvent.objects.filter(pk__in=[event.id for event in events]).update(
+                processed_at=timezone.now()
+            )
+
+        total += len(events)
+        if len(events) < batch_size:
+            return total
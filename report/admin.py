@@ -0,0 +1,6 @@
+from django.contrib import admin
+
+from report.models import DailyBookStats, Watermark
+
+admin.site.register(DailyBookStats)
+admin.site.register(Watermark)
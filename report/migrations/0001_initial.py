@@ -0,0 +1,64 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = [
+        ("book", "0003_keyset_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Watermark",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=50, primary_key=True, serialize=False),
+                ),
+                ("date", models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="DailyBookStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("borrowings", models.PositiveIntegerField(default=0)),
+                ("returns", models.PositiveIntegerField(default=0)),
+                ("overdue_days", models.PositiveIntegerField(default=0)),
+                (
+                    "fine_revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=10),
+                ),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="book.book",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["date", "book"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="dailybookstats",
+            constraint=models.UniqueConstraint(
+                fields=("date", "book"), name="daily_book_stats_unique"
+            ),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+# Payments of archived borrowings are settled, but still count as revenue
+CREATE_VIEW_SQL = """
+    CREATE MATERIALIZED VIEW report_daily_revenue AS
+    SELECT concat_ws(':', day, book_id, type) AS id, day AS date, book_id, type,
+        COUNT(*) FILTER (WHERE status = 'Paid') AS payments,
+        COALESCE(SUM(money_to_pay) FILTER (WHERE status = 'Paid'), 0)
+            ::numeric(12, 2) AS revenue,
+        COALESCE(SUM(money_to_pay) FILTER (WHERE status <> 'Paid'), 0)
+            ::numeric(12, 2) AS outstanding
+    FROM (
+        SELECT CASE WHEN payment.type = 'Fine'
+                THEN borrowing.actual_return_date
+                ELSE borrowing.borrow_date
+            END AS day,
+            borrowing.book_id, payment.type, payment.status, payment.money_to_pay
+        FROM payment_payment payment
+        JOIN borrowing_borrowing borrowing ON borrowing.id = payment.borrowing_id
+        UNION ALL
+        SELECT CASE WHEN payment.type = 'Fine'
+                THEN borrowing.actual_return_date
+                ELSE borrowing.borrow_date
+            END,
+            borrowing.book_id, payment.type, payment.status, payment.money_to_pay
+        FROM payment_archivedpayment payment
+        JOIN borrowing_archivedborrowing borrowing
+            ON borrowing.id = payment.borrowing_id
+    ) payments
+    WHERE day IS NOT NULL
+    GROUP BY day, book_id, type;
+
+    -- Required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+    CREATE UNIQUE INDEX report_daily_revenue_key
+        ON report_daily_revenue (date, book_id, type);
+"""
+
+DROP_VIEW_SQL = "DROP MATERIALIZED VIEW report_daily_revenue"
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("report", "0001_initial"),
+        ("borrowing", "0008_reminder"),
+        ("payment", "0008_reconciliation_run"),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_VIEW_SQL, DROP_VIEW_SQL),
+        migrations.CreateModel(
+            name="DailyRevenue",
+            fields=[
+                (
+                    "id",
+                    models.CharField(max_length=100, primary_key=True, serialize=False),
+                ),
+                ("date", models.DateField()),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[("Payment", "Payment"), ("Fine", "Fine")],
+                        max_length=10,
+                    ),
+                ),
+                ("payments", models.PositiveIntegerField()),
+                ("revenue", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("outstanding", models.DecimalField(decimal_places=2, max_digits=12)),
+            ],
+            options={
+                "db_table": "report_daily_revenue",
+                "ordering": ["date", "book", "type"],
+                "managed": False,
+            },
+        ),
+    ]
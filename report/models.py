@@ -0,0 +1,67 @@
+from django.db import models
+
+from book.models import Book
+from payment.models import Payment
+
+
+class DailyBookStats(models.Model):
+    """Circulation of one book during one day, maintained by `update_daily_stats`"""
+
+    date = models.DateField()
+    book = models.ForeignKey(
+        to=Book, on_delete=models.CASCADE, related_name="daily_stats"
+    )
+    borrowings = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    overdue_days = models.PositiveIntegerField(default=0)
+    fine_revenue = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["date", "book"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "book"], name="daily_book_stats_unique"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.date} book {self.book_id}: {self.borrowings} borrowings"
+
+
+class Watermark(models.Model):
+    """The last day whose rollups are complete"""
+
+    name = models.CharField(max_length=50, primary_key=True)
+    date = models.DateField()
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.date}"
+
+
+class DailyRevenue(models.Model):
+    """
+    Payments per day, book and type, a materialized view refreshed by
+    `refresh_revenue`. Regular payments count on the borrow date and
+    fines on the return date, like in the circulation rollups.
+    """
+
+    id = models.CharField(max_length=100, primary_key=True)
+    date = models.DateField()
+    book = models.ForeignKey(
+        to=Book,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="daily_revenue",
+    )
+    type = models.CharField(max_length=10, choices=Payment.TypeChoices.choices)
+    payments = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=12, decimal_places=2)
+    outstanding = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        managed = False
+        db_table = "report_daily_revenue"
+        ordering = ["date", "book", "type"]
+
+    def __str__(self) -> str:
+        return f"{self.date} book {self.book_id} {self.type}: {self.revenue}USD"
@@ -0,0 +1,106 @@
+import datetime
+import logging
+import time
+from decimal import Decimal
+from typing import Iterator
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import DecimalField, F, Q, QuerySet, Sum, Value
+from django.db.models.functions import Coalesce
+
+from library_service.export import EXPORT_CHUNK_SIZE
+from payment.models import Payment
+from report.models import DailyRevenue
+from report.stats import TOP_BOOKS
+
+REVENUE_EXPORT_FIELDS = (
+    "date",
+    "book_id",
+    "title",
+    "type",
+    "payments",
+    "revenue",
+    "outstanding",
+)
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_revenue() -> dict:
+    """Recompute the revenue view without blocking reports that read it"""
+    started = time.monotonic()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"REFRESH MATERIALIZED VIEW CONCURRENTLY {DailyRevenue._meta.db_table}"
+        )
+
+    duration = round(time.monotonic() - started, 3)
+    logger.info("Revenue view refreshed in %.3fs", duration)
+    return {"duration": duration}
+
+
+def get_revenue_rows(date_from: datetime.date, date_to: datetime.date) -> QuerySet:
+    return (
+        DailyRevenue.objects.using(settings.REPORT_DATABASE)
+        .filter(date__range=(date_from, date_to))
+        .order_by()
+    )
+
+
+def get_money_sum(field: str, **filters) -> Coalesce:
+    return Coalesce(
+        Sum(field, filter=Q(**filters) if filters else None),
+        Value(Decimal(0)),
+        output_field=DecimalField(),
+    )
+
+
+def get_revenue_sums() -> dict:
+    """`total_<field>` sums of the view, with revenue split by payment type"""
+    return {
+        "total_payments": Coalesce(Sum("payments"), 0),
+        "total_revenue": get_money_sum("revenue"),
+        "total_payment_revenue": get_money_sum(
+            "revenue", type=Payment.TypeChoices.PAYMENT
+        ),
+        "total_fine_revenue": get_money_sum("revenue", type=Payment.TypeChoices.FINE),
+        "total_outstanding": get_money_sum("outstanding"),
+    }
+
+
+def get_revenue_report(
+    date_from: datetime.date, date_to: datetime.date, top_books: int = TOP_BOOKS
+) -> dict:
+    """Revenue totals per day and top earning books, read from the view"""
+    rows = get_revenue_rows(date_from, date_to)
+
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "totals": rows.aggregate(**get_revenue_sums()),
+        "days": rows.values("date").annotate(**get_revenue_sums()).order_by("date"),
+        "books": rows.values("book_id", "book__title")
+        .annotate(**get_revenue_sums())
+        .order_by("-total_revenue", "book_id")[:top_books],
+    }
+
+
+def export_revenue_rows(
+    date_from: datetime.date, date_to: datetime.date
+) -> Iterator[dict]:
+    return (
+        get_revenue_rows(date_from, date_to)
+        .order_by("date", "book_id", "type")
+        .values(
+            "date",
+            "book_id",
+            "type",
+            "payments",
+            "revenue",
+            "outstanding",
+            title=F("book__title"),
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
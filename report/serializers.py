@@ -0,0 +1,91 @@
+from django.utils import timezone
+from rest_framework import serializers
+
+REPORT_DEFAULT_DAYS = 30
+REPORT_MAX_DAYS = 366
+
+
+class CirculationReportQuerySerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs) -> dict:
+        date_to = attrs.get("date_to") or timezone.now().date()
+        date_from = attrs.get("date_from") or date_to - timezone.timedelta(
+            days=REPORT_DEFAULT_DAYS - 1
+        )
+
+        if date_from > date_to:
+            raise serializers.ValidationError(
+                {"date_from": "date_from must not be after date_to."}
+            )
+        if (date_to - date_from).days >= REPORT_MAX_DAYS:
+            raise serializers.ValidationError(
+                f"The report covers at most {REPORT_MAX_DAYS} days."
+            )
+
+        return {"date_from": date_from, "date_to": date_to}
+
+
+class CirculationStatsSerializer(serializers.Serializer):
+    borrowings = serializers.IntegerField(source="total_borrowings")
+    returns = serializers.IntegerField(source="total_returns")
+    overdue_days = serializers.IntegerField(source="total_overdue_days")
+    fine_revenue = serializers.DecimalField(
+        max_digits=12, decimal_places=2, source="total_fine_revenue"
+    )
+
+
+class DailyCirculationSerializer(CirculationStatsSerializer):
+    date = serializers.DateField()
+
+
+class BookCirculationSerializer(CirculationStatsSerializer):
+    book_id = serializers.IntegerField()
+    title = serializers.CharField(source="book__title")
+
+
+class CoverCirculationSerializer(CirculationStatsSerializer):
+    cover = serializers.CharField(source="book__cover")
+
+
+class CirculationReportSerializer(serializers.Serializer):
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    totals = CirculationStatsSerializer()
+    days = DailyCirculationSerializer(many=True)
+    books = BookCirculationSerializer(many=True)
+    covers = CoverCirculationSerializer(many=True)
+
+
+class RevenueStatsSerializer(serializers.Serializer):
+    payments = serializers.IntegerField(source="total_payments")
+    revenue = serializers.DecimalField(
+        max_digits=12, decimal_places=2, source="total_revenue"
+    )
+    payment_revenue = serializers.DecimalField(
+        max_digits=12, decimal_places=2, source="total_payment_revenue"
+    )
+    fine_revenue = serializers.DecimalField(
+        max_digits=12, decimal_places=2, source="total_fine_revenue"
+    )
+    outstanding = serializers.DecimalField(
+        max_digits=12, decimal_places=2, source="total_outstanding"
+    )
+
+
+class DailyRevenueSerializer(RevenueStatsSerializer):
+    date = serializers.DateField()
+
+
+class BookRevenueSerializer(RevenueStatsSerializer):
+    book_id = serializers.IntegerField()
+    title = serializers.CharField(source="book__title")
+
+
+class RevenueReportSerializer(serializers.Serializer):
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    totals = RevenueStatsSerializer()
+    days = DailyRevenueSerializer(many=True)
+    books = BookRevenueSerializer(many=True)
@@ -0,0 +1,114 @@
+import datetime
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, Min, QuerySet, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from borrowing.models import Borrowing
+from payment.models import Payment
+from report.models import DailyBookStats, Watermark
+
+DAILY_STATS_WATERMARK = "daily_book_stats"
+TOP_BOOKS = 10
+
+# Each event is counted on its own day: a borrowing on borrow_date, a
+# return, its overdue days and the fines charged for it on
+# actual_return_date. Days in the range are recomputed as a whole, so
+# the upsert simply overwrites them.
+ROLLUP_SQL = f"""
+    INSERT INTO {DailyBookStats._meta.db_table}
+        (date, book_id, borrowings, returns, overdue_days, fine_revenue)
+    SELECT day, book_id, SUM(borrowings), SUM(returns), SUM(overdue_days),
+        SUM(fine_revenue)
+    FROM (
+        SELECT borrow_date AS day, book_id, 1 AS borrowings, 0 AS returns,
+            0 AS overdue_days, 0 AS fine_revenue
+        FROM {Borrowing._meta.db_table}
+        WHERE borrow_date BETWEEN %(start)s AND %(end)s
+        UNION ALL
+        SELECT actual_return_date, book_id, 0, 1,
+            GREATEST(actual_return_date - expected_return_date, 0), 0
+        FROM {Borrowing._meta.db_table}
+        WHERE actual_return_date BETWEEN %(start)s AND %(end)s
+        UNION ALL
+        SELECT borrowing.actual_return_date, borrowing.book_id, 0, 0, 0,
+            payment.money_to_pay
+        FROM {Payment._meta.db_table} payment
+        JOIN {Borrowing._meta.db_table} borrowing
+            ON borrowing.id = payment.borrowing_id
+        WHERE payment.type = %(fine)s
+            AND borrowing.actual_return_date BETWEEN %(start)s AND %(end)s
+    ) events
+    GROUP BY day, book_id
+    ON CONFLICT (date, book_id) DO UPDATE SET
+        borrowings = EXCLUDED.borrowings,
+        returns = EXCLUDED.returns,
+        overdue_days = EXCLUDED.overdue_days,
+        fine_revenue = EXCLUDED.fine_revenue
+"""
+
+
+@transaction.atomic
+def update_daily_stats(today: datetime.date = None) -> dict:
+    """
+    Roll up the days after the watermark up to and including today.
+
+    Past days never change, so the watermark moves to yesterday and the
+    next run only recomputes today, which is still open.
+    """
+    today = today or timezone.now().date()
+    watermark = (
+        Watermark.objects.select_for_update().filter(pk=DAILY_STATS_WATERMARK).first()
+    )
+
+    if watermark is not None:
+        start = watermark.date + datetime.timedelta(days=1)
+    else:
+        start = Borrowing.objects.aggregate(start=Min("borrow_date"))["start"] or today
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            ROLLUP_SQL,
+            {"start": start, "end": today, "fine": Payment.TypeChoices.FINE},
+        )
+        rows = cursor.rowcount
+
+    Watermark.objects.update_or_create(
+        pk=DAILY_STATS_WATERMARK,
+        defaults={"date": max(start, today) - datetime.timedelta(days=1)},
+    )
+    return {"start": start, "end": today, "rows": rows}
+
+
+STATS_FIELDS = ("borrowings", "returns", "overdue_days", "fine_revenue")
+
+
+def get_stats_sums() -> dict:
+    """`total_<field>` sums of the rollup counters, zero when there are no rows"""
+    sums = {f"total_{field}": Coalesce(Sum(field), 0) for field in STATS_FIELDS}
+    sums["total_fine_revenue"] = Coalesce(
+        Sum("fine_revenue"), Value(Decimal(0)), output_field=DecimalField()
+    )
+    return sums
+
+
+def get_circulation_report(
+    date_from: datetime.date, date_to: datetime.date, top_books: int = TOP_BOOKS
+) -> dict:
+    """Circulation totals per day, book and cover type, read from the rollups"""
+    stats = DailyBookStats.objects.filter(date__range=(date_from, date_to)).order_by()
+
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "totals": stats.aggregate(**get_stats_sums()),
+        "days": stats.values("date").annotate(**get_stats_sums()).order_by("date"),
+        "books": stats.values("book_id", "book__title")
+        .annotate(**get_stats_sums())
+        .order_by("-total_borrowings", "book_id")[:top_books],
+        "covers": stats.values("book__cover")
+        .annotate(**get_stats_sums())
+        .order_by("book__cover"),
+    }
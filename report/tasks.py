@@ -0,0 +1,17 @@
+from django.utils import timezone
+from django_q.tasks import schedule
+
+
+schedule(
+    "report.stats.update_daily_stats",
+    schedule_type="H",
+    repeats=-1,
+    next_run=timezone.now() + timezone.timedelta(minutes=1),
+)
+
+schedule(
+    "report.revenue.refresh_revenue",
+    schedule_type="H",
+    repeats=-1,
+    next_run=timezone.now() + timezone.timedelta(minutes=1),
+)
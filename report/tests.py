@@ -0,0 +1,219 @@
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from book.models import Book
+from borrowing.models import ArchivedBorrowing, Borrowing
+from payment.models import ArchivedPayment, Payment
+from report.models import DailyBookStats, Watermark
+from report.revenue import refresh_revenue
+from report.stats import DAILY_STATS_WATERMARK, update_daily_stats
+
+CIRCULATION_REPORT_URL = reverse("report:circulation-report")
+REVENUE_REPORT_URL = reverse("report:revenue-report")
+REVENUE_EXPORT_URL = reverse("report:revenue-export")
+
+FIRST_DAY = datetime.date(2023, 3, 1)
+
+
+def create_book(cover: str = "Soft") -> Book:
+    return Book.objects.create(
+        title="Test book",
+        author="Test Author",
+        cover=cover,
+        inventory=20,
+        daily_fee=1.99,
+    )
+
+
+def create_borrowing(book: Book, user, borrow_day: int, return_day: int = None):
+    borrowing = Borrowing.objects.create(
+        expected_return_date=FIRST_DAY + datetime.timedelta(days=borrow_day + 2),
+        book=book,
+        user=user,
+    )
+    Borrowing.objects.filter(pk=borrowing.pk).update(
+        borrow_date=FIRST_DAY + datetime.timedelta(days=borrow_day),
+        actual_return_date=FIRST_DAY + datetime.timedelta(days=return_day)
+        if return_day is not None
+        else None,
+    )
+    return borrowing
+
+
+class CirculationStatsTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        self.admin = get_user_model().objects.create_superuser(
+            email="admin@test.com", password="test12345"
+        )
+        self.soft_book = create_book()
+        self.hard_book = create_book(cover="Hard")
+
+        create_borrowing(self.soft_book, self.user, borrow_day=0, return_day=1)
+        late = create_borrowing(self.soft_book, self.user, borrow_day=0, return_day=5)
+        Payment.objects.create(
+            status="Pending", type="Fine", borrowing=late, money_to_pay=11.94
+        )
+        create_borrowing(self.hard_book, self.user, borrow_day=1)
+        self.client.force_authenticate(self.admin)
+
+    def test_update_daily_stats_is_incremental(self):
+        update_daily_stats(today=FIRST_DAY + datetime.timedelta(days=1))
+
+        self.assertEqual(
+            Watermark.objects.get(pk=DAILY_STATS_WATERMARK).date, FIRST_DAY
+        )
+        self.assertEqual(
+            DailyBookStats.objects.get(date=FIRST_DAY, book=self.soft_book).borrowings,
+            2,
+        )
+
+        result = update_daily_stats(today=FIRST_DAY + datetime.timedelta(days=5))
+        late_day = DailyBookStats.objects.get(
+            date=FIRST_DAY + datetime.timedelta(days=5)
+        )
+
+        self.assertEqual(result["start"], FIRST_DAY + datetime.timedelta(days=1))
+        self.assertEqual(late_day.returns, 1)
+        self.assertEqual(late_day.overdue_days, 3)
+        self.assertEqual(late_day.fine_revenue, Decimal("11.94"))
+        self.assertEqual(DailyBookStats.objects.count(), 4)
+
+    def test_circulation_report(self):
+        update_daily_stats(today=FIRST_DAY + datetime.timedelta(days=5))
+        res = self.client.get(
+            CIRCULATION_REPORT_URL,
+            data={
+                "date_from": FIRST_DAY,
+                "date_to": FIRST_DAY + datetime.timedelta(days=6),
+            },
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data["totals"],
+            {
+                "borrowings": 3,
+                "returns": 2,
+                "overdue_days": 3,
+                "fine_revenue": "11.94",
+            },
+        )
+        self.assertEqual(len(res.data["days"]), 3)
+        self.assertEqual(res.data["books"][0]["book_id"], self.soft_book.id)
+        self.assertEqual(
+            [cover["cover"] for cover in res.data["covers"]], ["Hard", "Soft"]
+        )
+
+    def test_circulation_report_invalid_range(self):
+        res = self.client.get(
+            CIRCULATION_REPORT_URL,
+            data={"date_from": "2023-03-02", "date_to": "2023-03-01"},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_circulation_report_admin_only(self):
+        self.client.force_authenticate(self.user)
+        res = self.client.get(CIRCULATION_REPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class RevenueReportTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345"
+        )
+        self.admin = get_user_model().objects.create_superuser(
+            email="admin@test.com", password="test12345"
+        )
+        self.soft_book = create_book()
+        self.hard_book = create_book(cover="Hard")
+
+        late = create_borrowing(self.soft_book, self.user, borrow_day=0, return_day=5)
+        Payment.objects.create(
+            status="Paid", type="Payment", borrowing=late, money_to_pay=3.98
+        )
+        Payment.objects.create(
+            status="Paid", type="Fine", borrowing=late, money_to_pay=11.94
+        )
+        active = create_borrowing(self.hard_book, self.user, borrow_day=1)
+        Payment.objects.create(
+            status="Pending", type="Payment", borrowing=active, money_to_pay=1.99
+        )
+        archived = ArchivedBorrowing.objects.create(
+            id=1000,
+            borrow_date=FIRST_DAY + datetime.timedelta(days=2),
+            expected_return_date=FIRST_DAY + datetime.timedelta(days=4),
+            actual_return_date=FIRST_DAY + datetime.timedelta(days=3),
+            book=self.hard_book,
+            user=self.user,
+        )
+        ArchivedPayment.objects.create(
+            id=1000, status="Paid", type="Payment", borrowing=archived, money_to_pay=5
+        )
+        self.range = {
+            "date_from": FIRST_DAY,
+            "date_to": FIRST_DAY + datetime.timedelta(days=6),
+        }
+        self.client.force_authenticate(self.admin)
+
+    def test_revenue_report(self):
+        res = self.client.get(REVENUE_REPORT_URL, data=self.range)
+
+        self.assertEqual(res.data["totals"]["payments"], 0)
+
+        refresh_revenue()
+        res = self.client.get(REVENUE_REPORT_URL, data=self.range)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data["totals"],
+            {
+                "payments": 3,
+                "revenue": "20.92",
+                "payment_revenue": "8.98",
+                "fine_revenue": "11.94",
+                "outstanding": "1.99",
+            },
+        )
+        self.assertEqual(len(res.data["days"]), 4)
+        self.assertEqual(res.data["books"][0]["book_id"], self.soft_book.id)
+        self.assertEqual(res.data["books"][0]["revenue"], "15.92")
+
+    def test_revenue_export(self):
+        refresh_revenue()
+        res = self.client.get(REVENUE_EXPORT_URL, data=self.range)
+        lines = b"".join(res.streaming_content).decode().splitlines()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            lines[0], "date,book_id,title,type,payments,revenue,outstanding"
+        )
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(
+            lines[1], f"2023-03-01,{self.soft_book.id},Test book,Payment,1,3.98,0.00"
+        )
+
+    def test_revenue_report_admin_only(self):
+        self.client.force_authenticate(self.user)
+
+        self.assertEqual(
+            self.client.get(REVENUE_REPORT_URL).status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+        self.assertEqual(
+            self.client.get(REVENUE_EXPORT_URL).status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
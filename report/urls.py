@@ -0,0 +1,19 @@
+from django.urls import path
+
+from report.views import (
+    CirculationReportAPIView,
+    RevenueExportAPIView,
+    RevenueReportAPIView,
+)
+
+app_name = "report"
+
+urlpatterns = [
+    path(
+        "circulation/",
+        CirculationReportAPIView.as_view(),
+        name="circulation-report",
+    ),
+    path("revenue/", RevenueReportAPIView.as_view(), name="revenue-report"),
+    path("revenue/export/", RevenueExportAPIView.as_view(), name="revenue-export"),
+]
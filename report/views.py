@@ -0,0 +1,83 @@
+from django.http import StreamingHttpResponse
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from library_service.export import export_response, get_export_format
+from report.revenue import (
+    REVENUE_EXPORT_FIELDS,
+    export_revenue_rows,
+    get_revenue_report,
+)
+from report.serializers import (
+    CirculationReportQuerySerializer,
+    CirculationReportSerializer,
+    RevenueReportSerializer,
+)
+from report.stats import get_circulation_report
+from user.authentication import StatelessReadMixin
+
+
+class CirculationReportAPIView(StatelessReadMixin, APIView):
+    """Endpoint for circulation statistics served from the daily rollups"""
+
+    permission_classes = (IsAdminUser,)
+
+    @extend_schema(
+        parameters=[CirculationReportQuerySerializer],
+        responses={200: CirculationReportSerializer},
+    )
+    def get(self, request: Request) -> Response:
+        query = CirculationReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        report = get_circulation_report(**query.validated_data)
+
+        return Response(
+            CirculationReportSerializer(report).data, status=status.HTTP_200_OK
+        )
+
+
+class RevenueReportAPIView(StatelessReadMixin, APIView):
+    """Endpoint for revenue by day and book, served from the revenue view"""
+
+    permission_classes = (IsAdminUser,)
+
+    @extend_schema(
+        parameters=[CirculationReportQuerySerializer],
+        responses={200: RevenueReportSerializer},
+    )
+    def get(self, request: Request) -> Response:
+        query = CirculationReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        report = get_revenue_report(**query.validated_data)
+
+        return Response(RevenueReportSerializer(report).data, status=status.HTTP_200_OK)
+
+
+class RevenueExportAPIView(StatelessReadMixin, APIView):
+    """Endpoint for streaming the revenue view rows of a date range"""
+
+    permission_classes = (IsAdminUser,)
+
+    @extend_schema(
+        parameters=[
+            CirculationReportQuerySerializer,
+            OpenApiParameter(
+                "file_format",
+                type=str,
+                enum=["csv", "ndjson"],
+                description="Export file format, csv by default",
+            ),
+        ],
+        responses={200: None},
+    )
+    def get(self, request: Request) -> StreamingHttpResponse:
+        file_format = get_export_format(request)
+        query = CirculationReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        rows = export_revenue_rows(**query.validated_data)
+
+        return export_response(rows, REVENUE_EXPORT_FIELDS, file_format, "revenue")
@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import (
+    JWTAuthentication,
+    JWTStatelessUserAuthentication,
+)
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+USER_CACHE_TIMEOUT = 60
+# The cache is shared by all workers, the password hash is never stored
+CACHED_USER_FIELDS = (
+    "id",
+    "email",
+    "first_name",
+    "last_name",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+    "last_login",
+    "date_joined",
+)
+
+
+def get_user_cache_key(user_id) -> str:
+    return f"user:auth:fields:{user_id}"
+
+
+def invalidate_user(user_id) -> None:
+    """
+    Drop the cached user now and once more after commit, so that a
+    request that read the old row before commit does not keep it cached.
+    """
+    key = get_user_cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that resolves the user from the cache.
+
+    The CACHED_USER_FIELDS of users are cached by id for
+    USER_CACHE_TIMEOUT seconds and dropped when they are saved or deleted.
+    QuerySet.update() sends no signals, call `invalidate_user` after it.
+    Users rebuilt from the cache have their other fields deferred, so
+    saving one never overwrites them.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        key = get_user_cache_key(user_id)
+        fields = cache.get(key)
+
+        if fields is None:
+            # Inactive and missing users are rejected here and never cached
+            user = super().get_user(validated_token)
+            cache.set(
+                key,
+                {field: getattr(user, field) for field in CACHED_USER_FIELDS},
+                timeout=USER_CACHE_TIMEOUT,
+            )
+            return user
+
+        # from_db() takes the loaded values in the model's field order
+        field_names = [
+            field.attname
+            for field in get_user_model()._meta.concrete_fields
+            if field.attname in fields
+        ]
+        return get_user_model().from_db(
+            DEFAULT_DB_ALIAS, field_names, [fields[name] for name in field_names]
+        )
+
+
+class StatelessReadMixin:
+    """
+    With JWT_STATELESS_READS enabled, safe requests are authenticated
+    from the token claims alone, without loading the user.
+
+    Only for views that need nothing but the user id and `is_staff`.
+    Changes of a user apply once their issued access tokens expire.
+    """
+
+    def get_authenticators(self) -> list:
+        if settings.JWT_STATELESS_READS and self.request.method in SAFE_METHODS:
+            return [JWTStatelessUserAuthentication()]
+        return super().get_authenticators()
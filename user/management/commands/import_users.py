@@ -0,0 +1,48 @@
+from django.core.management import BaseCommand
+
+from user.utils import IMPORT_BATCH_SIZE, import_users, read_user_rows
+
+
+class Command(BaseCommand):
+    """Django command to import users from a CSV file"""
+
+    help = (
+        "Create users from a CSV file with email, password, first_name "
+        "and last_name columns, skipping emails that are already taken."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to the CSV file")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help="Number of users inserted per statement",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Number of password hashing processes, all cores by default",
+        )
+
+    def handle(self, *args, **options):
+        with open(options["path"], newline="", encoding="utf-8") as stream:
+            report = import_users(
+                read_user_rows(stream), options["batch_size"], options["workers"]
+            )
+
+        for error in report["errors"]:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+
+        hidden_errors = report["rejected"] - len(report["errors"])
+        if hidden_errors:
+            self.stderr.write(f"... and {hidden_errors} more rejected rows")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report['created']} users, "
+                f"skipped {report['skipped']} duplicate emails, "
+                f"rejected {report['rejected']} rows "
+                f"in {report['duration']}s ({report['per_second']} users/s)."
+            )
+        )
@@ -0,0 +1,12 @@
+from drf_spectacular.contrib.rest_framework_simplejwt import (
+    SimpleJWTScheme,
+    TokenObtainPairSerializerExtension,
+)
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    target_class = "user.authentication.CachedJWTAuthentication"
+
+
+class TokenObtainPairWithClaimsSerializerExtension(TokenObtainPairSerializerExtension):
+    target_class = "user.serializers.TokenObtainPairWithClaimsSerializer"
@@ -1,13 +1,23 @@
+import io
+import tempfile
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from user.authentication import get_user_cache_key
 from user.serializers import UserSerializer
+from user.utils import insert_batch
 
 USER_CREATE_URL = reverse("user:create")
 USER_MANAGE_URL = reverse("user:manage")
+TOKEN_URL = reverse("user:token_obtain_pair")
+CIRCULATION_REPORT_URL = reverse("report:circulation-report")
 
 
 class UnauthenticatedUserTests(TestCase):
@@ -41,3 +51,110 @@ class AuthenticatedUserTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer_user1.data)
         self.assertNotEqual(res.data["email"], self.user2.email)
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="test12345", is_staff=True
+        )
+        res = self.client.post(
+            TOKEN_URL, data={"email": "user@test.com", "password": "test12345"}
+        )
+        self.client.credentials(HTTP_AUTHORIZE=f"Bearer {res.data['access']}")
+
+    def test_user_is_cached(self):
+        with self.assertNumQueries(1):
+            self.client.get(USER_MANAGE_URL)
+        with self.assertNumQueries(0):
+            res = self.client.get(USER_MANAGE_URL)
+
+        self.assertEqual(res.data["email"], "user@test.com")
+        self.assertNotIn("password", cache.get(get_user_cache_key(self.user.id)))
+
+    def test_user_update_invalidates_cache(self):
+        self.client.get(USER_MANAGE_URL)
+        self.client.patch(USER_MANAGE_URL, data={"first_name": "Changed"})
+        res = self.client.get(USER_MANAGE_URL)
+
+        self.assertEqual(res.data["first_name"], "Changed")
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(USER_MANAGE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stateless_reads(self):
+        # QuerySet.update() sends no signal, only a user lookup notices
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+
+        with override_settings(JWT_STATELESS_READS=True):
+            res = self.client.get(CIRCULATION_REPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.client.get(CIRCULATION_REPORT_URL).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+
+class ImportUsersTests(TestCase):
+    def test_import_users_command(self):
+        get_user_model().objects.create_user(
+            email="taken@test.com", password="test12345"
+        )
+        rows = [
+            "email,password,first_name,last_name",
+            "first@Test.com,test12345,First,User",
+            "taken@test.com,test12345,,",
+            "second@test.com,test12345,Second,",
+            "first@test.com,test12345,,",
+            "not-an-email,test12345,,",
+            "third@test.com,short,,",
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as file:
+            file.write("\n".join(rows) + "\n")
+            file.flush()
+            out, err = io.StringIO(), io.StringIO()
+            call_command(
+                "import_users",
+                file.name,
+                batch_size=1,
+                workers=2,
+                stdout=out,
+                stderr=err,
+            )
+
+        self.assertIn(
+            "Imported 2 users, skipped 2 duplicate emails, rejected 2 rows",
+            out.getvalue(),
+        )
+        self.assertIn("Line 6", err.getvalue())
+        self.assertIn("Line 7", err.getvalue())
+        user = get_user_model().objects.get(email="first@test.com")
+        self.assertEqual(user.first_name, "First")
+        self.assertTrue(user.check_password("test12345"))
+        self.assertEqual(get_user_model().objects.count(), 3)
+
+    def test_insert_users_counts_inserted_rows(self):
+        get_user_model().objects.create_user(
+            email="taken@test.com", password="test12345"
+        )
+        # The email was registered after the batch was checked
+        batch = [
+            {"email": email, "first_name": "", "last_name": ""}
+            for email in ("taken@test.com", "new@test.com")
+        ]
+        report = {"created": 0, "skipped": 0}
+
+        insert_batch(batch, [make_password("test12345")] * 2, report)
+
+        self.assertEqual(report, {"created": 1, "skipped": 1})
+        self.assertTrue(
+            get_user_model()
+            .objects.get(email="new@test.com")
+            .check_password("test12345")
+        )
@@ -0,0 +1,166 @@
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, TextIO
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import connection
+
+IMPORT_FIELDS = ("email", "password", "first_name", "last_name")
+IMPORT_BATCH_SIZE = 2000
+HASH_CHUNK_SIZE = 50
+MAX_REPORTED_ERRORS = 1000
+# The same minimum as UserSerializer applies
+MIN_PASSWORD_LENGTH = 8
+
+
+def read_user_rows(stream: TextIO) -> Iterator[tuple[int, dict]]:
+    """Lazily yield (line number, row) pairs from a CSV stream"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def build_user_row(row: dict) -> dict:
+    """Validate an import row against the User field constraints"""
+    data = {field: (row.get(field) or "").strip() for field in IMPORT_FIELDS}
+    data["email"] = get_user_model().objects.normalize_email(data["email"])
+    data["password"] = row.get("password") or ""
+
+    get_user_model()(
+        **{field: data[field] for field in ("email", "first_name", "last_name")}
+    ).clean_fields(exclude=["password"])
+
+    if len(data["password"]) < MIN_PASSWORD_LENGTH:
+        raise ValidationError(
+            {
+                "password": [
+                    f"Ensure this field has at least {MIN_PASSWORD_LENGTH} characters."
+                ]
+            }
+        )
+    return data
+
+
+def get_new_user_batches(
+    rows: Iterable[tuple[int, dict]], batch_size: int, report: dict
+) -> Iterator[list[dict]]:
+    """
+    Yield batches of valid rows whose emails are new.
+
+    Emails seen earlier in the file or already taken are skipped before
+    their passwords are hashed, which is by far the most expensive step.
+    """
+    seen = set()
+    batch = []
+
+    def filter_existing(batch: list[dict]) -> list[dict]:
+        existing = set(
+            get_user_model()
+            .objects.filter(email__in=[row["email"] for row in batch])
+            .values_list("email", flat=True)
+        )
+        report["skipped"] += len(existing)
+        return [row for row in batch if row["email"] not in existing]
+
+    for line_number, row in rows:
+        try:
+            data = build_user_row(row)
+        except ValidationError as error:
+            report["rejected"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                errors = getattr(error, "message_dict", None) or error.messages
+                report["errors"].append({"line": line_number, "errors": errors})
+            continue
+
+        if data["email"] in seen:
+            report["skipped"] += 1
+            continue
+        seen.add(data["email"])
+        batch.append(data)
+
+        if len(batch) >= batch_size:
+            yield filter_existing(batch)
+            batch = []
+
+    if batch:
+        yield filter_existing(batch)
+
+
+def get_insert_sql() -> str:
+    """
+    Insert rows given as arrays, emails registered meanwhile are left to
+    the unique index and only the inserted rows are returned
+    """
+    return f"""
+        INSERT INTO {get_user_model()._meta.db_table} (
+            email, password, first_name, last_name,
+            is_superuser, is_staff, is_active, date_joined
+        )
+        SELECT email, password, first_name, last_name, false, false, true, now()
+        FROM unnest(%s::text[], %s::text[], %s::text[], %s::text[])
+            AS rows (email, password, first_name, last_name)
+        ON CONFLICT (email) DO NOTHING
+        RETURNING id
+    """
+
+
+def insert_users(batch: list[dict], passwords: Iterable[str]) -> int:
+    """Insert a batch of users and return the number of rows inserted"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            get_insert_sql(),
+            [
+                [row["email"] for row in batch],
+                list(passwords),
+                [row["first_name"] for row in batch],
+                [row["last_name"] for row in batch],
+            ],
+        )
+        return len(cursor.fetchall())
+
+
+def insert_batch(batch: list[dict], passwords: Iterable[str], report: dict) -> None:
+    created = insert_users(batch, passwords)
+    report["created"] += created
+    report["skipped"] += len(batch) - created
+
+
+def import_users(
+    rows: Iterable[tuple[int, dict]],
+    batch_size: int = IMPORT_BATCH_SIZE,
+    workers: int = None,
+) -> dict:
+    """
+    Create users from rows with one statement per batch of `batch_size`.
+
+    Passwords are hashed in a pool of `workers` processes, all cores by
+    default, while the previous batch is being inserted.
+    """
+    report = {"created": 0, "skipped": 0, "rejected": 0, "errors": []}
+    started = time.monotonic()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        pending = None
+
+        for batch in get_new_user_batches(rows, batch_size, report):
+            # map() submits the whole batch right away and yields in order
+            passwords = pool.map(
+                make_password,
+                [row["password"] for row in batch],
+                chunksize=HASH_CHUNK_SIZE,
+            )
+            if pending is not None:
+                insert_batch(*pending, report)
+            pending = batch, passwords
+
+        if pending is not None:
+            insert_batch(*pending, report)
+
+    duration = time.monotonic() - started
+    report["duration"] = round(duration, 3)
+    report["per_second"] = round(report["created"] / duration) if duration else 0
+    return report
@@ -1,7 +1,8 @@
+from django.contrib.auth import get_user_model
 from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 
+from user.authentication import CachedJWTAuthentication
 from user.serializers import UserSerializer
 
 
@@ -11,8 +12,11 @@ class CreateUserView(generics.CreateAPIView):
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedJWTAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get_object(self):
-        return self.request.user
+        if self.request.method in SAFE_METHODS:
+            return self.request.user
+        # Never save the cached copy of the user over the current row
+        return get_user_model().objects.get(pk=self.request.user.pk)